@@ -3,13 +3,19 @@ Module Analytics - Configuration Admin Django
 """
 
 from django.contrib import admin
-from .models import StatistiquesDossier, PerformanceActeur, PredictionRisque
+from .models import (
+    StatistiquesDossier,
+    PerformanceActeur,
+    PredictionRisque,
+    TacheExport,
+)
 
 
 @admin.register(StatistiquesDossier)
 class StatistiquesDossierAdmin(admin.ModelAdmin):
     list_display = (
         "periode",
+        "jour",
         "date_calcul",
         "total_dossiers",
         "taux_approbation",
@@ -103,3 +109,20 @@ class PredictionRisqueAdmin(admin.ModelAdmin):
             },
         ),
     )
+
+
+@admin.register(TacheExport)
+class TacheExportAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "utilisateur",
+        "type_export",
+        "statut",
+        "progression",
+        "date_creation",
+        "expire_le",
+        "telecharge_le",
+    )
+    list_filter = ("type_export", "statut")
+    search_fields = ("utilisateur__username",)
+    readonly_fields = ("date_creation", "date_debut", "date_fin", "telecharge_le")
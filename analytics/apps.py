@@ -14,6 +14,5 @@ class AnalyticsConfig(AppConfig):
         """
         Code execute au demarrage de l'application
         """
-        # Import des signaux si necessaire
-        # import analytics.signals
-        pass
+        # Invalidation des caches analytics
+        import analytics.signals  # noqa: F401
@@ -0,0 +1,26 @@
+"""
+Commande Django pour entrainer le modele de prediction de risque (analytics).
+Les workers rechargent le modele automatiquement lorsque le fichier change.
+Usage: python manage.py entrainer_modele_risque
+"""
+
+from django.core.management.base import BaseCommand
+
+from analytics.services import MLPredictionService
+
+
+class Command(BaseCommand):
+    help = "Entraine le modele de risque utilise par MLPredictionService"
+
+    def handle(self, *args, **options):
+        model = MLPredictionService.entrainer_modele()
+
+        if model is None:
+            self.stdout.write(
+                self.style.WARNING("Pas assez de dossiers finalises (minimum 10)")
+            )
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Modele sauvegarde: {MLPredictionService.MODEL_PATH}")
+        )
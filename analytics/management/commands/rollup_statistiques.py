@@ -0,0 +1,62 @@
+"""
+Commande Django pour mettre a jour les rollups journaliers des KPIs.
+Traite uniquement les JournalAction posterieures au dernier watermark.
+Usage: python manage.py rollup_statistiques [--une-fois] [--intervalle 300]
+       [--instantane MOIS]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.services import RollupService
+
+
+class Command(BaseCommand):
+    help = "Agrege les nouvelles actions du journal dans les statistiques journalieres"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--une-fois",
+            action="store_true",
+            help="Faire une seule passe puis s'arreter",
+        )
+        parser.add_argument(
+            "--intervalle",
+            type=float,
+            default=300,
+            help="Secondes entre deux passes",
+        )
+        parser.add_argument(
+            "--taille-lot",
+            type=int,
+            default=RollupService.TAILLE_LOT,
+            help="Nombre d'actions traitees par transaction",
+        )
+        parser.add_argument(
+            "--instantane",
+            choices=list(RollupService.JOURS_PAR_PERIODE),
+            help="Enregistrer aussi un instantane pour cette periode "
+            "(a la fin de la passe; implique --une-fois)",
+        )
+
+    def handle(self, *args, **options):
+        periode = options.get("instantane")
+        while True:
+            traitees = RollupService.traiter_nouvelles_actions(
+                taille_lot=options["taille_lot"]
+            )
+            self.stdout.write(f"{traitees} actions agregees")
+
+            if options["une_fois"] or periode:
+                break
+            time.sleep(options["intervalle"])
+
+        if periode:
+            stats = RollupService.creer_instantane(periode)
+            self.stdout.write(
+                f"Instantane {periode}: {stats.total_dossiers} dossiers, "
+                f"taux approbation {stats.taux_approbation:.1f}%"
+            )
+
+        self.stdout.write(self.style.SUCCESS("Rollup des statistiques termine"))
@@ -0,0 +1,36 @@
+"""
+Commande Django pour rescorer en lot le portefeuille actif (analytics).
+A planifier chaque nuit apres entrainer_modele_risque.
+Usage: python manage.py scorer_portefeuille [--taille-lot 2000]
+"""
+
+from django.core.management.base import BaseCommand
+
+from analytics.services import MLPredictionService
+
+
+class Command(BaseCommand):
+    help = "Calcule les predictions de risque de tous les dossiers actifs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--taille-lot",
+            type=int,
+            default=MLPredictionService.TAILLE_LOT,
+            help="Nombre de dossiers scores par requete",
+        )
+
+    def handle(self, *args, **options):
+        total = MLPredictionService.scorer_portefeuille(
+            taille_lot=options["taille_lot"]
+        )
+
+        if total is None:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Modele non disponible. Lancez entrainer_modele_risque."
+                )
+            )
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"{total} dossiers scores"))
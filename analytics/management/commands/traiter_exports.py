@@ -0,0 +1,46 @@
+"""
+Commande Django pour generer les exports en arriere-plan (TacheExport).
+A utiliser avec EXPORTS_EXECUTION=commande; purge aussi les exports expires
+et passe en echec les exports interrompus (EXPORTS_DELAI_MAX).
+Usage: python manage.py traiter_exports [--une-fois] [--intervalle 5]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.services import TacheExportService
+
+
+class Command(BaseCommand):
+    help = "Traite les exports en attente et supprime les exports expires"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--une-fois",
+            action="store_true",
+            help="Traiter les taches en attente puis s'arreter",
+        )
+        parser.add_argument(
+            "--intervalle",
+            type=float,
+            default=5,
+            help="Secondes d'attente quand aucune tache n'est en attente",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            TacheExportService.recuperer_bloquees()
+            traitees = TacheExportService.traiter_en_attente()
+            purgees = TacheExportService.purger_expirees()
+            if traitees or purgees:
+                self.stdout.write(
+                    f"{traitees} exports generes, {purgees} exports purges"
+                )
+
+            if options["une_fois"]:
+                break
+            if not traitees:
+                time.sleep(options["intervalle"])
+
+        self.stdout.write(self.style.SUCCESS("Traitement des exports termine"))
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CurseurRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nom", models.CharField(max_length=50, unique=True)),
+                ("dernier_journal_id", models.BigIntegerField(default=0)),
+                ("date_maj", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Curseur Rollup",
+                "verbose_name_plural": "Curseurs Rollup",
+            },
+        ),
+        migrations.AddField(
+            model_name="statistiquesdossier",
+            name="delai_total_jours",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="statistiquesdossier",
+            name="jour",
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="statistiquesdossier",
+            name="nombre_delais",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="statistiquesdossier",
+            name="repartition_statuts",
+            field=models.JSONField(
+                blank=True, default=dict, help_text="Transitions entrantes par statut"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="statistiquesdossier",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("jour__isnull", False)),
+                fields=("jour",),
+                name="unique_statistique_jour",
+            ),
+        ),
+    ]
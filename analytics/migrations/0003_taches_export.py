@@ -0,0 +1,85 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0002_statistiques_rollup_journalier"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TacheExport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "type_export",
+                    models.CharField(
+                        choices=[
+                            ("EXCEL_STATISTIQUES", "Statistiques Excel"),
+                            ("CSV_DOSSIERS", "Dossiers CSV"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("parametres", models.JSONField(blank=True, default=dict)),
+                (
+                    "statut",
+                    models.CharField(
+                        choices=[
+                            ("EN_ATTENTE", "En attente"),
+                            ("EN_COURS", "En cours"),
+                            ("TERMINE", "Termine"),
+                            ("ECHEC", "Echec"),
+                        ],
+                        default="EN_ATTENTE",
+                        max_length=20,
+                    ),
+                ),
+                ("progression", models.PositiveSmallIntegerField(default=0)),
+                ("fichier", models.CharField(blank=True, max_length=500)),
+                ("nom_fichier", models.CharField(blank=True, max_length=200)),
+                ("erreur", models.TextField(blank=True)),
+                ("date_creation", models.DateTimeField(auto_now_add=True)),
+                ("date_debut", models.DateTimeField(blank=True, null=True)),
+                ("date_fin", models.DateTimeField(blank=True, null=True)),
+                (
+                    "expire_le",
+                    models.DateTimeField(blank=True, db_index=True, null=True),
+                ),
+                ("telecharge_le", models.DateTimeField(blank=True, null=True)),
+                (
+                    "utilisateur",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="taches_export",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Tache Export",
+                "verbose_name_plural": "Taches Export",
+                "ordering": ["-date_creation"],
+                "indexes": [
+                    models.Index(
+                        fields=["statut", "date_creation"],
+                        name="analytics_t_statut_60d9ed_idx",
+                    )
+                ],
+            },
+        ),
+    ]
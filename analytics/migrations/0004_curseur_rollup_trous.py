@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0003_taches_export"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="curseurrollup",
+            name="trous",
+            field=models.JSONField(
+                blank=True, default=dict, help_text="Ids sautes: {id: premiere absence}"
+            ),
+        ),
+    ]
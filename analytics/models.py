@@ -54,15 +54,51 @@ class StatistiquesDossier(models.Model):
     taux_approbation = models.FloatField(default=0)  # Pourcentage
     taux_rejet = models.FloatField(default=0)
 
+    # Bucket journalier (rollup incremental): jour renseigne, periode JOUR
+    jour = models.DateField(null=True, blank=True, db_index=True)
+    delai_total_jours = models.FloatField(default=0)
+    nombre_delais = models.IntegerField(default=0)
+    repartition_statuts = models.JSONField(
+        default=dict, blank=True, help_text="Transitions entrantes par statut"
+    )
+
     class Meta:
         verbose_name = "Statistique Dossier"
         verbose_name_plural = "Statistiques Dossiers"
         ordering = ["-date_calcul"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["jour"],
+                condition=models.Q(jour__isnull=False),
+                name="unique_statistique_jour",
+            )
+        ]
 
     def __str__(self):
         return f"Stats {self.periode} - {self.date_calcul.strftime('%Y-%m-%d')}"
 
 
+class CurseurRollup(models.Model):
+    """
+    Watermark du rollup: dernier JournalAction deja agrege, et ids sautes
+    (transactions pas encore commitees) a reprendre au passage suivant
+    """
+
+    nom = models.CharField(max_length=50, unique=True)
+    dernier_journal_id = models.BigIntegerField(default=0)
+    trous = models.JSONField(
+        default=dict, blank=True, help_text="Ids sautes: {id: premiere absence}"
+    )
+    date_maj = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Curseur Rollup"
+        verbose_name_plural = "Curseurs Rollup"
+
+    def __str__(self):
+        return f"{self.nom} -> {self.dernier_journal_id}"
+
+
 class PerformanceActeur(models.Model):
     """
     Performance individuelle des acteurs (gestionnaires, analystes, etc.)
@@ -144,3 +180,49 @@ class PredictionRisque(models.Model):
 
     def __str__(self):
         return f"Prediction {self.dossier.reference} - {self.classe_risque}"
+
+
+class TacheExport(models.Model):
+    """
+    Export (Excel/CSV) genere en arriere-plan hors du pool de requetes.
+    Le fichier est telechargeable une seule fois via un lien signe.
+    """
+
+    TYPES = [
+        ("EXCEL_STATISTIQUES", "Statistiques Excel"),
+        ("CSV_DOSSIERS", "Dossiers CSV"),
+    ]
+    STATUTS = [
+        ("EN_ATTENTE", "En attente"),
+        ("EN_COURS", "En cours"),
+        ("TERMINE", "Termine"),
+        ("ECHEC", "Echec"),
+    ]
+
+    utilisateur = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="taches_export"
+    )
+    type_export = models.CharField(max_length=30, choices=TYPES)
+    parametres = models.JSONField(default=dict, blank=True)
+    statut = models.CharField(max_length=20, choices=STATUTS, default="EN_ATTENTE")
+    progression = models.PositiveSmallIntegerField(default=0)
+
+    # Fichier genere (hors MEDIA_ROOT: jamais servi directement)
+    fichier = models.CharField(max_length=500, blank=True)
+    nom_fichier = models.CharField(max_length=200, blank=True)
+    erreur = models.TextField(blank=True)
+
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_debut = models.DateTimeField(null=True, blank=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+    expire_le = models.DateTimeField(null=True, blank=True, db_index=True)
+    telecharge_le = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tache Export"
+        verbose_name_plural = "Taches Export"
+        ordering = ["-date_creation"]
+        indexes = [models.Index(fields=["statut", "date_creation"])]
+
+    def __str__(self):
+        return f"Export {self.type_export} #{self.pk} - {self.statut}"
@@ -4,19 +4,114 @@ Auteur: NGUIMBI Juliana
 Date: Novembre 2025
 """
 
-from django.db.models import Count, Avg, Sum, Q, F
+from django.db.models import (
+    Count,
+    Avg,
+    Sum,
+    Q,
+    F,
+    OuterRef,
+    Subquery,
+    ExpressionWrapper,
+    DurationField,
+)
+from django.conf import settings
+from django.core import signing
+from django.db import close_old_connections, connection, transaction
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
-from datetime import timedelta, datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from datetime import date, timedelta, datetime
 from decimal import Decimal
-import pandas as pd
 import numpy as np
+from openpyxl import Workbook
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
+import csv
+import hashlib
+import io
 import joblib
+import logging
 import os
+import shutil
+import tempfile
+import threading
+import time
 
+from core.cache import KPI, MODELES, get_cache, get_or_set_locked
+from suivi_demande.constants import CACHE_TIMEOUT_STATS
+from suivi_demande.ml.credit_scoring import CreditScoringModel
 from suivi_demande.models import DossierCredit, JournalAction
-from .models import StatistiquesDossier, PerformanceActeur, PredictionRisque
+from suivi_demande.services.scope_service import ScopeService
+from .models import (
+    StatistiquesDossier,
+    PerformanceActeur,
+    PredictionRisque,
+    CurseurRollup,
+    TacheExport,
+)
+
+
+STATUTS_EN_COURS = [
+    "NOUVEAU",
+    "TRANSMIS_ANALYSTE",
+    "EN_COURS_ANALYSE",
+    "EN_COURS_VALIDATION_GGR",
+]
+STATUTS_APPROUVES = ["APPROUVE_ATTENTE_FONDS", "FONDS_LIBERE"]
+STATUTS_FINAUX = ["APPROUVE_ATTENTE_FONDS", "FONDS_LIBERE", "REFUSE"]
+
+CACHE_KEY_GRAPHIQUES = "analytics:graphiques"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StatistiquesPeriode:
+    """
+    Resultat stable du moteur d'agregation (independant du stockage)
+    """
+
+    total_dossiers: int = 0
+    dossiers_en_cours: int = 0
+    dossiers_approuves: int = 0
+    dossiers_rejetes: int = 0
+    dossiers_archives: int = 0
+    montant_total_demande: Decimal = Decimal("0")
+    montant_total_approuve: Decimal = Decimal("0")
+    montant_moyen_demande: Decimal = Decimal("0")
+    delai_moyen_traitement: float = 0.0
+
+    @property
+    def taux_approbation(self):
+        if not self.total_dossiers:
+            return 0
+        return self.dossiers_approuves / self.total_dossiers * 100
+
+    @property
+    def taux_rejet(self):
+        if not self.total_dossiers:
+            return 0
+        return self.dossiers_rejetes / self.total_dossiers * 100
+
+    def as_model_fields(self):
+        """Champs prets pour StatistiquesDossier.objects.create()"""
+        return {
+            "total_dossiers": self.total_dossiers,
+            "dossiers_en_cours": self.dossiers_en_cours,
+            "dossiers_approuves": self.dossiers_approuves,
+            "dossiers_rejetes": self.dossiers_rejetes,
+            "dossiers_archives": self.dossiers_archives,
+            "montant_total_demande": self.montant_total_demande,
+            "montant_total_approuve": self.montant_total_approuve,
+            "montant_moyen_demande": self.montant_moyen_demande,
+            "delai_moyen_traitement": self.delai_moyen_traitement,
+            "taux_approbation": self.taux_approbation,
+            "taux_rejet": self.taux_rejet,
+        }
 
 
 class AnalyticsService:
@@ -29,6 +124,22 @@ class AnalyticsService:
         """
         Calcule les statistiques pour une periode donnee
         """
+        resultat = AnalyticsService.agreger_dossiers(
+            AnalyticsService.dossiers_periode(periode)
+        )
+
+        # Creer l'enregistrement statistique
+        stats = StatistiquesDossier.objects.create(
+            periode=periode, **resultat.as_model_fields()
+        )
+
+        return stats
+
+    @staticmethod
+    def dossiers_periode(periode="MOIS"):
+        """
+        Dossiers soumis pendant la periode (JOUR, SEMAINE, MOIS ou ANNEE)
+        """
         # Determiner la date de debut selon la periode
         now = timezone.now()
         if periode == "JOUR":
@@ -40,88 +151,65 @@ class AnalyticsService:
         else:  # ANNEE
             date_debut = now - timedelta(days=365)
 
-        # Recuperer les dossiers de la periode
-        dossiers = DossierCredit.objects.filter(date_soumission__gte=date_debut)
+        return DossierCredit.objects.filter(date_soumission__gte=date_debut)
 
-        # Compteurs
-        total = dossiers.count()
-        en_cours = dossiers.filter(
-            statut_agent__in=[
-                "NOUVEAU",
-                "TRANSMIS_ANALYSTE",
-                "EN_COURS_ANALYSE",
-                "EN_COURS_VALIDATION_GGR",
-            ]
-        ).count()
-        approuves = dossiers.filter(
-            statut_agent__in=["APPROUVE_ATTENTE_FONDS", "FONDS_LIBERE"]
-        ).count()
-        rejetes = dossiers.filter(statut_agent="REFUSE").count()
-        archives = dossiers.filter(is_archived=True).count()
-
-        # Montants
-        montant_total = (
-            dossiers.aggregate(Sum("montant"))["montant__sum"] or 0
-        )
-        montant_approuve = (
-            dossiers.filter(
-                statut_agent__in=["APPROUVE_ATTENTE_FONDS", "FONDS_LIBERE"]
-            ).aggregate(Sum("montant"))["montant__sum"]
-            or 0
-        )
-        montant_moyen = (
-            dossiers.aggregate(Avg("montant"))["montant__avg"] or 0
+    @staticmethod
+    def agreger_dossiers(dossiers):
+        """
+        Calcule compteurs, montants et delai moyen d'un queryset de dossiers.
+        Deux requetes au total, quel que soit le volume:
+        une agregation conditionnelle et un passage Subquery sur le journal.
+        """
+        approuves = Q(statut_agent__in=STATUTS_APPROUVES)
+        agregats = dossiers.order_by().aggregate(
+            total=Count("id"),
+            en_cours=Count("id", filter=Q(statut_agent__in=STATUTS_EN_COURS)),
+            approuves=Count("id", filter=approuves),
+            rejetes=Count("id", filter=Q(statut_agent="REFUSE")),
+            archives=Count("id", filter=Q(is_archived=True)),
+            montant_total=Sum("montant"),
+            montant_approuve=Sum("montant", filter=approuves),
+            montant_moyen=Avg("montant"),
         )
 
-        # Delais (calcul simplifie)
-        delai_moyen = AnalyticsService._calculer_delai_moyen(dossiers)
-
-        # Taux
-        taux_approbation = (approuves / total * 100) if total > 0 else 0
-        taux_rejet = (rejetes / total * 100) if total > 0 else 0
-
-        # Creer l'enregistrement statistique
-        stats = StatistiquesDossier.objects.create(
-            periode=periode,
-            total_dossiers=total,
-            dossiers_en_cours=en_cours,
-            dossiers_approuves=approuves,
-            dossiers_rejetes=rejetes,
-            dossiers_archives=archives,
-            montant_total_demande=montant_total,
-            montant_total_approuve=montant_approuve,
-            montant_moyen_demande=montant_moyen,
-            delai_moyen_traitement=delai_moyen,
-            taux_approbation=taux_approbation,
-            taux_rejet=taux_rejet,
+        return StatistiquesPeriode(
+            total_dossiers=agregats["total"],
+            dossiers_en_cours=agregats["en_cours"],
+            dossiers_approuves=agregats["approuves"],
+            dossiers_rejetes=agregats["rejetes"],
+            dossiers_archives=agregats["archives"],
+            montant_total_demande=agregats["montant_total"] or Decimal("0"),
+            montant_total_approuve=agregats["montant_approuve"] or Decimal("0"),
+            montant_moyen_demande=agregats["montant_moyen"] or Decimal("0"),
+            delai_moyen_traitement=AnalyticsService._calculer_delai_moyen(dossiers),
         )
 
-        return stats
-
     @staticmethod
     def _calculer_delai_moyen(dossiers):
         """
         Calcule le delai moyen de traitement en jours
+        (soumission -> derniere action du journal, dossiers finalises)
         """
-        delais = []
-        for dossier in dossiers:
-            if dossier.statut_agent in [
-                "APPROUVE_ATTENTE_FONDS",
-                "FONDS_LIBERE",
-                "REFUSE",
-            ]:
-                # Calculer le delai entre creation et decision finale
-                derniere_action = (
-                    JournalAction.objects.filter(dossier=dossier)
-                    .order_by("-timestamp")
-                    .first()
+        derniere_action = (
+            JournalAction.objects.filter(dossier=OuterRef("pk"))
+            .order_by("-timestamp")
+            .values("timestamp")[:1]
+        )
+        resultat = (
+            dossiers.filter(statut_agent__in=STATUTS_FINAUX)
+            .order_by()
+            .annotate(derniere_action=Subquery(derniere_action))
+            .aggregate(
+                delai=Avg(
+                    ExpressionWrapper(
+                        F("derniere_action") - F("date_soumission"),
+                        output_field=DurationField(),
+                    )
                 )
-
-                if derniere_action:
-                    delai = (derniere_action.timestamp - dossier.date_soumission).days
-                    delais.append(delai)
-
-        return sum(delais) / len(delais) if delais else 0
+            )
+        )
+        delai = resultat["delai"]
+        return delai.total_seconds() / 86400 if delai else 0
 
     @staticmethod
     def obtenir_kpis_dashboard():
@@ -173,48 +261,404 @@ class AnalyticsService:
     @staticmethod
     def obtenir_donnees_graphiques():
         """
-        Retourne les donnees pour les graphiques Charts.js
+        Retourne les donnees pour les graphiques Charts.js.
+        Une seule requete groupee par cache miss; le cache est invalide
+        par les signaux lorsqu'un dossier change de statut.
         """
-        # e‰volution mensuelle des dossiers (12 derniers mois)
-        mois_labels = []
-        mois_data = []
+        return get_or_set_locked(
+            KPI,
+            CACHE_KEY_GRAPHIQUES,
+            AnalyticsService._calculer_donnees_graphiques,
+            CACHE_TIMEOUT_STATS,
+        )
 
-        for i in range(11, -1, -1):
-            date = timezone.now() - timedelta(days=30 * i)
-            mois_labels.append(date.strftime("%b %Y"))
-            count = DossierCredit.objects.filter(
-                date_soumission__month=date.month, date_soumission__year=date.year
-            ).count()
-            mois_data.append(count)
+    @staticmethod
+    def invalider_cache_graphiques():
+        get_cache(KPI).delete(CACHE_KEY_GRAPHIQUES)
+
+    @staticmethod
+    def _derniers_mois(nombre=12):
+        """Serie des `nombre` derniers mois calendaires (du plus ancien au courant)"""
+        aujourd_hui = timezone.localdate()
+        mois = []
+        annee, numero = aujourd_hui.year, aujourd_hui.month
+        for _ in range(nombre):
+            mois.append(date(annee, numero, 1))
+            numero -= 1
+            if numero == 0:
+                annee, numero = annee - 1, 12
+        return list(reversed(mois))
 
-        # Repartition par statut
-        statuts = DossierCredit.objects.values("statut_agent").annotate(
-            count=Count("id")
+    @staticmethod
+    def _calculer_donnees_graphiques():
+        """
+        Evolution mensuelle, statuts et produits depuis un seul GROUP BY
+        """
+        serie_mois = AnalyticsService._derniers_mois(12)
+        lignes = (
+            DossierCredit.objects.order_by()
+            .annotate(mois=TruncMonth("date_soumission"))
+            .values("mois", "statut_agent", "produit")
+            .annotate(count=Count("id"))
         )
-        statuts_labels = [s["statut_agent"] for s in statuts]
-        statuts_data = [s["count"] for s in statuts]
 
-        # Repartition par type de credit
-        types = DossierCredit.objects.values("produit").annotate(count=Count("id"))
-        types_labels = [t["produit"] for t in types]
-        types_data = [t["count"] for t in types]
+        par_mois = defaultdict(int)
+        par_statut = defaultdict(int)
+        par_type = defaultdict(int)
+        for ligne in lignes:
+            if ligne["mois"]:
+                par_mois[ligne["mois"].date().replace(day=1)] += ligne["count"]
+            par_statut[ligne["statut_agent"]] += ligne["count"]
+            par_type[ligne["produit"]] += ligne["count"]
 
         return {
             "evolution_mensuelle": {
-                "labels": mois_labels,
-                "data": mois_data,
+                "labels": [m.strftime("%b %Y") for m in serie_mois],
+                "data": [par_mois.get(m, 0) for m in serie_mois],
             },
             "repartition_statuts": {
-                "labels": statuts_labels,
-                "data": statuts_data,
+                "labels": list(par_statut.keys()),
+                "data": list(par_statut.values()),
             },
             "repartition_types": {
-                "labels": types_labels,
-                "data": types_data,
+                "labels": list(par_type.keys()),
+                "data": list(par_type.values()),
             },
         }
 
 
+class RollupService:
+    """
+    Rollup incremental des KPIs par jour, alimente par le journal des actions.
+    Les vues semaine/mois/annee somment les buckets journaliers
+    (StatistiquesDossier periode JOUR) au lieu de parcourir DossierCredit.
+    """
+
+    CURSEUR = "statistiques_journalieres"
+    TAILLE_LOT = 2000
+    JOURS_PAR_PERIODE = {"JOUR": 1, "SEMAINE": 7, "MOIS": 30, "ANNEE": 365}
+    # Un id saute est reattendu pendant DELAI_TROUS secondes (transaction
+    # longue); au-dela il est considere comme annule (rollback)
+    DELAI_TROUS = 3600
+    TROUS_MAX = 10000
+    # Au-dela, une action non agregee signale un rollup arrete ou jamais lance
+    DELAI_RETARD = 900
+
+    @staticmethod
+    def en_retard():
+        """
+        Vrai si le journal contient une action non agregee depuis plus de
+        DELAI_RETARD secondes (premier deploiement, worker rollup arrete)
+        """
+        watermark = (
+            CurseurRollup.objects.filter(nom=RollupService.CURSEUR)
+            .values_list("dernier_journal_id", flat=True)
+            .first()
+            or 0
+        )
+        limite = timezone.now() - timedelta(seconds=RollupService.DELAI_RETARD)
+        return JournalAction.objects.filter(
+            id__gt=watermark, timestamp__lt=limite
+        ).exists()
+
+    @staticmethod
+    def traiter_nouvelles_actions(taille_lot=None, max_lots=None):
+        """
+        Agrege les JournalAction posterieures au watermark, ainsi que celles
+        commitees apres coup sous un id deja depasse.
+        Retourne le nombre d'actions traitees.
+        """
+        taille_lot = taille_lot or RollupService.TAILLE_LOT
+        total = 0
+        lots = 0
+        while max_lots is None or lots < max_lots:
+            traitees = RollupService._traiter_lot(taille_lot)
+            total += traitees
+            lots += 1
+            if traitees < taille_lot:
+                break
+        return total
+
+    @staticmethod
+    @transaction.atomic
+    def _traiter_lot(taille_lot):
+        """
+        Traite un lot d'actions sous verrou du curseur (un seul worker a la fois).
+        Les ids sont attribues a l'insertion mais visibles au commit: une
+        transaction plus ancienne peut apparaitre sous un id inferieur au
+        watermark. Les ids sautes sont donc memorises et relus aux passages
+        suivants; chaque action n'est agregee qu'une fois.
+        """
+        curseur, _ = CurseurRollup.objects.select_for_update().get_or_create(
+            nom=RollupService.CURSEUR
+        )
+        watermark = curseur.dernier_journal_id
+        trous = {int(id_): vu for id_, vu in (curseur.trous or {}).items()}
+        nouvelles = Q(id__gt=watermark)
+        if trous:
+            nouvelles |= Q(id__in=list(trous))
+        actions = list(
+            JournalAction.objects.filter(nouvelles)
+            .order_by("id")
+            .values_list(
+                "id",
+                "timestamp",
+                "action",
+                "de_statut",
+                "vers_statut",
+                "dossier__montant",
+                "dossier__date_soumission",
+            )[:taille_lot]
+        )
+
+        maintenant = time.time()
+        ids = [action[0] for action in actions]
+        for id_ in ids:
+            trous.pop(id_, None)
+        au_dela = [id_ for id_ in ids if id_ > watermark]
+        if au_dela:
+            fin = au_dela[-1]
+            if fin - watermark - len(au_dela) <= RollupService.TROUS_MAX:
+                for id_ in set(range(watermark + 1, fin)).difference(au_dela):
+                    trous[id_] = maintenant
+            else:
+                logger.warning(
+                    f"Rollup: saut d'ids {watermark} -> {fin} non suivi (trop large)"
+                )
+            watermark = fin
+        trous = {
+            id_: vu
+            for id_, vu in trous.items()
+            if maintenant - vu < RollupService.DELAI_TROUS
+        }
+
+        RollupService._agreger(actions)
+
+        curseur.dernier_journal_id = watermark
+        curseur.trous = {str(id_): vu for id_, vu in trous.items()}
+        curseur.save(update_fields=["dernier_journal_id", "trous", "date_maj"])
+        return len(actions)
+
+    @staticmethod
+    def _agreger(actions):
+        """Ajoute un lot d'actions aux buckets journaliers"""
+        buckets = defaultdict(
+            lambda: {
+                "soumis": 0,
+                "montant_demande": Decimal("0"),
+                "approuves": 0,
+                "montant_approuve": Decimal("0"),
+                "rejetes": 0,
+                "delai_total": 0.0,
+                "delais": 0,
+                "statuts": defaultdict(int),
+            }
+        )
+        for (
+            _,
+            timestamp,
+            type_action,
+            de_statut,
+            vers_statut,
+            montant,
+            soumission,
+        ) in actions:
+            bucket = buckets[timezone.localdate(timestamp)]
+            montant = montant or Decimal("0")
+            if type_action == "CREATION":
+                bucket["soumis"] += 1
+                bucket["montant_demande"] += montant
+            if vers_statut:
+                bucket["statuts"][vers_statut] += 1
+            # Entree dans les statuts approuves (approbation ou liberation
+            # directe), comptee une seule fois par dossier
+            if (
+                vers_statut in STATUTS_APPROUVES
+                and de_statut not in STATUTS_APPROUVES
+            ):
+                bucket["approuves"] += 1
+                bucket["montant_approuve"] += montant
+            elif vers_statut == "REFUSE" and de_statut != "REFUSE":
+                bucket["rejetes"] += 1
+            if (
+                vers_statut in STATUTS_FINAUX
+                and de_statut not in STATUTS_FINAUX
+                and soumission
+            ):
+                delai = timestamp - soumission
+                bucket["delai_total"] += delai.total_seconds() / 86400
+                bucket["delais"] += 1
+
+        for jour, bucket in buckets.items():
+            stat, _ = StatistiquesDossier.objects.select_for_update().get_or_create(
+                jour=jour, defaults={"periode": "JOUR"}
+            )
+            stat.total_dossiers += bucket["soumis"]
+            stat.montant_total_demande += bucket["montant_demande"]
+            stat.dossiers_approuves += bucket["approuves"]
+            stat.montant_total_approuve += bucket["montant_approuve"]
+            stat.dossiers_rejetes += bucket["rejetes"]
+            stat.delai_total_jours += bucket["delai_total"]
+            stat.nombre_delais += bucket["delais"]
+            repartition = dict(stat.repartition_statuts or {})
+            for statut, nombre in bucket["statuts"].items():
+                repartition[statut] = repartition.get(statut, 0) + nombre
+            stat.repartition_statuts = repartition
+            RollupService._appliquer_derives(stat)
+            stat.save()
+
+    @staticmethod
+    def _appliquer_derives(stat):
+        """
+        Recalcule moyennes et taux d'un bucket a partir de ses sommes.
+        Les stocks (en cours, archives) n'ont pas de sens par jour de flux:
+        ils sont calcules a la lecture (statistiques_periode).
+        """
+        total = stat.total_dossiers
+        stat.montant_moyen_demande = (
+            stat.montant_total_demande / total if total else Decimal("0")
+        )
+        stat.delai_moyen_traitement = (
+            stat.delai_total_jours / stat.nombre_delais if stat.nombre_delais else 0
+        )
+        stat.taux_approbation = stat.dossiers_approuves / total * 100 if total else 0
+        stat.taux_rejet = stat.dossiers_rejetes / total * 100 if total else 0
+
+    @staticmethod
+    def statistiques_periode(periode="MOIS"):
+        """
+        Somme les buckets journaliers de la periode (O(jours), pas O(dossiers)).
+        Semantique de flux: dossiers soumis, approuves et refuses dans la fenetre.
+        Les stocks (en cours, archives) sont le statut actuel des dossiers
+        soumis dans la fenetre, en une requete agregee.
+        """
+        jours = RollupService.JOURS_PAR_PERIODE.get(periode, 365)
+        debut = timezone.localdate() - timedelta(days=jours)
+        sommes = StatistiquesDossier.objects.filter(
+            periode="JOUR", jour__gt=debut
+        ).aggregate(
+            total=Sum("total_dossiers"),
+            approuves=Sum("dossiers_approuves"),
+            rejetes=Sum("dossiers_rejetes"),
+            montant_total=Sum("montant_total_demande"),
+            montant_approuve=Sum("montant_total_approuve"),
+            delai_total=Sum("delai_total_jours"),
+            delais=Sum("nombre_delais"),
+        )
+        stocks = (
+            DossierCredit.objects.filter(
+                date_soumission__gte=timezone.make_aware(
+                    datetime.combine(debut + timedelta(days=1), datetime.min.time())
+                )
+            )
+            .order_by()
+            .aggregate(
+                en_cours=Count("id", filter=Q(statut_agent__in=STATUTS_EN_COURS)),
+                archives=Count("id", filter=Q(is_archived=True)),
+            )
+        )
+        total = sommes["total"] or 0
+        montant_total = sommes["montant_total"] or Decimal("0")
+        delais = sommes["delais"] or 0
+
+        return StatistiquesPeriode(
+            total_dossiers=total,
+            dossiers_en_cours=stocks["en_cours"],
+            dossiers_approuves=sommes["approuves"] or 0,
+            dossiers_rejetes=sommes["rejetes"] or 0,
+            dossiers_archives=stocks["archives"],
+            montant_total_demande=montant_total,
+            montant_total_approuve=sommes["montant_approuve"] or Decimal("0"),
+            montant_moyen_demande=montant_total / total if total else Decimal("0"),
+            delai_moyen_traitement=(sommes["delai_total"] or 0) / delais if delais else 0,
+        )
+
+    @staticmethod
+    def creer_instantane(periode="MOIS"):
+        """
+        Enregistre un instantane StatistiquesDossier calcule depuis les rollups
+        """
+        resultat = RollupService.statistiques_periode(periode)
+        return StatistiquesDossier.objects.create(
+            periode=periode, **resultat.as_model_fields()
+        )
+
+
+class RegistreModeles:
+    """
+    Registre processus des modeles serialises (joblib).
+    Chaque fichier est charge une fois par worker; il est recharge seulement si
+    son mtime change ET que son empreinte SHA-256 differe.
+    """
+
+    _entrees = {}  # chemin -> {"mtime": ..., "empreinte": ..., "objet": ...}
+    _verrou = threading.Lock()
+
+    @classmethod
+    def obtenir(cls, chemin):
+        """
+        Retourne l'objet charge pour `chemin`, ou None si le fichier n'existe pas
+        """
+        try:
+            mtime = os.stat(chemin).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        entree = cls._entrees.get(chemin)
+        if entree is not None and entree["mtime"] == mtime:
+            return entree["objet"]
+
+        with cls._verrou:
+            entree = cls._entrees.get(chemin)
+            if entree is not None and entree["mtime"] == mtime:
+                return entree["objet"]
+
+            empreinte = cls._empreinte_partagee(chemin, mtime)
+            if entree is not None and entree["empreinte"] == empreinte:
+                # Fichier touche sans changement de contenu
+                entree["mtime"] = mtime
+                return entree["objet"]
+
+            objet = joblib.load(chemin)
+            cls._entrees[chemin] = {
+                "mtime": mtime,
+                "empreinte": empreinte,
+                "objet": objet,
+            }
+            logger.info(f"Modele charge: {chemin} ({empreinte[:12]})")
+            return objet
+
+    @classmethod
+    def version(cls, chemin):
+        """Empreinte courte du modele charge (utilisee comme version)"""
+        entree = cls._entrees.get(chemin)
+        return entree["empreinte"][:12] if entree else None
+
+    @classmethod
+    def vider(cls):
+        with cls._verrou:
+            cls._entrees.clear()
+
+    @classmethod
+    def _empreinte_partagee(cls, chemin, mtime):
+        """
+        Empreinte publiee dans le cache partage: un seul worker relit et
+        hache un fichier donne (meme chemin, meme mtime).
+        """
+        cle = f"empreinte:{hashlib.md5(chemin.encode()).hexdigest()}:{mtime}"
+        return get_or_set_locked(
+            MODELES, cle, lambda: cls._empreinte(chemin), 24 * 3600
+        )
+
+    @staticmethod
+    def _empreinte(chemin):
+        sha = hashlib.sha256()
+        with open(chemin, "rb") as fichier:
+            for bloc in iter(lambda: fichier.read(1024 * 1024), b""):
+                sha.update(bloc)
+        return sha.hexdigest()
+
+
 class MLPredictionService:
     """
     Service de prediction de risque credit avec Machine Learning
@@ -223,6 +667,17 @@ class MLPredictionService:
     MODEL_PATH = "analytics/ml_models/credit_risk_model.pkl"
     SCALER_PATH = "analytics/ml_models/scaler.pkl"
 
+    # Colonnes lues en base pour construire les features (voir _matrice_features)
+    CHAMPS_FEATURES = CreditScoringModel.FEATURE_FIELDS
+    STATUTS_INACTIFS = ["FONDS_LIBERE", "REFUSE"]
+    TAILLE_LOT = 2000
+
+    RECOMMANDATIONS = {
+        "FAIBLE": "Dossier e  faible risque. Approbation recommandee.",
+        "MOYEN": "Dossier e  risque modere. Analyse approfondie recommandee.",
+        "ELEVE": "Dossier e  risque eleve. Prudence recommandee.",
+    }
+
     @staticmethod
     def entrainer_modele():
         """
@@ -237,18 +692,15 @@ class MLPredictionService:
         if dossiers.count() < 10:
             return None  # Pas assez de donnees
 
-        # Preparer les features
-        X = []
-        y = []
-
-        for dossier in dossiers:
-            features = MLPredictionService._extraire_features(dossier)
-            X.append(features)
-            # Label: 1 si rejete, 0 si approuve
-            y.append(1 if dossier.statut_agent == "REFUSE" else 0)
-
-        X = np.array(X)
-        y = np.array(y)
+        # Preparer les features (une seule requete, sans instancier les modeles)
+        lignes = list(
+            dossiers.values_list(
+                "statut_agent", *MLPredictionService.CHAMPS_FEATURES
+            )
+        )
+        X = MLPredictionService._matrice_features([ligne[1:] for ligne in lignes])
+        # Label: 1 si rejete, 0 si approuve
+        y = np.array([1 if ligne[0] == "REFUSE" else 0 for ligne in lignes])
 
         # Normalisation
         scaler = StandardScaler()
@@ -270,34 +722,52 @@ class MLPredictionService:
         """
         Extrait les features d'un dossier pour le ML
         """
-        return [
-            float(dossier.montant or 0),
-            float(dossier.duree_mois or 0),
-            (
-                float(dossier.revenu_mensuel or 0)
-                if hasattr(dossier, "revenu_mensuel")
-                else 0
-            ),
-            1 if dossier.type_credit == "IMMOBILIER" else 0,
-            1 if dossier.type_credit == "CONSOMMATION" else 0,
-            1 if dossier.type_credit == "PROFESSIONNEL" else 0,
-        ]
+        canevas = getattr(dossier, "canevas", None)
+        ligne = (
+            dossier.montant,
+            canevas.demande_duree_mois if canevas else None,
+            canevas.salaire_net_moyen_fcfa if canevas else None,
+            canevas.capacite_endettement_nette_fcfa if canevas else None,
+        )
+        return MLPredictionService._matrice_features([ligne])[0].tolist()
 
     @staticmethod
-    def predire_risque(dossier):
+    def _matrice_features(lignes):
         """
-        Predit le risque pour un dossier donne
+        Construit la matrice de features (n x 5) a partir de lignes
+        (montant, duree, salaire, capacite) issues de CHAMPS_FEATURES.
+        Memes colonnes que CreditScoringModel; les valeurs absentes
+        (pas de canevas) valent 0.
         """
-        # Verifier si le modele existe
-        if not os.path.exists(MLPredictionService.MODEL_PATH):
-            MLPredictionService.entrainer_modele()
+        brut = np.array(lignes, dtype=float).reshape(-1, 4)
+        return CreditScoringModel.features_matrix(np.nan_to_num(brut, nan=0.0))
 
-        if not os.path.exists(MLPredictionService.MODEL_PATH):
-            return None  # Pas assez de donnees pour entrainer
+    @staticmethod
+    def charger_modele():
+        """
+        Retourne (modele, scaler) depuis le registre processus, ou None si le
+        modele n'a pas encore ete entraine (commande entrainer_modele_risque).
+        """
+        model = RegistreModeles.obtenir(MLPredictionService.MODEL_PATH)
+        scaler = RegistreModeles.obtenir(MLPredictionService.SCALER_PATH)
+        if model is None or scaler is None:
+            return None
+        return model, scaler
+
+    @staticmethod
+    def version_modele():
+        return RegistreModeles.version(MLPredictionService.MODEL_PATH) or "v1.0"
 
-        # Charger le modele
-        model = joblib.load(MLPredictionService.MODEL_PATH)
-        scaler = joblib.load(MLPredictionService.SCALER_PATH)
+    @staticmethod
+    def predire_risque(dossier):
+        """
+        Predit le risque pour un dossier donne.
+        N'entraine jamais le modele dans la requete: sans modele, retourne None.
+        """
+        charge = MLPredictionService.charger_modele()
+        if charge is None:
+            return None  # Modele non entraine
+        model, scaler = charge
 
         # Extraire features
         features = np.array([MLPredictionService._extraire_features(dossier)])
@@ -306,19 +776,7 @@ class MLPredictionService:
         # Prediction
         probabilite_defaut = model.predict_proba(features_scaled)[0][1]
         score_risque = probabilite_defaut * 100
-
-        # Classification
-        if score_risque < 30:
-            classe_risque = "FAIBLE"
-            recommandation = "Dossier e  faible risque. Approbation recommandee."
-        elif score_risque < 60:
-            classe_risque = "MOYEN"
-            recommandation = (
-                "Dossier e  risque modere. Analyse approfondie recommandee."
-            )
-        else:
-            classe_risque = "ELEVE"
-            recommandation = "Dossier e  risque eleve. Prudence recommandee."
+        classe_risque = MLPredictionService._classer(np.array([score_risque]))[0]
 
         # Creer ou mettre e  jour la prediction
         prediction, created = PredictionRisque.objects.update_or_create(
@@ -327,72 +785,172 @@ class MLPredictionService:
                 "score_risque": score_risque,
                 "probabilite_defaut": probabilite_defaut,
                 "classe_risque": classe_risque,
-                "recommandation": recommandation,
+                "recommandation": MLPredictionService.RECOMMANDATIONS[classe_risque],
                 "confiance": 0.75,  # Simplifie
-                "facteurs_risque": {
-                    "montant": float(dossier.montant),
-                    "duree": dossier.duree_mois,
-                    "type": dossier.type_credit,
-                },
+                "modele_version": MLPredictionService.version_modele(),
+                "facteurs_risque": MLPredictionService._facteurs(features[0]),
             },
         )
 
         return prediction
 
+    @staticmethod
+    def _classer(scores):
+        """
+        Classe un vecteur de scores (0-100) en FAIBLE / MOYEN / ELEVE
+        """
+        return np.select(
+            [scores < 30, scores < 60], ["FAIBLE", "MOYEN"], default="ELEVE"
+        )
+
+    @staticmethod
+    def _facteurs(features):
+        montant, duree, salaire, capacite, ratio = features
+        return {
+            "montant": float(montant),
+            "duree": int(duree),
+            "ratio_endettement": round(float(ratio), 4),
+        }
+
+    @staticmethod
+    def scorer_portefeuille(dossiers=None, taille_lot=None):
+        """
+        Score en lot le portefeuille actif (ou `dossiers` si fourni).
+        Les dossiers sont lus par paquets via values_list, chaque paquet est
+        score par un seul appel predict_proba et ecrit par un bulk_create
+        avec update_conflicts (upsert sur dossier).
+
+        Retourne le nombre de predictions ecrites, ou None sans modele.
+        """
+        charge = MLPredictionService.charger_modele()
+        if charge is None:
+            return None
+        model, scaler = charge
+        taille_lot = taille_lot or MLPredictionService.TAILLE_LOT
+
+        if dossiers is None:
+            dossiers = DossierCredit.objects.exclude(
+                statut_agent__in=MLPredictionService.STATUTS_INACTIFS
+            )
+        lignes = (
+            dossiers.order_by("id")
+            .values_list("id", *MLPredictionService.CHAMPS_FEATURES)
+            .iterator(chunk_size=taille_lot)
+        )
+
+        version = MLPredictionService.version_modele()
+        total = 0
+        while True:
+            lot = list(islice(lignes, taille_lot))
+            if not lot:
+                break
+            total += MLPredictionService._scorer_lot(
+                lot, model, scaler, version
+            )
+
+        logger.info(f"Scoring en lot termine: {total} dossiers ({version})")
+        return total
+
+    @staticmethod
+    def _scorer_lot(lot, model, scaler, version):
+        ids = [ligne[0] for ligne in lot]
+        features = MLPredictionService._matrice_features(
+            [ligne[1:] for ligne in lot]
+        )
+        probabilites = model.predict_proba(scaler.transform(features))[:, 1]
+        scores = probabilites * 100
+        classes = MLPredictionService._classer(scores)
+
+        predictions = [
+            PredictionRisque(
+                dossier_id=dossier_id,
+                score_risque=float(score),
+                probabilite_defaut=float(probabilite),
+                classe_risque=str(classe),
+                recommandation=MLPredictionService.RECOMMANDATIONS[str(classe)],
+                confiance=0.75,
+                modele_version=version,
+                facteurs_risque=MLPredictionService._facteurs(ligne),
+            )
+            for dossier_id, score, probabilite, classe, ligne in zip(
+                ids, scores, probabilites, classes, features
+            )
+        ]
+        PredictionRisque.objects.bulk_create(
+            predictions,
+            update_conflicts=True,
+            unique_fields=["dossier"],
+            update_fields=[
+                "score_risque",
+                "probabilite_defaut",
+                "classe_risque",
+                "recommandation",
+                "confiance",
+                "modele_version",
+                "facteurs_risque",
+                "date_prediction",
+            ],
+        )
+        return len(predictions)
+
 
 class ExportService:
     """
     Service d'export de donnees (Excel, PDF)
     """
 
+    LIBELLES_EXPORT = {
+        "GESTIONNAIRE": "Gestionnaire - Dossiers actifs",
+        "ANALYSTE": "Analyste - Dossiers analysés",
+        "RESPONSABLE_GGR": "Responsable GGR - Dossiers validation",
+        "BOE": "BOE - Dossiers liberation fonds",
+    }
+    COLONNES_EXCEL = [
+        "Référence",
+        "Client",
+        "Produit",
+        "Montant",
+        "Statut",
+        "Date soumission",
+        "Date MAJ",
+    ]
+    TAILLE_LOT = 2000
+
     @staticmethod
-    def exporter_statistiques_excel(user=None):
+    def exporter_statistiques_excel(user=None, progression=None):
         """
-        Exporte les statistiques en Excel avec pandas.
+        Exporte les statistiques en Excel (openpyxl, mode ecriture seule).
         Filtre les dossiers selon le role de l'utilisateur connecte.
+        Retourne le chemin d'un fichier temporaire unique, a supprimer par
+        l'appelant une fois servi.
+        `progression(faits, total)` est appele apres chaque lot ecrit.
         """
         # Determiner le role et filtrer les dossiers
-        role_label = "Tous les dossiers"
-        queryset = DossierCredit.objects.all()
-
-        if user and hasattr(user, "profile"):
-            role = user.profile.role
-            if role == "GESTIONNAIRE":
-                queryset = queryset.filter(is_archived=False)
-                role_label = "Gestionnaire - Dossiers actifs"
-            elif role == "ANALYSTE":
-                queryset = queryset.filter(
-                    statut_agent__in=[
-                        "TRANSMIS_ANALYSTE",
-                        "EN_COURS_ANALYSE",
-                        "APPROUVE_ATTENTE_FONDS",
-                        "FONDS_LIBERE",
-                        "REFUSE",
-                    ]
-                )
-                role_label = "Analyste - Dossiers analysés"
-            elif role == "RESPONSABLE_GGR":
-                queryset = queryset.filter(
-                    statut_agent__in=[
-                        "EN_COURS_VALIDATION_GGR",
-                        "EN_ATTENTE_DECISION_DG",
-                        "APPROUVE_ATTENTE_FONDS",
-                        "FONDS_LIBERE",
-                        "REFUSE",
-                    ]
-                )
-                role_label = "Responsable GGR - Dossiers validation"
-            elif role == "BOE":
-                queryset = queryset.filter(
-                    statut_agent__in=[
-                        "APPROUVE_ATTENTE_FONDS",
-                        "FONDS_LIBERE",
-                    ]
-                )
-                role_label = "BOE - Dossiers liberation fonds"
-            # SUPER_ADMIN et CLIENT : pas de filtre supplementaire
+        if user is not None:
+            queryset = ScopeService.get_queryset(user, "export")
+            role = ScopeService.get_descriptor(user, "export")["role"]
+        else:
+            queryset = DossierCredit.objects.all()
+            role = None
+        # SUPER_ADMIN et CLIENT : pas de filtre supplementaire
+        role_label = ExportService.LIBELLES_EXPORT.get(role, "Tous les dossiers")
+
+        # Statistiques agregees (une requete, calculees en base)
+        stats = queryset.aggregate(
+            total=Count("id"),
+            montant_total=Sum("montant"),
+            montant_moyen=Avg("montant"),
+            approuves=Count("id", filter=Q(statut_agent__in=STATUTS_APPROUVES)),
+        )
+        total = stats["total"]
 
-        dossiers = queryset.values(
+        # Classeur en ecriture seule: les lignes sont ecrites au fil du
+        # curseur, la memoire reste constante quel que soit le volume
+        workbook = Workbook(write_only=True)
+
+        feuille = workbook.create_sheet("Dossiers")
+        feuille.append(ExportService.COLONNES_EXCEL)
+        lignes = queryset.order_by("id").values_list(
             "reference",
             "client__username",
             "produit",
@@ -401,54 +959,404 @@ class ExportService:
             "date_soumission",
             "date_maj",
         )
+        lignes = lignes.iterator(chunk_size=ExportService.TAILLE_LOT)
+        for faits, ligne in enumerate(lignes, start=1):
+            # Supprimer les timezones pour compatibilite Excel
+            feuille.append(
+                [
+                    (
+                        valeur.replace(tzinfo=None)
+                        if isinstance(valeur, datetime)
+                        else valeur
+                    )
+                    for valeur in ligne
+                ]
+            )
+            if progression and faits % ExportService.TAILLE_LOT == 0:
+                progression(faits, total)
 
-        # Creer DataFrame
-        df = pd.DataFrame(list(dossiers))
-
-        if len(df) > 0:
-            df.columns = [
-                "Référence",
-                "Client",
-                "Produit",
-                "Montant",
-                "Statut",
-                "Date soumission",
-                "Date MAJ",
+        feuille_stats = workbook.create_sheet("Statistiques")
+        feuille_stats.append(
+            [
+                "Rapport",
+                "Total dossiers",
+                "Montant total",
+                "Montant moyen",
+                "Taux approbation",
+                "Date export",
             ]
-            # Supprimer les timezones pour compatibilite Excel
-            for col in ["Date soumission", "Date MAJ"]:
-                if col in df.columns and hasattr(df[col], "dt"):
-                    df[col] = df[col].dt.tz_localize(None)
-        else:
-            df = pd.DataFrame(columns=[
-                "Référence", "Client", "Produit", "Montant",
-                "Statut", "Date soumission", "Date MAJ",
-            ])
-
-        # Statistiques agregees
-        stats = {
-            "Rapport": [role_label],
-            "Total dossiers": [len(df)],
-            "Montant total": [df["Montant"].sum() if len(df) > 0 else 0],
-            "Montant moyen": [df["Montant"].mean() if len(df) > 0 else 0],
-            "Taux approbation": [
-                (len(df[df["Statut"].isin(["APPROUVE_ATTENTE_FONDS", "FONDS_LIBERE"])])
-                / len(df)
-                * 100) if len(df) > 0 else 0
-            ],
-            "Date export": [timezone.now().strftime("%d/%m/%Y %H:%M")],
-        }
-        df_stats = pd.DataFrame(stats)
+        )
+        feuille_stats.append(
+            [
+                role_label,
+                total,
+                stats["montant_total"] or 0,
+                stats["montant_moyen"] or 0,
+                stats["approuves"] / total * 100 if total else 0,
+                timezone.now().strftime("%d/%m/%Y %H:%M"),
+            ]
+        )
+
+        # Fichier temporaire unique (pas de collision entre exports simultanes)
+        nom = ExportService.nom_fichier_excel(user)
+        descripteur, filepath = tempfile.mkstemp(
+            prefix=f"{os.path.splitext(nom)[0]}_", suffix=".xlsx"
+        )
+        with os.fdopen(descripteur, "wb") as fichier:
+            workbook.save(fichier)
+
+        return filepath
+
+    @staticmethod
+    def nom_fichier_excel(user=None):
+        """
+        Nom de telechargement de l'export Excel
+        """
+        role_suffix = (
+            user.profile.role.lower() if user and hasattr(user, "profile") else "global"
+        )
+        return f'statistiques_{role_suffix}_{timezone.now().strftime("%Y%m%d")}.xlsx'
+
+    COLONNES_CSV = [
+        "reference",
+        "client",
+        "produit",
+        "montant",
+        "statut_agent",
+        "statut_client",
+        "date_soumission",
+        "date_maj",
+    ]
+
+    @staticmethod
+    def dossiers_rapport(user, date_debut=None, date_fin=None):
+        """
+        Dossiers du rapport CSV: meme perimetre que reports_view, filtres de
+        periode optionnels (dates ISO, ignorees si invalides).
+        """
+        queryset = ScopeService.get_queryset(user, "rapport")
+
+        # filtres periode
+        try:
+            if date_debut:
+                queryset = queryset.filter(
+                    date_soumission__gte=datetime.fromisoformat(date_debut)
+                )
+            if date_fin:
+                queryset = queryset.filter(
+                    date_soumission__lte=datetime.fromisoformat(date_fin)
+                )
+        except ValueError:
+            pass
+
+        return queryset
+
+    @staticmethod
+    def lignes_csv(queryset):
+        """
+        Lignes du rapport CSV lues en colonnes par lots (sans instancier
+        les dossiers)
+        """
+        return (
+            queryset.order_by("-date_soumission")
+            .values_list(
+                "reference",
+                "client__username",
+                "produit",
+                "montant",
+                "statut_agent",
+                "statut_client",
+                "date_soumission",
+                "date_maj",
+            )
+            .iterator(chunk_size=ExportService.TAILLE_LOT)
+        )
+
+    @staticmethod
+    def flux_csv(queryset, lignes_par_bloc=500):
+        """
+        Genere le rapport CSV par blocs d'octets UTF-8 (en-tete compris),
+        pour StreamingHttpResponse: rien n'est accumule au-dela d'un bloc.
+        """
+        tampon = io.StringIO()
+        writer = csv.writer(tampon)
+        writer.writerow(ExportService.COLONNES_CSV)
+
+        for faits, ligne in enumerate(ExportService.lignes_csv(queryset), start=1):
+            writer.writerow(ligne)
+            if faits % lignes_par_bloc == 0:
+                yield tampon.getvalue().encode("utf-8")
+                tampon.seek(0)
+                tampon.truncate()
 
-        # Creer le fichier Excel
-        role_suffix = user.profile.role.lower() if user and hasattr(user, "profile") else "global"
-        filename = f'statistiques_{role_suffix}_{timezone.now().strftime("%Y%m%d")}.xlsx'
-        filepath = f"media/exports/{filename}"
+        if tampon.tell():
+            yield tampon.getvalue().encode("utf-8")
 
-        os.makedirs("media/exports", exist_ok=True)
+    @staticmethod
+    def exporter_dossiers_csv(user, date_debut=None, date_fin=None, progression=None):
+        """
+        Ecrit le rapport CSV dans un fichier temporaire unique et retourne son
+        chemin. `progression(faits, total)` est appele apres chaque lot.
+        """
+        queryset = ExportService.dossiers_rapport(user, date_debut, date_fin)
+        total = queryset.count() if progression else 0
 
-        with pd.ExcelWriter(filepath, engine="openpyxl") as writer:
-            df.to_excel(writer, sheet_name="Dossiers", index=False)
-            df_stats.to_excel(writer, sheet_name="Statistiques", index=False)
+        descripteur, filepath = tempfile.mkstemp(
+            prefix="dossiers_rapports_", suffix=".csv"
+        )
+        with os.fdopen(descripteur, "w", newline="", encoding="utf-8") as fichier:
+            writer = csv.writer(fichier)
+            writer.writerow(ExportService.COLONNES_CSV)
+            lignes = ExportService.lignes_csv(queryset)
+            for faits, ligne in enumerate(lignes, start=1):
+                writer.writerow(ligne)
+                if progression and faits % ExportService.TAILLE_LOT == 0:
+                    progression(faits, total)
 
         return filepath
+
+
+class TacheExportService:
+    """
+    Exports en arriere-plan (TacheExport).
+    La generation s'execute dans un pool de threads du worker
+    (EXPORTS_EXECUTION = "thread") ou dans la commande traiter_exports
+    (EXPORTS_EXECUTION = "commande"); la requete ne fait que creer la tache.
+    """
+
+    SEL_SIGNATURE = "analytics.export"
+    # Secondes avant de resoumettre une tache EN_ATTENTE (mode thread): sa
+    # soumission a pu etre perdue avec le processus qui l'avait creee
+    DELAI_REPRISE = 30
+    _executeur = None
+    _verrou = threading.Lock()
+
+    @staticmethod
+    def creer(user, type_export, parametres=None):
+        """
+        Cree une tache d'export et la soumet au pool apres le commit
+        """
+        tache = TacheExport.objects.create(
+            utilisateur=user, type_export=type_export, parametres=parametres or {}
+        )
+        if getattr(settings, "EXPORTS_EXECUTION", "thread") == "thread":
+            transaction.on_commit(
+                lambda: TacheExportService._pool().submit(
+                    TacheExportService._executer_dans_thread, tache.pk
+                )
+            )
+        return tache
+
+    @classmethod
+    def _pool(cls):
+        with cls._verrou:
+            if cls._executeur is None:
+                cls._executeur = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "EXPORTS_WORKERS", 2),
+                    thread_name_prefix="export",
+                )
+            return cls._executeur
+
+    @staticmethod
+    def _executer_dans_thread(tache_id):
+        close_old_connections()
+        try:
+            TacheExportService.executer(tache_id)
+            TacheExportService.recuperer_bloquees()
+            TacheExportService.purger_expirees()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def executer(tache_id):
+        """
+        Genere le fichier d'une tache EN_ATTENTE.
+        La tache est reservee par un UPDATE conditionnel: si un autre worker
+        l'a deja prise, rien n'est fait. Retourne True si la tache a ete traitee.
+        """
+        reservee = TacheExport.objects.filter(
+            pk=tache_id, statut="EN_ATTENTE"
+        ).update(statut="EN_COURS", date_debut=timezone.now())
+        if not reservee:
+            return False
+
+        tache = TacheExport.objects.select_related("utilisateur__profile").get(
+            pk=tache_id
+        )
+        derniere = [0]
+
+        def progression(faits, total):
+            pourcentage = min(99, int(faits * 100 / total)) if total else 0
+            if pourcentage != derniere[0]:
+                derniere[0] = pourcentage
+                TacheExport.objects.filter(pk=tache_id).update(
+                    progression=pourcentage
+                )
+
+        try:
+            chemin_tmp, nom = TacheExportService._generer(tache, progression)
+            os.makedirs(TacheExportService._repertoire(), exist_ok=True)
+            chemin = os.path.join(
+                TacheExportService._repertoire(),
+                f"{tache.pk}_{os.path.basename(chemin_tmp)}",
+            )
+            shutil.move(chemin_tmp, chemin)
+        except Exception as e:
+            logger.exception(f"Echec export #{tache_id}")
+            TacheExport.objects.filter(pk=tache_id).update(
+                statut="ECHEC", erreur=str(e), date_fin=timezone.now()
+            )
+            return True
+
+        maintenant = timezone.now()
+        TacheExport.objects.filter(pk=tache_id).update(
+            statut="TERMINE",
+            progression=100,
+            fichier=chemin,
+            nom_fichier=nom,
+            date_fin=maintenant,
+            expire_le=maintenant
+            + timedelta(seconds=TacheExportService._duree_lien()),
+        )
+        return True
+
+    @staticmethod
+    def _generer(tache, progression):
+        user = tache.utilisateur
+        if tache.type_export == "EXCEL_STATISTIQUES":
+            chemin = ExportService.exporter_statistiques_excel(
+                user=user, progression=progression
+            )
+            return chemin, ExportService.nom_fichier_excel(user)
+        if tache.type_export == "CSV_DOSSIERS":
+            chemin = ExportService.exporter_dossiers_csv(
+                user,
+                date_debut=tache.parametres.get("date_debut"),
+                date_fin=tache.parametres.get("date_fin"),
+                progression=progression,
+            )
+            return chemin, "dossiers_rapports.csv"
+        raise ValueError(f"Type d'export inconnu: {tache.type_export}")
+
+    @staticmethod
+    def traiter_en_attente(limite=None):
+        """
+        Traite les taches en attente (commande traiter_exports).
+        Retourne le nombre de taches traitees par ce worker.
+        """
+        ids = list(
+            TacheExport.objects.filter(statut="EN_ATTENTE")
+            .order_by("date_creation")
+            .values_list("id", flat=True)[:limite]
+        )
+        return sum(1 for tache_id in ids if TacheExportService.executer(tache_id))
+
+    @staticmethod
+    def recuperer_bloquees(tache_id=None):
+        """
+        Reprend les taches laissees en suspens par un worker arrete
+        (redemarrage, crash), toutes ou seulement `tache_id`:
+        - EN_COURS depuis plus de EXPORTS_DELAI_MAX: passees en ECHEC;
+        - EN_ATTENTE depuis plus de DELAI_REPRISE (mode thread): resoumises
+          au pool de ce processus. La reservation conditionnelle d'executer()
+          empeche un double traitement si la soumission d'origine survit.
+        Retourne (taches passees en echec, taches resoumises).
+        """
+        maintenant = timezone.now()
+        taches = TacheExport.objects.all()
+        if tache_id is not None:
+            taches = taches.filter(pk=tache_id)
+
+        echouees = taches.filter(
+            statut="EN_COURS",
+            date_debut__lt=maintenant
+            - timedelta(seconds=getattr(settings, "EXPORTS_DELAI_MAX", 1800)),
+        ).update(
+            statut="ECHEC",
+            erreur="Export interrompu (arret du worker), relancez l'export",
+            date_fin=maintenant,
+        )
+
+        resoumises = 0
+        if getattr(settings, "EXPORTS_EXECUTION", "thread") == "thread":
+            ids = list(
+                taches.filter(
+                    statut="EN_ATTENTE",
+                    date_creation__lt=maintenant
+                    - timedelta(seconds=TacheExportService.DELAI_REPRISE),
+                ).values_list("id", flat=True)[:100]
+            )
+            for id_ in ids:
+                TacheExportService._pool().submit(
+                    TacheExportService._executer_dans_thread, id_
+                )
+            resoumises = len(ids)
+        if echouees or resoumises:
+            logger.warning(
+                f"Exports bloques: {echouees} en echec, {resoumises} resoumis"
+            )
+        return echouees, resoumises
+
+    @staticmethod
+    def jeton(tache):
+        """Jeton signe (et horodate) du lien de telechargement"""
+        return signing.TimestampSigner(salt=TacheExportService.SEL_SIGNATURE).sign(
+            str(tache.pk)
+        )
+
+    @staticmethod
+    def consommer_jeton(jeton, user):
+        """
+        Valide le jeton et marque le telechargement (usage unique).
+        Retourne la tache, ou None si le lien est invalide, expire, deja
+        utilise ou destine a un autre utilisateur.
+        """
+        try:
+            tache_id = signing.TimestampSigner(
+                salt=TacheExportService.SEL_SIGNATURE
+            ).unsign(jeton, max_age=TacheExportService._duree_lien())
+        except signing.BadSignature:
+            return None
+
+        consomme = TacheExport.objects.filter(
+            pk=tache_id,
+            utilisateur=user,
+            statut="TERMINE",
+            telecharge_le__isnull=True,
+        ).update(telecharge_le=timezone.now())
+        if not consomme:
+            return None
+        return TacheExport.objects.get(pk=tache_id)
+
+    @staticmethod
+    def purger_expirees():
+        """
+        Supprime les fichiers et taches expirees ou deja telechargees.
+        Retourne le nombre de taches supprimees.
+        """
+        maintenant = timezone.now()
+        taches = TacheExport.objects.filter(
+            Q(expire_le__lt=maintenant)
+            # marge pour ne pas supprimer un fichier en cours d'ouverture
+            | Q(telecharge_le__lt=maintenant - timedelta(minutes=5))
+            | Q(
+                statut="ECHEC",
+                date_fin__lt=maintenant
+                - timedelta(seconds=TacheExportService._duree_lien()),
+            )
+        )
+        for chemin in taches.exclude(fichier="").values_list("fichier", flat=True):
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                pass
+        supprimees, _ = taches.delete()
+        return supprimees
+
+    @staticmethod
+    def _repertoire():
+        return str(getattr(settings, "EXPORTS_DIR", os.path.join("var", "exports")))
+
+    @staticmethod
+    def _duree_lien():
+        return getattr(settings, "EXPORTS_DUREE_LIEN", 3600)
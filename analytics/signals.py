@@ -0,0 +1,32 @@
+"""
+Module Analytics - Signaux d'invalidation des caches
+L'invalidation a lieu apres commit: invalide pendant la transaction, le cache
+pourrait etre recalcule par une requete concurrente avec l'etat precedent.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from suivi_demande.models import DossierCredit
+from .services import AnalyticsService
+
+# Champs dont la modification change les graphiques
+CHAMPS_GRAPHIQUES = {"statut_agent", "produit", "date_soumission"}
+
+
+@receiver(post_save, sender=DossierCredit)
+def invalider_graphiques_sur_modification(
+    sender, instance, created, update_fields, **kwargs
+):
+    """
+    Invalide le cache des graphiques quand un dossier est cree ou change de statut
+    """
+    if update_fields is not None and not CHAMPS_GRAPHIQUES.intersection(update_fields):
+        return
+    transaction.on_commit(AnalyticsService.invalider_cache_graphiques)
+
+
+@receiver(post_delete, sender=DossierCredit)
+def invalider_graphiques_sur_suppression(sender, instance, **kwargs):
+    transaction.on_commit(AnalyticsService.invalider_cache_graphiques)
@@ -4,14 +4,41 @@ Auteur: NGUIMBI Juliana
 Date: Novembre 2025
 """
 
-from django.test import TestCase, Client
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
-
-from suivi_demande.models import DossierCredit, UserProfile
-from .models import StatistiquesDossier, PredictionRisque
-from .services import AnalyticsService, MLPredictionService
+from io import StringIO
+from unittest import mock
+import os
+import shutil
+import tempfile
+
+import joblib
+from openpyxl import load_workbook
+
+from core.cache import KPI
+from suivi_demande.models import (
+    CanevasProposition,
+    DossierCredit,
+    JournalAction,
+    UserProfile,
+)
+from .models import CurseurRollup, StatistiquesDossier, PredictionRisque, TacheExport
+from .services import (
+    AnalyticsService,
+    ExportService,
+    MLPredictionService,
+    RegistreModeles,
+    RollupService,
+    TacheExportService,
+)
+from .views import SCORING_LOT_MAX
 
 
 class StatistiquesServiceTest(TestCase):
@@ -161,6 +188,10 @@ class AnalyticsDashboardViewTest(TestCase):
         # Verifier que la page est accessible
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Analytics")
+        # Export en arriere-plan, jamais l'export synchrone
+        self.assertContains(response, 'data-export="EXCEL_STATISTIQUES"')
+        self.assertContains(response, "/analytics/api/exports/")
+        self.assertNotContains(response, "/analytics/export/excel/")
 
     def test_api_kpis(self):
         """
@@ -176,6 +207,41 @@ class AnalyticsDashboardViewTest(TestCase):
         self.assertIn("total_dossiers", data)
         self.assertIn("taux_approbation", data)
 
+    def test_rapport_statistiques_sans_instantane(self):
+        """
+        Le rapport lit les rollups sans ecrire: ni instantane, ni rollup
+        """
+        response = self.client.get("/analytics/rapport/?periode=MOIS")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(StatistiquesDossier.objects.filter(jour__isnull=True).exists())
+        self.assertFalse(CurseurRollup.objects.exists())
+
+    def test_rapport_statistiques_rollup_en_retard(self):
+        """
+        Tant que le rollup n'a pas rattrape le journal, le rapport calcule
+        directement sur les dossiers
+        """
+        dossier = DossierCredit.objects.create(
+            reference="RETARD-001",
+            client=self.user,
+            produit="Credit",
+            montant=Decimal("1000000"),
+        )
+        JournalAction.objects.create(
+            dossier=dossier, action="CREATION", vers_statut="NOUVEAU"
+        )
+        JournalAction.objects.update(timestamp=timezone.now() - timedelta(hours=1))
+
+        response = self.client.get("/analytics/rapport/?periode=MOIS")
+        self.assertTrue(response.context["rollup_en_retard"])
+        self.assertEqual(response.context["stats"].total_dossiers, 1)
+        self.assertContains(response, "rollup_statistiques")
+
+        RollupService.traiter_nouvelles_actions()
+        response = self.client.get("/analytics/rapport/?periode=MOIS")
+        self.assertFalse(response.context["rollup_en_retard"])
+
 
 class StatistiquesDossierModelTest(TestCase):
     """
@@ -235,3 +301,653 @@ class PredictionRisqueModelTest(TestCase):
         self.assertEqual(prediction.classe_risque, "MOYEN")
         self.assertEqual(prediction.score_risque, 45.5)
         self.assertIn("PRED-001", str(prediction))
+
+
+class AgregationStatistiquesTest(TestCase):
+    """
+    Tests du moteur d'agregation en une passe
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="client_agg", password="test123")
+        maintenant = timezone.now()
+        statuts = ["NOUVEAU", "EN_COURS_ANALYSE", "APPROUVE_ATTENTE_FONDS", "REFUSE"]
+        for i, statut in enumerate(statuts):
+            dossier = DossierCredit.objects.create(
+                reference=f"AGG-{i:03d}",
+                client=self.user,
+                produit="Credit",
+                montant=Decimal("1000000") * (i + 1),
+                statut_agent=statut,
+                date_soumission=maintenant - timedelta(days=4),
+            )
+            JournalAction.objects.create(
+                dossier=dossier, action="TRANSITION", vers_statut=statut
+            )
+
+    def test_agregation_en_deux_requetes(self):
+        """
+        Compteurs, montants et delai en un nombre fixe de requetes
+        """
+        with self.assertNumQueries(2):
+            resultat = AnalyticsService.agreger_dossiers(DossierCredit.objects.all())
+
+        self.assertEqual(resultat.total_dossiers, 4)
+        self.assertEqual(resultat.dossiers_en_cours, 2)
+        self.assertEqual(resultat.dossiers_approuves, 1)
+        self.assertEqual(resultat.dossiers_rejetes, 1)
+        self.assertEqual(resultat.montant_total_demande, Decimal("10000000"))
+        self.assertEqual(resultat.montant_total_approuve, Decimal("3000000"))
+        self.assertEqual(resultat.taux_approbation, 25)
+        self.assertAlmostEqual(resultat.delai_moyen_traitement, 4, places=1)
+
+    def test_agregation_queryset_vide(self):
+        """
+        Un perimetre vide renvoie des valeurs neutres
+        """
+        resultat = AnalyticsService.agreger_dossiers(DossierCredit.objects.none())
+
+        self.assertEqual(resultat.total_dossiers, 0)
+        self.assertEqual(resultat.taux_rejet, 0)
+        self.assertEqual(resultat.delai_moyen_traitement, 0)
+
+
+class RollupServiceTest(TestCase):
+    """
+    Tests du rollup incremental des statistiques journalieres
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="client_rollup", password="x")
+        self.dossiers = []
+        for i in range(3):
+            dossier = DossierCredit.objects.create(
+                reference=f"ROLL-{i:03d}",
+                client=self.user,
+                produit="Credit",
+                montant=Decimal("1000000"),
+            )
+            JournalAction.objects.create(
+                dossier=dossier, action="CREATION", vers_statut="NOUVEAU"
+            )
+            self.dossiers.append(dossier)
+        JournalAction.objects.create(
+            dossier=self.dossiers[0],
+            action="APPROBATION",
+            de_statut="EN_COURS_VALIDATION_GGR",
+            vers_statut="APPROUVE_ATTENTE_FONDS",
+        )
+
+    def test_rollup_incremental(self):
+        """
+        Seules les nouvelles actions sont agregees dans le bucket du jour
+        """
+        self.assertEqual(RollupService.traiter_nouvelles_actions(), 4)
+        self.assertEqual(RollupService.traiter_nouvelles_actions(), 0)
+
+        JournalAction.objects.create(
+            dossier=self.dossiers[1], action="REFUS", vers_statut="REFUSE"
+        )
+        self.assertEqual(RollupService.traiter_nouvelles_actions(), 1)
+
+        bucket = StatistiquesDossier.objects.get(jour=timezone.localdate())
+        self.assertEqual(bucket.periode, "JOUR")
+        self.assertEqual(bucket.total_dossiers, 3)
+        self.assertEqual(bucket.dossiers_approuves, 1)
+        self.assertEqual(bucket.dossiers_rejetes, 1)
+        self.assertEqual(bucket.montant_total_approuve, Decimal("1000000"))
+        self.assertEqual(bucket.repartition_statuts["NOUVEAU"], 3)
+
+    def test_statistiques_periode_depuis_buckets(self):
+        """
+        Les periodes sont repondues en sommant les buckets journaliers
+        """
+        RollupService.traiter_nouvelles_actions(taille_lot=2)
+
+        DossierCredit.objects.filter(pk=self.dossiers[0].pk).update(
+            statut_agent="APPROUVE_ATTENTE_FONDS"
+        )
+
+        # Somme des buckets + statut actuel de la cohorte
+        with self.assertNumQueries(2):
+            stats = RollupService.statistiques_periode("SEMAINE")
+
+        self.assertEqual(stats.total_dossiers, 3)
+        self.assertEqual(stats.dossiers_approuves, 1)
+        self.assertEqual(stats.dossiers_en_cours, 2)
+        self.assertEqual(stats.dossiers_archives, 0)
+        self.assertEqual(stats.montant_total_demande, Decimal("3000000"))
+
+    def test_action_commitee_apres_le_watermark(self):
+        """
+        Une action visible apres coup sous un id deja depasse est agregee
+        une seule fois
+        """
+        RollupService.traiter_nouvelles_actions()
+        dernier = JournalAction.objects.order_by("-id").first().id
+
+        # L'id dernier + 1 est pris par une transaction pas encore commitee
+        JournalAction.objects.create(
+            id=dernier + 2,
+            dossier=self.dossiers[1],
+            action="REFUS",
+            vers_statut="REFUSE",
+        )
+        self.assertEqual(RollupService.traiter_nouvelles_actions(), 1)
+        self.assertIn(str(dernier + 1), CurseurRollup.objects.get().trous)
+
+        JournalAction.objects.create(
+            id=dernier + 1,
+            dossier=self.dossiers[2],
+            action="REFUS",
+            vers_statut="REFUSE",
+        )
+        self.assertEqual(RollupService.traiter_nouvelles_actions(), 1)
+        self.assertEqual(RollupService.traiter_nouvelles_actions(), 0)
+
+        bucket = StatistiquesDossier.objects.get(jour=timezone.localdate())
+        self.assertEqual(bucket.dossiers_rejetes, 2)
+        self.assertEqual(CurseurRollup.objects.get().trous, {})
+
+    def test_liberation_comptee_comme_approbation(self):
+        """
+        FONDS_LIBERE compte comme approuve, une seule fois par dossier
+        """
+        JournalAction.objects.create(
+            dossier=self.dossiers[0],
+            action="LIBERATION_FONDS",
+            de_statut="APPROUVE_ATTENTE_FONDS",
+            vers_statut="FONDS_LIBERE",
+        )
+        JournalAction.objects.create(
+            dossier=self.dossiers[1],
+            action="TRANSITION",
+            de_statut="EN_COURS_VALIDATION_GGR",
+            vers_statut="FONDS_LIBERE",
+        )
+        RollupService.traiter_nouvelles_actions()
+
+        bucket = StatistiquesDossier.objects.get(jour=timezone.localdate())
+        self.assertEqual(bucket.dossiers_approuves, 2)
+        self.assertEqual(bucket.nombre_delais, 2)
+
+    def test_commande_une_passe(self):
+        """
+        La commande agrege le journal puis s'arrete avec --une-fois
+        """
+        sortie = StringIO()
+        call_command("rollup_statistiques", "--une-fois", stdout=sortie)
+
+        self.assertIn("4 actions agregees", sortie.getvalue())
+        self.assertEqual(
+            CurseurRollup.objects.get().dernier_journal_id,
+            JournalAction.objects.order_by("-id").first().id,
+        )
+
+
+class DonneesGraphiquesCacheTest(TestCase):
+    """
+    Tests de la requete groupee et du cache des graphiques
+    """
+
+    def setUp(self):
+        cache.clear()
+        caches[KPI].clear()
+        self.user = User.objects.create_user(username="client_graph", password="x")
+        self.dossier = DossierCredit.objects.create(
+            reference="GRAPH-001",
+            client=self.user,
+            produit="Credit",
+            montant=Decimal("1000000"),
+        )
+
+    def tearDown(self):
+        cache.clear()
+        caches[KPI].clear()
+
+    def test_serie_mensuelle_complete(self):
+        """
+        Douze mois calendaires consecutifs, mois sans dossier a zero
+        """
+        with self.assertNumQueries(1):
+            graphiques = AnalyticsService.obtenir_donnees_graphiques()
+
+        evolution = graphiques["evolution_mensuelle"]
+        self.assertEqual(len(evolution["labels"]), 12)
+        self.assertEqual(len(set(evolution["labels"])), 12)
+        self.assertEqual(evolution["data"][-1], 1)
+        self.assertEqual(sum(evolution["data"]), 1)
+
+    def test_cache_et_invalidation_sur_changement_statut(self):
+        """
+        Les appels suivants sont servis par le cache jusqu'au changement de statut
+        """
+        AnalyticsService.obtenir_donnees_graphiques()
+        with self.assertNumQueries(0):
+            AnalyticsService.obtenir_donnees_graphiques()
+
+        self.dossier.statut_agent = "REFUSE"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dossier.save(update_fields=["statut_agent"])
+            # Avant commit, le cache n'est pas touche (pas de re-cache obsolete)
+            with self.assertNumQueries(0):
+                AnalyticsService.obtenir_donnees_graphiques()
+
+        graphiques = AnalyticsService.obtenir_donnees_graphiques()
+        self.assertEqual(graphiques["repartition_statuts"]["labels"], ["REFUSE"])
+
+
+class RegistreModelesTest(TestCase):
+    """
+    Tests du registre processus des modeles ML
+    """
+
+    def setUp(self):
+        RegistreModeles.vider()
+        self.dossier_tmp = tempfile.mkdtemp()
+        self.chemin = os.path.join(self.dossier_tmp, "modele.pkl")
+        joblib.dump({"version": 1}, self.chemin)
+
+    def tearDown(self):
+        RegistreModeles.vider()
+        shutil.rmtree(self.dossier_tmp, ignore_errors=True)
+
+    def test_chargement_unique_par_worker(self):
+        """
+        Le fichier n'est deserialise qu'une fois tant qu'il ne change pas
+        """
+        with mock.patch("analytics.services.joblib.load", wraps=joblib.load) as load:
+            premier = RegistreModeles.obtenir(self.chemin)
+            second = RegistreModeles.obtenir(self.chemin)
+
+        self.assertIs(premier, second)
+        self.assertEqual(load.call_count, 1)
+
+    def test_rechargement_si_contenu_modifie(self):
+        """
+        Un nouveau contenu (mtime et empreinte differents) est recharge
+        """
+        RegistreModeles.obtenir(self.chemin)
+        version_initiale = RegistreModeles.version(self.chemin)
+
+        joblib.dump({"version": 2}, self.chemin)
+        stat = os.stat(self.chemin)
+        os.utime(self.chemin, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        self.assertEqual(RegistreModeles.obtenir(self.chemin), {"version": 2})
+        self.assertNotEqual(RegistreModeles.version(self.chemin), version_initiale)
+
+    def test_prediction_sans_modele_ne_declenche_pas_entrainement(self):
+        """
+        Sans fichier modele, predire_risque retourne None sans entrainer
+        """
+        user = User.objects.create_user(username="client_reg", password="x")
+        dossier = DossierCredit.objects.create(
+            reference="REG-001", client=user, produit="Credit", montant=Decimal("1000")
+        )
+        absent = os.path.join(self.dossier_tmp, "absent.pkl")
+        with mock.patch.object(
+            MLPredictionService, "MODEL_PATH", absent
+        ), mock.patch.object(MLPredictionService, "entrainer_modele") as entrainer:
+            self.assertIsNone(MLPredictionService.predire_risque(dossier))
+
+        entrainer.assert_not_called()
+
+
+class ScoringLotTest(TestCase):
+    """
+    Tests du scoring en lot du portefeuille
+    """
+
+    def setUp(self):
+        RegistreModeles.vider()
+        self.dossier_tmp = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(
+                MLPredictionService,
+                "MODEL_PATH",
+                os.path.join(self.dossier_tmp, "modele.pkl"),
+            ),
+            mock.patch.object(
+                MLPredictionService,
+                "SCALER_PATH",
+                os.path.join(self.dossier_tmp, "scaler.pkl"),
+            ),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+        self.user = User.objects.create_user(username="client_lot", password="x")
+        for i in range(12):
+            self._creer_dossier(
+                f"LOT-F-{i:03d}",
+                "FONDS_LIBERE" if i % 2 == 0 else "REFUSE",
+                salaire=Decimal("300000") * (i + 1),
+            )
+        self.actifs = [
+            self._creer_dossier(f"LOT-A-{i:03d}", "EN_COURS_ANALYSE")
+            for i in range(5)
+        ]
+        # Dossier actif sans canevas: features a 0
+        self.actifs.append(
+            DossierCredit.objects.create(
+                reference="LOT-A-NC",
+                client=self.user,
+                produit="Credit",
+                montant=Decimal("800000"),
+                statut_agent="NOUVEAU",
+            )
+        )
+        MLPredictionService.entrainer_modele()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        RegistreModeles.vider()
+        shutil.rmtree(self.dossier_tmp, ignore_errors=True)
+
+    def _creer_dossier(self, reference, statut, salaire=Decimal("500000")):
+        dossier = DossierCredit.objects.create(
+            reference=reference,
+            client=self.user,
+            produit="Credit",
+            montant=Decimal("1000000"),
+            statut_agent=statut,
+        )
+        canevas = CanevasProposition(
+            dossier=dossier,
+            nom_prenom="Client Lot",
+            date_naissance="1990-01-01",
+            adresse_exacte="Brazzaville",
+            numero_telephone="+242 06 000 00 00",
+            emploi_occupe="Employe",
+            nom_employeur="Employeur",
+            lieu_emploi="Brazzaville",
+            salaire_net_moyen_fcfa=salaire,
+            total_echeances_credits_cours=Decimal("0"),
+            demande_montant_fcfa=Decimal("1000000"),
+            demande_duree_mois=24,
+            demande_taux_pourcent=Decimal("12.00"),
+        )
+        canevas.calculer_capacite_endettement()
+        canevas.save()
+        return dossier
+
+    def test_scoring_portefeuille_actif(self):
+        """
+        Seuls les dossiers actifs sont scores, par lots
+        """
+        total = MLPredictionService.scorer_portefeuille(taille_lot=4)
+
+        self.assertEqual(total, len(self.actifs))
+        self.assertEqual(
+            set(PredictionRisque.objects.values_list("dossier_id", flat=True)),
+            {dossier.id for dossier in self.actifs},
+        )
+        version = MLPredictionService.version_modele()
+        for prediction in PredictionRisque.objects.all():
+            self.assertIn(prediction.classe_risque, ["FAIBLE", "MOYEN", "ELEVE"])
+            self.assertAlmostEqual(
+                prediction.score_risque, prediction.probabilite_defaut * 100
+            )
+            self.assertEqual(prediction.modele_version, version)
+
+    def test_rescoring_met_a_jour_sans_doublon(self):
+        """
+        Un second passage met a jour les predictions existantes (upsert)
+        """
+        MLPredictionService.scorer_portefeuille()
+        PredictionRisque.objects.update(score_risque=-1)
+
+        MLPredictionService.scorer_portefeuille()
+
+        self.assertEqual(PredictionRisque.objects.count(), len(self.actifs))
+        self.assertFalse(PredictionRisque.objects.filter(score_risque=-1).exists())
+
+    def test_scoring_lot_coherent_avec_prediction_unitaire(self):
+        """
+        Le scoring vectorise donne le meme score que predire_risque
+        """
+        dossier = self.actifs[0]
+        unitaire = MLPredictionService.predire_risque(dossier).score_risque
+
+        MLPredictionService.scorer_portefeuille(
+            dossiers=DossierCredit.objects.filter(id=dossier.id)
+        )
+
+        prediction = PredictionRisque.objects.get(dossier=dossier)
+        self.assertAlmostEqual(prediction.score_risque, unitaire)
+
+    def test_nombre_requetes_independant_du_portefeuille(self):
+        """
+        Un lot = une lecture + un upsert, quel que soit le nombre de dossiers
+        """
+        with CaptureQueriesContext(connection) as requetes:
+            MLPredictionService.scorer_portefeuille()
+
+        self.assertLess(len(requetes), len(self.actifs))
+
+    def test_api_scoring_lot(self):
+        """
+        L'API score les dossiers demandes et retourne le total
+        """
+        analyste = User.objects.create_user(username="analyste_lot", password="x")
+        UserProfile.objects.create(user=analyste, role="ANALYSTE", full_name="A")
+        client = Client()
+        client.force_login(analyste)
+
+        response = client.post(
+            "/analytics/api/predictions/lot/",
+            data={"dossier_ids": [self.actifs[0].id, self.actifs[1].id]},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["scores"], 2)
+
+        # Pas de rescoring du portefeuille complet dans une requete HTTP
+        response = client.post(
+            "/analytics/api/predictions/lot/", data={}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        response = client.post(
+            "/analytics/api/predictions/lot/",
+            data={"dossier_ids": list(range(SCORING_LOT_MAX + 1))},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportExcelTest(TestCase):
+    """
+    Tests de l'export Excel en ecriture seule
+    """
+
+    def setUp(self):
+        self.analyste = User.objects.create_user(username="analyste_xl", password="x")
+        UserProfile.objects.create(user=self.analyste, role="ANALYSTE", full_name="A")
+        client = User.objects.create_user(username="client_xl", password="x")
+        for i, statut in enumerate(["EN_COURS_ANALYSE", "FONDS_LIBERE", "NOUVEAU"]):
+            DossierCredit.objects.create(
+                reference=f"XL-{i:03d}",
+                client=client,
+                produit="Credit",
+                montant=Decimal("1000000"),
+                statut_agent=statut,
+            )
+
+    def test_export_filtre_et_statistiques(self):
+        """
+        Le classeur contient les dossiers du role et les statistiques agregees
+        """
+        filepath = ExportService.exporter_statistiques_excel(user=self.analyste)
+        self.addCleanup(os.remove, filepath)
+
+        classeur = load_workbook(filepath, read_only=True)
+        lignes = list(classeur["Dossiers"].values)
+        self.assertEqual(lignes[0][0], "Référence")
+        self.assertEqual(sorted(ligne[0] for ligne in lignes[1:]), ["XL-000", "XL-001"])
+
+        stats = list(classeur["Statistiques"].values)[1]
+        self.assertEqual(stats[1], 2)
+        self.assertEqual(stats[4], 50)
+        classeur.close()
+
+    def test_exports_simultanes_sans_collision(self):
+        """
+        Deux exports du meme role le meme jour ecrivent des fichiers distincts
+        """
+        premier = ExportService.exporter_statistiques_excel(user=self.analyste)
+        second = ExportService.exporter_statistiques_excel(user=self.analyste)
+        self.addCleanup(os.remove, premier)
+        self.addCleanup(os.remove, second)
+
+        self.assertNotEqual(premier, second)
+
+    def test_vue_export_supprime_fichier_temporaire(self):
+        """
+        La vue sert le fichier en piece jointe sans le laisser sur le disque
+        """
+        client = Client()
+        client.force_login(self.analyste)
+
+        chemins = []
+        exporter = ExportService.exporter_statistiques_excel
+
+        def exporter_et_noter(user=None):
+            chemins.append(exporter(user=user))
+            return chemins[-1]
+
+        with mock.patch.object(
+            ExportService, "exporter_statistiques_excel", exporter_et_noter
+        ):
+            response = client.get("/analytics/export/excel/")
+            contenu = b"".join(response.streaming_content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("attachment", response["Content-Disposition"])
+        self.assertTrue(contenu.startswith(b"PK"))
+        self.assertFalse(os.path.exists(chemins[0]))
+
+
+@override_settings(EXPORTS_EXECUTION="commande")
+class TacheExportTest(TestCase):
+    """
+    Tests des exports en arriere-plan
+    """
+
+    def setUp(self):
+        self.repertoire = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.repertoire, ignore_errors=True)
+        reglages = override_settings(EXPORTS_DIR=self.repertoire)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        self.gestionnaire = User.objects.create_user(username="gest_exp", password="x")
+        UserProfile.objects.create(
+            user=self.gestionnaire, role="GESTIONNAIRE", full_name="G"
+        )
+        client = User.objects.create_user(username="client_exp", password="x")
+        for i in range(3):
+            DossierCredit.objects.create(
+                reference=f"EXP-{i:03d}",
+                client=client,
+                produit="Credit",
+                montant=Decimal("1000"),
+            )
+        self.client = Client()
+        self.client.force_login(self.gestionnaire)
+
+    def _creer(self, type_export="CSV_DOSSIERS"):
+        response = self.client.post(
+            "/analytics/api/exports/", {"type_export": type_export}
+        )
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def test_cycle_complet_lien_usage_unique(self):
+        """
+        Creation -> traitement par le worker -> telechargement unique
+        """
+        creation = self._creer()
+        self.assertEqual(creation["statut"], "EN_ATTENTE")
+
+        self.assertEqual(TacheExportService.traiter_en_attente(), 1)
+
+        statut = self.client.get(creation["suivi"]).json()
+        self.assertEqual(statut["statut"], "TERMINE")
+        self.assertEqual(statut["progression"], 100)
+
+        response = self.client.get(statut["telechargement"])
+        contenu = b"".join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(contenu.count("EXP-"), 3)
+        self.assertEqual(os.listdir(self.repertoire), [])
+
+        # Lien a usage unique
+        self.assertEqual(self.client.get(statut["telechargement"]).status_code, 404)
+
+    def test_lien_reserve_au_demandeur(self):
+        """
+        Un autre utilisateur ne peut ni suivre ni telecharger l'export
+        """
+        creation = self._creer("EXCEL_STATISTIQUES")
+        TacheExportService.traiter_en_attente()
+        lien = self.client.get(creation["suivi"]).json()["telechargement"]
+
+        autre = User.objects.create_user(username="autre_exp", password="x")
+        UserProfile.objects.create(user=autre, role="GESTIONNAIRE", full_name="A")
+        self.client.force_login(autre)
+
+        self.assertEqual(self.client.get(creation["suivi"]).status_code, 404)
+        self.assertEqual(self.client.get(lien).status_code, 404)
+
+    def test_tache_deja_reservee_non_retraitee(self):
+        """
+        Une tache prise par un autre worker n'est pas regeneree
+        """
+        tache = TacheExport.objects.get(pk=self._creer()["id"])
+        TacheExport.objects.filter(pk=tache.pk).update(statut="EN_COURS")
+
+        self.assertFalse(TacheExportService.executer(tache.pk))
+
+    def test_purge_exports_expires(self):
+        """
+        Les fichiers expires sont supprimes avec leur tache
+        """
+        tache_id = self._creer()["id"]
+        TacheExportService.traiter_en_attente()
+        tache = TacheExport.objects.get(pk=tache_id)
+        self.assertTrue(os.path.exists(tache.fichier))
+
+        TacheExport.objects.filter(pk=tache_id).update(
+            expire_le=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(TacheExportService.purger_expirees(), 1)
+        self.assertFalse(os.path.exists(tache.fichier))
+
+    @override_settings(EXPORTS_EXECUTION="thread")
+    def test_taches_bloquees_apres_redemarrage(self):
+        """
+        Taches perdues par un worker redemarre: EN_COURS passee en echec,
+        EN_ATTENTE resoumise au pool
+        """
+        en_cours = self._creer()["id"]
+        en_attente = self._creer()["id"]
+        ancien = timezone.now() - timedelta(hours=1)
+        TacheExport.objects.filter(pk=en_cours).update(
+            statut="EN_COURS", date_debut=ancien
+        )
+        TacheExport.objects.filter(pk=en_attente).update(date_creation=ancien)
+
+        with mock.patch.object(TacheExportService, "_pool") as pool:
+            statut = self.client.get(f"/analytics/api/exports/{en_cours}/").json()
+            self.assertEqual(statut["statut"], "ECHEC")
+            self.assertIn("interrompu", statut["erreur"])
+
+            self.assertEqual(TacheExportService.recuperer_bloquees(), (0, 1))
+
+        pool.return_value.submit.assert_called_once_with(
+            TacheExportService._executer_dans_thread, en_attente
+        )
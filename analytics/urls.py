@@ -18,4 +18,17 @@ urlpatterns = [
     # API
     path("api/graphiques/", views.api_graphiques_data, name="api_graphiques"),
     path("api/kpis/", views.api_kpis, name="api_kpis"),
+    path("api/predictions/lot/", views.api_scorer_lot, name="api_scorer_lot"),
+    # Exports en arriere-plan
+    path("api/exports/", views.api_creer_export, name="api_creer_export"),
+    path(
+        "api/exports/<int:tache_id>/",
+        views.api_statut_export,
+        name="api_statut_export",
+    ),
+    path(
+        "exports/telecharger/<str:jeton>/",
+        views.telecharger_export,
+        name="telecharger_export",
+    ),
 ]
@@ -4,16 +4,25 @@ Auteur: NGUIMBI Juliana
 Date: Novembre 2025
 """
 
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, FileResponse
+from django.http import JsonResponse, FileResponse, Http404
+from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.db.models import Count, Sum, Avg
 from django.utils import timezone
 import json
-
-from .services import AnalyticsService, MLPredictionService, ExportService
-from .models import StatistiquesDossier, PredictionRisque
+import os
+
+from .services import (
+    AnalyticsService,
+    MLPredictionService,
+    ExportService,
+    RollupService,
+    TacheExportService,
+)
+from .models import StatistiquesDossier, PredictionRisque, TacheExport
 from suivi_demande.models import DossierCredit
 from core.security import role_required
 
@@ -30,8 +39,8 @@ def dashboard_analytics(request):
     # Donnees pour graphiques
     graphiques = AnalyticsService.obtenir_donnees_graphiques()
 
-    # Statistiques recentes
-    stats_recentes = StatistiquesDossier.objects.all()[:5]
+    # Statistiques recentes (instantanes, hors buckets journaliers)
+    stats_recentes = StatistiquesDossier.objects.filter(jour__isnull=True)[:5]
 
     context = {
         "kpis": kpis,
@@ -51,16 +60,27 @@ def rapport_statistiques(request):
     """
     periode = request.GET.get("periode", "MOIS")
 
-    # Calculer les statistiques
-    stats = AnalyticsService.calculer_statistiques_periode(periode)
+    # Sommer les buckets journaliers (alimentes par la commande
+    # rollup_statistiques, pas par l'affichage). Tant que le rollup est en
+    # retard sur le journal, calcul direct sur les dossiers de la periode.
+    rollup_en_retard = RollupService.en_retard()
+    if rollup_en_retard:
+        stats = AnalyticsService.agreger_dossiers(
+            AnalyticsService.dossiers_periode(periode)
+        )
+    else:
+        stats = RollupService.statistiques_periode(periode)
 
-    # Historique des statistiques
-    historique = StatistiquesDossier.objects.filter(periode=periode)[:12]
+    # Historique des instantanes (commande rollup_statistiques --instantane)
+    historique = StatistiquesDossier.objects.filter(
+        periode=periode, jour__isnull=True
+    )[:12]
 
     context = {
         "stats": stats,
         "historique": historique,
         "periode": periode,
+        "rollup_en_retard": rollup_en_retard,
         "page_title": "Rapport Statistiques",
     }
 
@@ -115,7 +135,8 @@ def predire_dossier(request, dossier_id):
             )
         else:
             messages.warning(
-                request, "Pas assez de donnees pour generer une prediction."
+                request,
+                "Modele de risque non disponible (entrainement requis).",
             )
 
     except DossierCredit.DoesNotExist:
@@ -128,19 +149,23 @@ def predire_dossier(request, dossier_id):
 @role_required("SUPER_ADMIN", "RESPONSABLE_GGR", "ANALYSTE", "GESTIONNAIRE", "BOE")
 def exporter_excel(request):
     """
-    Exporte les statistiques en Excel
+    Exporte les statistiques en Excel (synchrone, acces direct ou scripts).
+    Les boutons de l'interface passent par l'export en arriere-plan
+    (api_creer_export, type EXCEL_STATISTIQUES).
     """
     try:
         filepath = ExportService.exporter_statistiques_excel(user=request.user)
 
-        # Retourner le fichier
+        # Retourner le fichier; il est supprime du disque des son ouverture
+        # (le descripteur reste valide jusqu'a la fin de la reponse)
+        fichier = open(filepath, "rb")
+        os.remove(filepath)
         response = FileResponse(
-            open(filepath, "rb"),
+            fichier,
+            as_attachment=True,
+            filename=ExportService.nom_fichier_excel(request.user),
             content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
-        response["Content-Disposition"] = (
-            f'attachment; filename="{filepath.split("/")[-1]}"'
-        )
 
         messages.success(request, "Export Excel genere avec succes.")
         return response
@@ -166,3 +191,142 @@ def api_kpis(request):
     """
     kpis = AnalyticsService.obtenir_kpis_dashboard()
     return JsonResponse(kpis)
+
+
+# Nombre maximum de dossiers scores par requete HTTP (le portefeuille
+# complet passe par la commande scorer_portefeuille)
+SCORING_LOT_MAX = 200
+
+
+@login_required
+@role_required("ANALYSTE", "RESPONSABLE_GGR")
+@require_POST
+def api_scorer_lot(request):
+    """
+    API JSON de scoring en lot.
+    Corps: {"dossier_ids": [...]} (au plus SCORING_LOT_MAX identifiants).
+    Le rescoring du portefeuille complet se fait hors requete:
+    python manage.py scorer_portefeuille
+    """
+    try:
+        payload = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "JSON invalide"}, status=400)
+
+    dossier_ids = payload.get("dossier_ids")
+    if not isinstance(dossier_ids, list) or not dossier_ids:
+        return JsonResponse(
+            {
+                "error": "dossier_ids (liste non vide) requis; portefeuille complet: "
+                "python manage.py scorer_portefeuille"
+            },
+            status=400,
+        )
+    if len(dossier_ids) > SCORING_LOT_MAX:
+        return JsonResponse(
+            {"error": f"Lot limite a {SCORING_LOT_MAX} dossiers"}, status=400
+        )
+    if not all(isinstance(dossier_id, int) for dossier_id in dossier_ids):
+        return JsonResponse({"error": "Identifiants invalides"}, status=400)
+    dossiers = DossierCredit.objects.filter(id__in=dossier_ids)
+
+    total = MLPredictionService.scorer_portefeuille(dossiers=dossiers)
+    if total is None:
+        return JsonResponse({"error": "Modele de risque non disponible"}, status=503)
+
+    return JsonResponse(
+        {"scores": total, "modele_version": MLPredictionService.version_modele()}
+    )
+
+
+# Roles autorises par type d'export en arriere-plan
+ROLES_EXPORT = {
+    "EXCEL_STATISTIQUES": (
+        "SUPER_ADMIN",
+        "RESPONSABLE_GGR",
+        "ANALYSTE",
+        "GESTIONNAIRE",
+        "BOE",
+    ),
+    "CSV_DOSSIERS": None,  # tout utilisateur connecte (perimetre par role)
+}
+
+
+@login_required
+@require_POST
+def api_creer_export(request):
+    """
+    Cree un export en arriere-plan et retourne l'URL de suivi (202).
+    Corps: type_export, et pour CSV_DOSSIERS date_debut / date_fin optionnels.
+    """
+    type_export = request.POST.get("type_export")
+    if type_export not in ROLES_EXPORT:
+        return JsonResponse({"error": "Type d'export inconnu"}, status=400)
+
+    roles = ROLES_EXPORT[type_export]
+    role = getattr(getattr(request.user, "profile", None), "role", None)
+    if roles and role not in roles:
+        return JsonResponse({"error": "Acces refuse"}, status=403)
+
+    parametres = {
+        cle: request.POST[cle]
+        for cle in ("date_debut", "date_fin")
+        if request.POST.get(cle)
+    }
+    tache = TacheExportService.creer(request.user, type_export, parametres)
+
+    return JsonResponse(
+        {
+            "id": tache.pk,
+            "statut": tache.statut,
+            "suivi": reverse("analytics:api_statut_export", args=[tache.pk]),
+        },
+        status=202,
+    )
+
+
+@login_required
+def api_statut_export(request, tache_id):
+    """
+    Progression d'un export; fournit le lien de telechargement signe
+    (usage unique) une fois termine
+    """
+    tache = get_object_or_404(TacheExport, pk=tache_id, utilisateur=request.user)
+    if tache.statut in ("EN_ATTENTE", "EN_COURS"):
+        # Worker redemarre depuis la creation: reprendre ou clore la tache
+        if any(TacheExportService.recuperer_bloquees(tache.pk)):
+            tache.refresh_from_db()
+
+    data = {
+        "id": tache.pk,
+        "type_export": tache.type_export,
+        "statut": tache.statut,
+        "progression": tache.progression,
+    }
+    if tache.statut == "TERMINE" and tache.telecharge_le is None:
+        data["telechargement"] = reverse(
+            "analytics:telecharger_export", args=[TacheExportService.jeton(tache)]
+        )
+        data["expire_le"] = tache.expire_le.isoformat()
+    elif tache.statut == "ECHEC":
+        data["erreur"] = tache.erreur
+
+    return JsonResponse(data)
+
+
+@login_required
+def telecharger_export(request, jeton):
+    """
+    Telechargement unique d'un export termine (lien signe et expirant)
+    """
+    tache = TacheExportService.consommer_jeton(jeton, request.user)
+    if tache is None:
+        raise Http404("Lien de telechargement invalide ou expire")
+
+    try:
+        fichier = open(tache.fichier, "rb")
+    except FileNotFoundError:
+        raise Http404("Fichier d'export introuvable")
+    os.remove(tache.fichier)
+
+    return FileResponse(fichier, as_attachment=True, filename=tache.nom_fichier)
@@ -0,0 +1,71 @@
+"""
+Cache partage par sous-systeme
+Alias nommes (voir CACHES dans les settings) et garde anti-stampede
+"""
+
+import time
+
+from django.core.cache import caches
+
+# Alias de cache (CACHE_ESPACES dans core/settings/base.py)
+SESSIONS = "sessions"
+RATELIMIT = "ratelimit"
+KPI = "kpi"
+MODELES = "modeles"
+
+
+def get_cache(alias: str):
+    """Retourne le backend de cache d'un sous-systeme"""
+    return caches[alias]
+
+
+def get_or_set_locked(
+    alias: str,
+    key: str,
+    compute,
+    timeout: int,
+    lock_timeout: int = 10,
+    wait: float = 0.05,
+    retries: int = 40,
+):
+    """
+    Lit `key` dans le cache `alias` ou la calcule avec `compute()`.
+
+    Garde anti-stampede: lors d'un cache miss, un seul worker obtient le
+    verrou (add atomique) et calcule la valeur; les autres attendent qu'elle
+    soit publiee au lieu de lancer la meme requete couteuse en parallele.
+    Si le detenteur du verrou depasse le delai d'attente, la valeur est
+    calculee localement sans etre ecrite.
+
+    Args:
+        alias: Alias du cache (ex: KPI)
+        key: Cle de la valeur
+        compute: Fonction sans argument produisant la valeur (jamais None)
+        timeout: Duree de vie de la valeur en secondes
+        lock_timeout: Duree de vie maximale du verrou en secondes
+        wait: Pause entre deux relectures en secondes
+        retries: Nombre maximal de relectures
+
+    Returns:
+        Valeur en cache ou calculee
+    """
+    backend = caches[alias]
+    value = backend.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:verrou"
+    if backend.add(lock_key, 1, lock_timeout):
+        try:
+            value = compute()
+            backend.set(key, value, timeout)
+        finally:
+            backend.delete(lock_key)
+        return value
+
+    for _ in range(retries):
+        time.sleep(wait)
+        value = backend.get(key)
+        if value is not None:
+            return value
+    return compute()
@@ -0,0 +1,236 @@
+"""
+Bus d'evenements temps reel (pub/sub)
+Les services publient sur des canaux (utilisateur, role); les flux SSE
+abonnes recoivent les evenements. Backplane en memoire (un seul processus)
+ou Redis (plusieurs workers), choisi par EVENEMENTS_BACKPLANE.
+Chaque evenement porte un id croissant et les derniers evenements de chaque
+canal sont conserves pour la reprise apres reconnexion (Last-Event-ID).
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger("suivi_demande")
+
+# Backplanes disponibles (EVENEMENTS_BACKPLANE)
+MEMOIRE = "memoire"
+REDIS = "redis"
+
+
+def canal_utilisateur(user_id: int) -> str:
+    """Canal des evenements personnels d'un utilisateur"""
+    return f"utilisateur:{user_id}"
+
+
+def canal_role(role: str) -> str:
+    """Canal des diffusions a un role"""
+    return f"role:{role}"
+
+
+@dataclass(frozen=True)
+class Evenement:
+    """Evenement publie sur un canal"""
+
+    id: int
+    type: str
+    data: dict = field(default_factory=dict)
+
+    def to_sse(self) -> str:
+        """Format text/event-stream"""
+        data = json.dumps(self.data, ensure_ascii=False, default=str)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {data}\n\n"
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"id": self.id, "type": self.type, "data": self.data}, default=str
+        )
+
+    @classmethod
+    def from_json(cls, brut) -> "Evenement":
+        valeur = json.loads(brut)
+        return cls(id=valeur["id"], type=valeur["type"], data=valeur["data"])
+
+
+class _AbonnementMemoire:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.file = asyncio.Queue()
+
+    async def get(self, timeout: float) -> Optional[Evenement]:
+        try:
+            return await asyncio.wait_for(self.file.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BackplaneMemoire:
+    """
+    Backplane en memoire: ne relie que les flux du processus courant
+    (developpement, tests, deploiement a un seul worker).
+    """
+
+    def __init__(self, historique: int = 100):
+        self._verrou = threading.Lock()
+        self._sequence = itertools.count(1)
+        self._dernier_id = 0
+        self._historiques = defaultdict(lambda: deque(maxlen=historique))
+        self._abonnes = defaultdict(set)
+
+    def publish(self, canal: str, type: str, data: dict) -> Evenement:
+        with self._verrou:
+            evenement = Evenement(next(self._sequence), type, data)
+            self._dernier_id = evenement.id
+            self._historiques[canal].append(evenement)
+            abonnes = list(self._abonnes.get(canal, ()))
+        for abonne in abonnes:
+            # Publication depuis un thread de vue: remettre a la boucle du flux
+            try:
+                abonne.loop.call_soon_threadsafe(abonne.file.put_nowait, evenement)
+            except RuntimeError:
+                pass  # boucle fermee: flux deja termine
+        return evenement
+
+    def last_id(self) -> int:
+        return self._dernier_id
+
+    def since(self, canaux: Iterable[str], last_id: int) -> List[Evenement]:
+        with self._verrou:
+            evenements = [
+                evenement
+                for canal in canaux
+                for evenement in self._historiques.get(canal, ())
+                if evenement.id > last_id
+            ]
+        return sorted(evenements, key=lambda evenement: evenement.id)
+
+    @asynccontextmanager
+    async def subscribe(self, canaux: Iterable[str]):
+        canaux = list(canaux)
+        abonnement = _AbonnementMemoire()
+        with self._verrou:
+            for canal in canaux:
+                self._abonnes[canal].add(abonnement)
+        try:
+            yield abonnement
+        finally:
+            with self._verrou:
+                for canal in canaux:
+                    self._abonnes[canal].discard(abonnement)
+
+
+class _AbonnementRedis:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def get(self, timeout: float) -> Optional[Evenement]:
+        message = await self.pubsub.get_message(
+            ignore_subscribe_messages=True, timeout=timeout
+        )
+        if message is None:
+            return None
+        return Evenement.from_json(message["data"])
+
+
+class BackplaneRedis:
+    """
+    Backplane Redis: PUBLISH/SUBSCRIBE entre workers, sequence par INCR et
+    historique borne par canal (LPUSH + LTRIM).
+    """
+
+    PREFIXE = "evenements:"
+
+    def __init__(self, url: str, historique: int = 100):
+        import redis
+
+        self._url = url
+        self._historique = historique
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, canal: str, type: str, data: dict) -> Evenement:
+        evenement = Evenement(self._client.incr(f"{self.PREFIXE}sequence"), type, data)
+        brut = evenement.to_json()
+        cle = f"{self.PREFIXE}historique:{canal}"
+        pipe = self._client.pipeline()
+        pipe.lpush(cle, brut)
+        pipe.ltrim(cle, 0, self._historique - 1)
+        pipe.publish(f"{self.PREFIXE}{canal}", brut)
+        pipe.execute()
+        return evenement
+
+    def last_id(self) -> int:
+        return int(self._client.get(f"{self.PREFIXE}sequence") or 0)
+
+    def since(self, canaux: Iterable[str], last_id: int) -> List[Evenement]:
+        pipe = self._client.pipeline()
+        for canal in canaux:
+            pipe.lrange(f"{self.PREFIXE}historique:{canal}", 0, -1)
+        evenements = [
+            Evenement.from_json(brut) for lignes in pipe.execute() for brut in lignes
+        ]
+        return sorted(
+            (evenement for evenement in evenements if evenement.id > last_id),
+            key=lambda evenement: evenement.id,
+        )
+
+    @asynccontextmanager
+    async def subscribe(self, canaux: Iterable[str]):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self._url)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(*(f"{self.PREFIXE}{canal}" for canal in canaux))
+            yield _AbonnementRedis(pubsub)
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_backplane = None
+_verrou_backplane = threading.Lock()
+
+
+def get_backplane():
+    """Retourne le backplane du processus (cree au premier appel)"""
+    global _backplane
+    if _backplane is None:
+        with _verrou_backplane:
+            if _backplane is None:
+                historique = settings.EVENEMENTS_HISTORIQUE
+                if settings.EVENEMENTS_BACKPLANE == REDIS:
+                    _backplane = BackplaneRedis(settings.REDIS_URL, historique)
+                else:
+                    _backplane = BackplaneMemoire(historique)
+    return _backplane
+
+
+def publish(canal: str, type: str, data: dict) -> Optional[Evenement]:
+    """
+    Publie un evenement. A appeler apres commit (transaction.on_commit):
+    une panne du backplane est journalisee sans interrompre l'appelant,
+    les pages restant la source de verite.
+
+    Args:
+        canal: Canal destinataire (canal_utilisateur, canal_role)
+        type: Type d'evenement (nom de l'evenement SSE)
+        data: Donnees serialisables en JSON
+
+    Returns:
+        Evenement publie, ou None en cas d'echec
+    """
+    try:
+        return get_backplane().publish(canal, type, data)
+    except Exception as exc:
+        logger.warning(
+            f"Publication de l'evenement {type} sur {canal} impossible: {exc}"
+        )
+        return None
@@ -3,32 +3,156 @@ Module de Securite Renforcee
 Rate Limiting, Validation, Sanitization
 """
 
+import logging
+import math
 import re
+import time
 import bleach
+from dataclasses import dataclass
 from functools import wraps
-from django.core.cache import cache
-from django.http import HttpResponseForbidden
+from typing import Optional
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.contrib.auth.models import User
+from core.cache import RATELIMIT, get_cache
 from core.monitoring import log_security_event
 
+logger = logging.getLogger(__name__)
 
 # === RATE LIMITING ===
 
+# Fenetres supportees
+WINDOW_FIXED = "fixed"
+WINDOW_SLIDING = "sliding"
 
-def rate_limit(key_prefix: str, limit: int, period: int):
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """Politique de limitation: `limit` requetes par `period` secondes"""
+
+    limit: int
+    period: int
+    window: str = WINDOW_FIXED
+
+
+# Politiques par prefixe (declarees par les decorateurs, surchargeables via
+# settings.RATE_LIMIT_POLICIES = {"login_pro": {"limit": 10, ...}})
+_POLICIES = {}
+
+
+def get_policy(key_prefix: str) -> RateLimitPolicy:
+    """Politique effective d'un prefixe (settings prioritaires)"""
+    override = getattr(settings, "RATE_LIMIT_POLICIES", {}).get(key_prefix)
+    if override:
+        return RateLimitPolicy(**override)
+    return _POLICIES[key_prefix]
+
+
+def _incr(cache, key: str, ttl: int) -> Optional[int]:
+    """
+    Increment atomique d'un compteur cree avec une expiration fixe.
+    Le TTL n'est pose qu'a la creation: les hits suivants ne le prolongent pas.
+    Renvoie None si le cache est indisponible (django-redis IGNORE_EXCEPTIONS).
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, ttl):
+            return 1
+        # Cree entre-temps par un autre worker
+        return cache.incr(key)
+
+
+def hit(key_prefix: str, identifier: str, policy: RateLimitPolicy):
+    """
+    Enregistre une requete et indique si elle depasse la politique.
+
+    Fenetre fixe: un compteur par intervalle [k*period, (k+1)*period).
+    Fenetre glissante: compteur courant + compteur precedent pondere par la
+    part de l'intervalle precedent encore couverte par la fenetre.
+
+    Args:
+        key_prefix: Prefixe de la politique
+        identifier: Identifiant du demandeur (user_<id> ou IP)
+        policy: Politique a appliquer
+
+    Returns:
+        (autorise, retry_after en secondes, compte estime)
+    """
+    cache = get_cache(RATELIMIT)
+    now = time.time()
+    bucket, elapsed = divmod(now, policy.period)
+    bucket = int(bucket)
+    key = f"rate_limit:{key_prefix}:{identifier}"
+
+    if policy.window == WINDOW_SLIDING:
+        current = _incr(cache, f"{key}:{bucket}", policy.period * 2)
+        if current is None:
+            return _cache_indisponible(key_prefix)
+        previous = cache.get(f"{key}:{bucket - 1}", 0) or 0
+        weight = 1 - elapsed / policy.period
+        count = current + previous * weight
+        if count <= policy.limit:
+            return True, 0, count
+        if previous and current <= policy.limit:
+            # Instant ou la part ponderee du compteur precedent suffit
+            retry = policy.period * (1 - (policy.limit - current) / previous) - elapsed
+        else:
+            retry = policy.period - elapsed
+        return False, max(1, math.ceil(retry)), count
+
+    count = _incr(cache, f"{key}:{bucket}", policy.period)
+    if count is None:
+        return _cache_indisponible(key_prefix)
+    if count <= policy.limit:
+        return True, 0, count
+    return False, max(1, math.ceil(policy.period - elapsed)), count
+
+
+def _cache_indisponible(key_prefix: str):
+    """Cache du rate limit injoignable: la requete passe (pas d'erreur 500)"""
+    logger.warning(
+        f"Rate limit '{key_prefix}' inactif: cache indisponible, requete autorisee"
+    )
+    return True, 0, 0
+
+
+def get_rate_limit_stats() -> dict:
+    """
+    Compteurs de monitoring par prefixe (partages entre workers).
+    Seuls les refus sont comptes: le chemin nominal reste a un aller-retour.
+    """
+    cache = get_cache(RATELIMIT)
+    keys = {prefix: f"rate_limit:stats:{prefix}:blocked" for prefix in _POLICIES}
+    blocked = cache.get_many(list(keys.values()))
+    stats = {}
+    for prefix, key in keys.items():
+        policy = get_policy(prefix)
+        stats[prefix] = {
+            "limit": policy.limit,
+            "period": policy.period,
+            "window": policy.window,
+            "blocked": blocked.get(key, 0),
+        }
+    return stats
+
+
+def rate_limit(key_prefix: str, limit: int, period: int, window: str = WINDOW_FIXED):
     """
     Decorateur de rate limiting
 
     Args:
-        key_prefix: Prefixe de la cle cache
+        key_prefix: Prefixe de la cle cache (identifie la politique)
         limit: Nombre max de requetes
         period: Periode en secondes
+        window: WINDOW_FIXED ou WINDOW_SLIDING
 
     Usage:
         @rate_limit('login', limit=5, period=300)  # 5 tentatives / 5min
         def login_view(request):
             ...
     """
+    _POLICIES[key_prefix] = RateLimitPolicy(limit, period, window)
 
     def decorator(func):
         @wraps(func)
@@ -39,24 +163,27 @@ def rate_limit(key_prefix: str, limit: int, period: int):
             else:
                 identifier = get_client_ip(request)
 
-            cache_key = f"rate_limit:{key_prefix}:{identifier}"
-
-            # Verifier le compteur
-            count = cache.get(cache_key, 0)
-
-            if count >= limit:
+            allowed, retry_after, count = hit(
+                key_prefix, identifier, get_policy(key_prefix)
+            )
+            if not allowed:
+                _incr(
+                    get_cache(RATELIMIT),
+                    f"rate_limit:stats:{key_prefix}:blocked",
+                    24 * 3600,
+                )
                 log_security_event(
                     "RATE_LIMIT_EXCEEDED",
-                    request.user.id if request.user.is_authenticated else None,
+                    request.user if request.user.is_authenticated else None,
                     get_client_ip(request),
                     {"key_prefix": key_prefix, "count": count},
                 )
-                return HttpResponseForbidden(
-                    f"Trop de requetes. Reessayez dans {period} secondes."
+                response = HttpResponse(
+                    f"Trop de requetes. Reessayez dans {retry_after} secondes.",
+                    status=429,
                 )
-
-            # Incrementer le compteur
-            cache.set(cache_key, count + 1, period)
+                response["Retry-After"] = str(retry_after)
+                return response
 
             return func(request, *args, **kwargs)
 
@@ -181,7 +308,7 @@ def require_roles(allowed_roles: list):
             if user_role not in allowed_roles:
                 log_security_event(
                     "UNAUTHORIZED_ACCESS",
-                    request.user.id,
+                    request.user,
                     get_client_ip(request),
                     {"required_roles": allowed_roles, "user_role": user_role},
                 )
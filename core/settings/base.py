@@ -80,19 +80,58 @@ TEMPLATES = [
     }
 ]
 
-# Cache Configuration (en mémoire pour le développement)
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-snowflake",
-        "OPTIONS": {
-            "MAX_ENTRIES": 1000
+# Cache Configuration
+# Un alias par sous-systeme (espace de cles distinct). Redis partage entre
+# les workers si REDIS_URL est defini, sinon LocMem par processus (dev/tests).
+REDIS_URL = env("REDIS_URL", default="")
+# Incrementer CACHE_VERSION invalide toutes les cles (changement de format)
+CACHE_VERSION = env.int("CACHE_VERSION", default=1)
+CACHE_ESPACES = {
+    "default": "ggr",
+    "sessions": "ggr:sessions",
+    "ratelimit": "ggr:ratelimit",
+    "kpi": "ggr:kpi",
+    "modeles": "ggr:modeles",
+}
+
+
+def _config_cache(alias, prefixe):
+    if REDIS_URL:
+        return {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": prefixe,
+            "VERSION": CACHE_VERSION,
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                # Redis indisponible: cache manque plutot qu'erreur 500,
+                # sauf pour les sessions (perte de connexion silencieuse)
+                "IGNORE_EXCEPTIONS": alias != "sessions",
+            },
         }
+    return {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": prefixe,
+        "KEY_PREFIX": prefixe,
+        "VERSION": CACHE_VERSION,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
     }
-}
 
-# Session Configuration (utiliser la base de données)
-SESSION_ENGINE = "django.contrib.sessions.backends.db"
+
+CACHES = {alias: _config_cache(alias, prefixe) for alias, prefixe in CACHE_ESPACES.items()}
+
+# Surcharges des politiques de rate limit par prefixe (core.security)
+# ex: {"login_pro": {"limit": 10, "period": 300, "window": "sliding"}}
+RATE_LIMIT_POLICIES = {}
+
+# Session Configuration
+# Avec Redis, les sessions ne touchent plus la base; sans Redis (LocMem par
+# processus) elles restent en base pour etre partagees entre workers.
+if REDIS_URL:
+    SESSION_ENGINE = "django.contrib.sessions.backends.cache"
+    SESSION_CACHE_ALIAS = "sessions"
+else:
+    SESSION_ENGINE = "django.contrib.sessions.backends.db"
 SESSION_COOKIE_AGE = 3600  # 1 heure
 SESSION_COOKIE_SECURE = not DEBUG  # HTTPS uniquement en production
 SESSION_COOKIE_HTTPONLY = True
@@ -183,6 +222,57 @@ EMAIL_BACKEND = env(
     "EMAIL_BACKEND", default="django.core.mail.backends.console.EmailBackend"
 )
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL", default="no-reply@ggr-credit.local")
+EMAIL_HOST = env("EMAIL_HOST", default="localhost")
+EMAIL_PORT = env.int("EMAIL_PORT", default=25)
+EMAIL_USE_TLS = env.bool("EMAIL_USE_TLS", default=False)
+EMAIL_HOST_USER = env("EMAIL_HOST_USER", default="")
+EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD", default="")
+
+# Notifications de role: une ligne diffusee au role (True) ou une par membre
+NOTIFICATIONS_DIFFUSION_ROLE = env.bool("NOTIFICATIONS_DIFFUSION_ROLE", default=True)
+
+# Retention des notifications (commande purge_notifications)
+NOTIFICATIONS_RETENTION_JOURS = env.int("NOTIFICATIONS_RETENTION_JOURS", default=90)
+NOTIFICATIONS_RESUME_JOURS = env.int("NOTIFICATIONS_RESUME_JOURS", default=30)
+NOTIFICATIONS_PURGE_LOT = env.int("NOTIFICATIONS_PURGE_LOT", default=500)
+
+# Flux temps reel (core.evenements, vue notifications_stream; servi en ASGI)
+# Backplane "redis" (partage entre workers) ou "memoire" (un seul processus)
+EVENEMENTS_BACKPLANE = env(
+    "EVENEMENTS_BACKPLANE", default="redis" if REDIS_URL else "memoire"
+)
+# Nombre de workers du serveur (variable lue aussi par gunicorn): le backplane
+# "memoire" n'est pas partage entre processus, les evenements seraient perdus
+WEB_CONCURRENCY = env.int("WEB_CONCURRENCY", default=1)
+if EVENEMENTS_BACKPLANE == "redis" and not REDIS_URL:
+    raise ImproperlyConfigured("EVENEMENTS_BACKPLANE=redis requires REDIS_URL.")
+if EVENEMENTS_BACKPLANE == "memoire" and WEB_CONCURRENCY > 1:
+    raise ImproperlyConfigured(
+        f"WEB_CONCURRENCY={WEB_CONCURRENCY} requires REDIS_URL: the in-memory "
+        "event backplane (EVENEMENTS_BACKPLANE=memoire) only works with a single "
+        "worker."
+    )
+EVENEMENTS_HISTORIQUE = env.int("EVENEMENTS_HISTORIQUE", default=100)  # par canal
+EVENEMENTS_HEARTBEAT = env.int("EVENEMENTS_HEARTBEAT", default=15)  # secondes
+EVENEMENTS_DUREE_MAX = env.int("EVENEMENTS_DUREE_MAX", default=300)  # secondes
+EVENEMENTS_RETRY = env.int("EVENEMENTS_RETRY", default=3000)  # ms avant reconnexion
+
+# Boite d'envoi (EmailSortant), videe par la commande envoyer_emails
+# EMAIL_OUTBOX_WORKER: True si le worker envoyer_emails est deploye; sinon les
+# emails sont envoyes par le processus web apres le commit
+EMAIL_OUTBOX_WORKER = env.bool("EMAIL_OUTBOX_WORKER", default=False)
+EMAIL_OUTBOX_LOT = env.int("EMAIL_OUTBOX_LOT", default=50)
+EMAIL_OUTBOX_MAX_TENTATIVES = env.int("EMAIL_OUTBOX_MAX_TENTATIVES", default=5)
+EMAIL_OUTBOX_BACKOFF = env.int("EMAIL_OUTBOX_BACKOFF", default=60)  # secondes
+
+# Exports en arriere-plan (analytics.TacheExport)
+# EXPORTS_EXECUTION: "thread" (pool du worker) ou "commande" (traiter_exports)
+EXPORTS_EXECUTION = env("EXPORTS_EXECUTION", default="thread")
+EXPORTS_WORKERS = env.int("EXPORTS_WORKERS", default=2)
+EXPORTS_DIR = env("EXPORTS_DIR", default=str(BASE_DIR / "var" / "exports"))
+EXPORTS_DUREE_LIEN = env.int("EXPORTS_DUREE_LIEN", default=3600)  # secondes
+# Au-dela, une tache EN_COURS est consideree interrompue (worker arrete)
+EXPORTS_DELAI_MAX = env.int("EXPORTS_DELAI_MAX", default=1800)  # secondes
 
 # WhiteNoise storages (enabled in prod)
 STORAGES = {
@@ -3,6 +3,7 @@ Configuration de l'interface d'administration Django.
 """
 
 from django.contrib import admin
+from django.utils import timezone
 
 from .models import (
     UserProfile,
@@ -11,6 +12,7 @@ from .models import (
     Commentaire,
     JournalAction,
     Notification,
+    EmailSortant,
 )
 
 
@@ -72,11 +74,35 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = (
         "id",
         "utilisateur_cible",
+        "role_cible",
         "type",
         "titre",
         "lu",
         "canal",
         "created_at",
     )
-    list_filter = ("lu", "canal", "created_at")
+    list_filter = ("lu", "role_cible", "canal", "created_at")
     search_fields = ("titre", "utilisateur_cible__username")
+
+
+@admin.register(EmailSortant)
+class EmailSortantAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "sujet",
+        "statut",
+        "tentatives",
+        "prochaine_tentative",
+        "created_at",
+        "envoye_le",
+    )
+    list_filter = ("statut", "created_at")
+    search_fields = ("sujet", "destinataires")
+    actions = ["relancer"]
+
+    @admin.action(description="Relancer les emails selectionnes")
+    def relancer(self, request, queryset):
+        relances = queryset.exclude(statut="ENVOYE").update(
+            statut="EN_ATTENTE", tentatives=0, prochaine_tentative=timezone.now()
+        )
+        self.message_user(request, f"{relances} email(s) remis en file.")
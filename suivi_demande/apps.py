@@ -5,3 +5,6 @@ class SuiviDemandeConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "suivi_demande"
     verbose_name = "Suivi des Demandes de Credit"
+
+    def ready(self):
+        import suivi_demande.signals  # noqa: F401
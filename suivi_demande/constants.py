@@ -26,9 +26,14 @@ ALLOWED_EXTENSIONS = [".pdf", ".jpg", ".jpeg", ".png"]
 ITEMS_PER_PAGE = 25
 NOTIFICATIONS_PER_PAGE = 20
 
+# Transitions en lot: nombre maximum de dossiers par requete
+TRANSITION_LOT_MAX = 1000
+
 # Cache
 CACHE_TIMEOUT_STATS = 300  # 5 minutes
 CACHE_TIMEOUT_DASHBOARD = 180  # 3 minutes
+CACHE_TIMEOUT_SCOPE = 600  # 10 minutes
+CACHE_TIMEOUT_NOTIFICATIONS = 600  # 10 minutes
 
 # Age minimum pour un demandeur
 AGE_MINIMUM = 18
@@ -2,19 +2,25 @@
 Context processors pour ajouter des variables globales aux templates.
 """
 
-from .models import Notification
+from django.utils.functional import SimpleLazyObject
+
+from .services.notification_service import NotificationService
 
 
 def notifications(request):
-    """Expose unread notifications count and latest items for authenticated users."""
+    """
+    Expose unread notifications count and latest items for authenticated users.
+    Valeurs paresseuses servies par le cache: aucune requete si le template
+    ne les lit pas.
+    """
     if not request.user.is_authenticated:
         return {"unread_notifications_count": 0, "latest_notifications": []}
-    qs = Notification.objects.filter(utilisateur_cible=request.user).order_by(
-        "-created_at"
-    )
-    count = qs.filter(lu=False).count()
-    latest = list(qs[:5])
+    user = request.user
     return {
-        "unread_notifications_count": count,
-        "latest_notifications": latest,
+        "unread_notifications_count": SimpleLazyObject(
+            lambda: NotificationService.unread_count(user)
+        ),
+        "latest_notifications": SimpleLazyObject(
+            lambda: NotificationService.latest(user)
+        ),
     }
@@ -9,7 +9,8 @@ from django.contrib import messages
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import redirect, get_object_or_404
 
-from .models import DossierCredit, DossierStatutAgent, UserRoles
+from .models import DossierCredit
+from .services.transition_service import TransitionService
 
 
 def role_required(roles: Iterable[str]):
@@ -49,47 +50,7 @@ def transition_allowed(view_func):
         profile = getattr(request.user, "profile", None)
         role = getattr(profile, "role", None)
 
-        allowed = False
-        try:
-            if role == UserRoles.GESTIONNAIRE and action == "transmettre_analyste":
-                allowed = dossier.statut_agent in [
-                    DossierStatutAgent.NOUVEAU,
-                    DossierStatutAgent.TRANSMIS_RESP_GEST,
-                ]
-            elif role == UserRoles.GESTIONNAIRE and action == "retour_client":
-                # Autoriser le retour au client par un gestionnaire
-                allowed = dossier.statut_agent in [
-                    DossierStatutAgent.NOUVEAU,
-                    DossierStatutAgent.TRANSMIS_RESP_GEST,
-                ]
-            elif role == UserRoles.ANALYSTE and action == "transmettre_ggr":
-                allowed = dossier.statut_agent in [
-                    DossierStatutAgent.TRANSMIS_ANALYSTE,
-                    DossierStatutAgent.EN_COURS_ANALYSE,
-                ]
-            elif role == UserRoles.ANALYSTE and action == "retour_gestionnaire":
-                allowed = dossier.statut_agent in [
-                    DossierStatutAgent.TRANSMIS_ANALYSTE,
-                    DossierStatutAgent.EN_COURS_ANALYSE,
-                ]
-            elif role == UserRoles.RESPONSABLE_GGR and action == "approuver":
-                allowed = dossier.statut_agent in [
-                    DossierStatutAgent.EN_COURS_VALIDATION_GGR,
-                    DossierStatutAgent.EN_ATTENTE_DECISION_DG,
-                ]
-            elif role == UserRoles.RESPONSABLE_GGR and action == "refuser":
-                allowed = dossier.statut_agent in [
-                    DossierStatutAgent.EN_COURS_VALIDATION_GGR,
-                    DossierStatutAgent.EN_ATTENTE_DECISION_DG,
-                    DossierStatutAgent.TRANSMIS_ANALYSTE,
-                    DossierStatutAgent.EN_COURS_ANALYSE,
-                ]
-            elif role == UserRoles.BOE and action == "liberer_fonds":
-                allowed = (
-                    dossier.statut_agent == DossierStatutAgent.APPROUVE_ATTENTE_FONDS
-                )
-        except Exception:
-            allowed = False
+        allowed = TransitionService.is_allowed(role, action, dossier.statut_agent)
 
         if not allowed:
             messages.error(
@@ -0,0 +1,46 @@
+"""
+Commande Django de livraison de la boite d'envoi (EmailSortant).
+Usage: python manage.py envoyer_emails [--une-fois] [--intervalle 5] [--lot 50]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from suivi_demande.services.email_service import EmailService
+
+
+class Command(BaseCommand):
+    help = "Envoie les emails en attente de la boite d'envoi"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--une-fois",
+            action="store_true",
+            help="Vider la file des emails echus puis s'arreter",
+        )
+        parser.add_argument(
+            "--intervalle",
+            type=float,
+            default=5,
+            help="Secondes d'attente quand aucun email n'est a envoyer",
+        )
+        parser.add_argument(
+            "--lot",
+            type=int,
+            default=None,
+            help="Nombre d'emails par connexion SMTP (defaut: EMAIL_OUTBOX_LOT)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            envoyes, echecs = EmailService.process_pending(options["lot"])
+            if envoyes or echecs:
+                self.stdout.write(f"{envoyes} emails envoyes, {echecs} echecs")
+
+            if not (envoyes or echecs):
+                if options["une_fois"]:
+                    break
+                time.sleep(options["intervalle"])
+
+        self.stdout.write(self.style.SUCCESS("Envoi des emails termine"))
@@ -0,0 +1,72 @@
+"""
+Commande Django de retention des notifications.
+Usage: python manage.py purge_notifications [--une-fois] [--intervalle 3600]
+       [--retention 90] [--resume 30] [--lot 500]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from suivi_demande.services.notification_service import NotificationService
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les notifications lues anciennes et regroupe les non lues "
+        "anciennes en un resume par utilisateur"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--une-fois",
+            action="store_true",
+            help="Faire une seule passe puis s'arreter",
+        )
+        parser.add_argument(
+            "--intervalle",
+            type=float,
+            default=3600,
+            help="Secondes entre deux passes",
+        )
+        parser.add_argument(
+            "--retention",
+            type=int,
+            default=None,
+            help="Age en jours des notifications lues a supprimer "
+            "(defaut: NOTIFICATIONS_RETENTION_JOURS)",
+        )
+        parser.add_argument(
+            "--resume",
+            type=int,
+            default=None,
+            help="Age en jours des non lues a regrouper "
+            "(defaut: NOTIFICATIONS_RESUME_JOURS)",
+        )
+        parser.add_argument(
+            "--lot",
+            type=int,
+            default=None,
+            help="Lignes supprimees par transaction (defaut: NOTIFICATIONS_PURGE_LOT)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            bilan = NotificationService.purge(
+                retention_days=options["retention"],
+                digest_days=options["resume"],
+                batch_size=options["lot"],
+            )
+            self.stdout.write(
+                f"{bilan['lues']} notifications lues supprimees, "
+                f"{bilan['diffusions']} diffusions supprimees "
+                f"({bilan['lectures']} lectures), "
+                f"{bilan['regroupees']} non lues regroupees en "
+                f"{bilan['resumes']} resumes"
+            )
+
+            if options["une_fois"]:
+                break
+            time.sleep(options["intervalle"])
+
+        self.stdout.write(self.style.SUCCESS("Purge des notifications terminee"))
@@ -15,13 +15,14 @@ class Command(BaseCommand):
         self.stdout.write("ðŸ¤– Entrainement du modele de scoring credit...")
 
         # Recuperer les dossiers avec statuts finaux
+        # (les features sont lues en colonnes par CreditScoringModel)
         dossiers = DossierCredit.objects.filter(
             statut_agent__in=[
                 DossierStatutAgent.APPROUVE_ATTENTE_FONDS,
                 DossierStatutAgent.FONDS_LIBERE,
                 DossierStatutAgent.REFUSE,
             ]
-        ).select_related("canevas")
+        )
 
         count = dossiers.count()
         self.stdout.write(f"ðŸ“Š {count} dossiers trouves pour l'entrainement")
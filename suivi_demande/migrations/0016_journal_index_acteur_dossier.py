@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suivi_demande", "0015_add_refuse_statut_client"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="journalaction",
+            index=models.Index(
+                fields=["acteur", "dossier"], name="suivi_deman_acteur__a247c3_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suivi_demande", "0016_journal_index_acteur_dossier"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="journalaction",
+            index=models.Index(
+                fields=["dossier", "-timestamp"], name="suivi_deman_dossier_87f6e6_idx"
+            ),
+        ),
+    ]
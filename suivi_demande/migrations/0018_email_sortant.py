@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suivi_demande", "0017_journal_index_dossier_timestamp"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailSortant",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("destinataires", models.JSONField(default=list)),
+                ("sujet", models.CharField(max_length=255)),
+                ("corps", models.TextField()),
+                ("corps_html", models.TextField(blank=True)),
+                ("expediteur", models.CharField(blank=True, max_length=255)),
+                (
+                    "statut",
+                    models.CharField(
+                        choices=[
+                            ("EN_ATTENTE", "En attente"),
+                            ("ENVOYE", "Envoye"),
+                            ("ECHEC", "Echec definitif"),
+                        ],
+                        default="EN_ATTENTE",
+                        max_length=20,
+                    ),
+                ),
+                ("tentatives", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "prochaine_tentative",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("derniere_erreur", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("envoye_le", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Email sortant",
+                "verbose_name_plural": "Emails sortants",
+                "indexes": [
+                    models.Index(
+                        fields=["statut", "prochaine_tentative"],
+                        name="suivi_deman_statut_2f7fdc_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suivi_demande", "0018_email_sortant"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LectureNotification",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("lu_le", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="role_cible",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("CLIENT", "Client"),
+                    ("GESTIONNAIRE", "Gestionnaire"),
+                    ("ANALYSTE", "Analyste credit"),
+                    ("RESPONSABLE_GGR", "Responsable GGR"),
+                    ("BOE", "Back Office Engagement"),
+                    ("SUPER_ADMIN", "Super administrateur"),
+                ],
+                max_length=30,
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="utilisateur_cible",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="notifications",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["role_cible", "created_at"],
+                name="suivi_deman_role_ci_f51658_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.CheckConstraint(
+                condition=models.Q(
+                    models.Q(
+                        ("role_cible__isnull", True),
+                        ("utilisateur_cible__isnull", False),
+                    ),
+                    models.Q(
+                        ("role_cible__isnull", False),
+                        ("utilisateur_cible__isnull", True),
+                    ),
+                    _connector="OR",
+                ),
+                name="notification_un_seul_destinataire",
+            ),
+        ),
+        migrations.AddField(
+            model_name="lecturenotification",
+            name="notification",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="lectures",
+                to="suivi_demande.notification",
+            ),
+        ),
+        migrations.AddField(
+            model_name="lecturenotification",
+            name="utilisateur",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="lectures_notifications",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="lecturenotification",
+            constraint=models.UniqueConstraint(
+                fields=("notification", "utilisateur"),
+                name="unique_lecture_notification",
+            ),
+        ),
+    ]
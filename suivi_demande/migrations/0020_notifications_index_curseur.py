@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suivi_demande", "0019_notifications_diffusion_role"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["utilisateur_cible", "-created_at", "-id"],
+                name="notif_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("lu", False)),
+                fields=["utilisateur_cible", "created_at"],
+                name="notif_user_non_lues_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suivi_demande", "0020_notifications_index_curseur"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompteurReference",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("prefixe", models.CharField(max_length=10)),
+                ("annee", models.PositiveSmallIntegerField()),
+                ("valeur", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Compteur de references",
+                "verbose_name_plural": "Compteurs de references",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("prefixe", "annee"), name="unique_compteur_reference"
+                    )
+                ],
+            },
+        ),
+    ]
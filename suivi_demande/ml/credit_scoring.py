@@ -6,6 +6,7 @@ Predit la probabilite d'approbation d'un dossier de credit.
 import os
 import logging
 from decimal import Decimal
+from itertools import islice
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -13,6 +14,7 @@ logger = logging.getLogger(__name__)
 # Verifier si scikit-learn est disponible
 try:
     import joblib
+    import numpy as np
     import pandas as pd
     from sklearn.ensemble import RandomForestClassifier
     from sklearn.model_selection import train_test_split
@@ -47,6 +49,15 @@ class CreditScoringModel:
             "ratio_endettement",
         ]
 
+    # Colonnes lues en base pour les traitements en lot (cf. features_matrix)
+    FEATURE_FIELDS = (
+        "montant",
+        "canevas__demande_duree_mois",
+        "canevas__salaire_net_moyen_fcfa",
+        "canevas__capacite_endettement_nette_fcfa",
+    )
+    APPROVED_STATUSES = ("APPROUVE_ATTENTE_FONDS", "FONDS_LIBERE")
+
     def _get_default_model_path(self):
         """Retourne le chemin par defaut du modele."""
         base_dir = Path(__file__).resolve().parent.parent.parent
@@ -79,6 +90,65 @@ class CreditScoringModel:
             logger.error(f"Erreur preparation features: {e}")
             return None
 
+    @staticmethod
+    def features_matrix(rows):
+        """
+        Construit la matrice de features pour un lot de dossiers.
+
+        Args:
+            rows: Lignes (montant, duree, salaire, capacite) issues de
+                FEATURE_FIELDS
+
+        Returns:
+            numpy.ndarray de forme (n, 5), memes colonnes que prepare_features
+        """
+        X = np.array(rows, dtype=float).reshape(-1, 4)
+        montant, capacite = X[:, 0], X[:, 3]
+
+        # Ratio d'endettement = montant demande / capacite nette
+        ratio = np.full(len(X), 999.0)
+        np.divide(montant, capacite, out=ratio, where=capacite > 0)
+
+        return np.column_stack([X, ratio])
+
+    def build_feature_frame(self, dossiers_queryset, chunk_size=10000):
+        """
+        Construit la matrice d'entrainement sans instancier les dossiers.
+
+        Les colonnes utiles sont lues avec values_list (une seule requete,
+        jointure sur canevas) par paquets de `chunk_size`, et copiees dans
+        des tableaux NumPy pre-alloues: la memoire reste proportionnelle au
+        nombre de lignes (5 floats + 1 label), sans objets Python par ligne.
+
+        Args:
+            dossiers_queryset: QuerySet de DossierCredit avec statuts finaux
+            chunk_size: Taille des paquets lus depuis le curseur
+
+        Returns:
+            tuple: (X de forme (n, 5), y de forme (n,)); 1 = approuve
+        """
+        dossiers = dossiers_queryset.filter(canevas__isnull=False).order_by()
+        total = dossiers.count()
+
+        raw = np.empty((total, 4), dtype=float)
+        labels = np.empty(total, dtype=np.int8)
+        rows = dossiers.values_list("statut_agent", *self.FEATURE_FIELDS).iterator(
+            chunk_size=chunk_size
+        )
+
+        filled = 0
+        while filled < total:
+            chunk = list(islice(rows, min(chunk_size, total - filled)))
+            if not chunk:
+                break
+            columns = list(zip(*chunk))
+            end = filled + len(chunk)
+            raw[filled:end] = np.array(columns[1:], dtype=float).T
+            labels[filled:end] = np.isin(columns[0], self.APPROVED_STATUSES)
+            filled = end
+
+        return self.features_matrix(raw[:filled]), labels[:filled]
+
     def train(self, dossiers_queryset):
         """
         Entraine le modele sur l'historique des dossiers.
@@ -93,26 +163,7 @@ class CreditScoringModel:
             return None
 
         # Preparer les donnees
-        X = []
-        y = []
-
-        for dossier in dossiers_queryset:
-            if not hasattr(dossier, "canevas"):
-                continue
-
-            features = self.prepare_features(dossier)
-            if features is None:
-                continue
-
-            # Label: 1 = approuve, 0 = refuse
-            label = (
-                1
-                if dossier.statut_agent in ["APPROUVE_ATTENTE_FONDS", "FONDS_LIBERE"]
-                else 0
-            )
-
-            X.append(features)
-            y.append(label)
+        X, y = self.build_feature_frame(dossiers_queryset)
 
         if len(X) < 10:
             logger.warning(
@@ -193,6 +244,44 @@ class CreditScoringModel:
             logger.error(f"Erreur prediction: {e}")
             return None
 
+    def predict_probabilities(self, dossiers_queryset, chunk_size=2000):
+        """
+        Predit la probabilite d'approbation d'un lot de dossiers.
+
+        Les dossiers sont lus par paquets (values_list) et chaque paquet est
+        score par un seul appel predict_proba. Les dossiers sans canevas
+        sont ignores.
+
+        Args:
+            dossiers_queryset: QuerySet de DossierCredit
+            chunk_size: Taille des paquets
+
+        Returns:
+            dict: {dossier_id: probabilite (0-100%)}
+        """
+        if not ML_AVAILABLE or self.model is None:
+            return {}
+
+        rows = (
+            dossiers_queryset.filter(canevas__isnull=False)
+            .order_by("id")
+            .values_list("id", *self.FEATURE_FIELDS)
+            .iterator(chunk_size=chunk_size)
+        )
+
+        probabilities = {}
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            X = self.features_matrix([row[1:] for row in chunk])
+            probas = self.model.predict_proba(X)[:, 1]
+            probabilities.update(
+                (row[0], round(float(p) * 100, 2)) for row, p in zip(chunk, probas)
+            )
+
+        return probabilities
+
     def get_feature_importance(self):
         """Retourne l'importance des features."""
         if self.model is None:
@@ -488,6 +488,14 @@ class JournalAction(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     meta = models.JSONField(default=dict, blank=True)
 
+    class Meta:
+        indexes = [
+            # Perimetre analyste: EXISTS (journal de l'acteur sur le dossier)
+            models.Index(fields=["acteur", "dossier"]),
+            # Derniere action d'un dossier (listings des dashboards)
+            models.Index(fields=["dossier", "-timestamp"]),
+        ]
+
     def __str__(self):
         return f"{self.action} - {self.dossier.reference}"
 
@@ -497,8 +505,17 @@ class Notification(models.Model):
         ("INTERNE", "Interne"),
         ("EMAIL", "Email"),
     ]
+    # Destinataire: un utilisateur (notification personnelle) ou un role
+    # (diffusion: une seule ligne, lecture suivie dans LectureNotification)
     utilisateur_cible = models.ForeignKey(
-        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notifications"
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="notifications",
+        null=True,
+        blank=True,
+    )
+    role_cible = models.CharField(
+        max_length=30, choices=UserRoles.choices, null=True, blank=True
     )
     type = models.CharField(max_length=50)
     titre = models.CharField(max_length=200)
@@ -515,5 +532,112 @@ class Notification(models.Model):
         help_text="Dossier lié à cette notification"
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["role_cible", "created_at"]),
+            # Liste paginee par curseur (created_at, id) d'un utilisateur
+            models.Index(
+                fields=["utilisateur_cible", "-created_at", "-id"],
+                name="notif_user_created_idx",
+            ),
+            # Compteur et marquage des non lues (context processor, dossier)
+            models.Index(
+                fields=["utilisateur_cible", "created_at"],
+                condition=models.Q(lu=False),
+                name="notif_user_non_lues_idx",
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(utilisateur_cible__isnull=False, role_cible__isnull=True)
+                    | models.Q(utilisateur_cible__isnull=True, role_cible__isnull=False)
+                ),
+                name="notification_un_seul_destinataire",
+            )
+        ]
+
+    def __str__(self):
+        return f"Notif {self.type} -> {self.utilisateur_cible or self.role_cible}"
+
+
+class LectureNotification(models.Model):
+    """Marqueur de lecture d'une notification de role par un utilisateur."""
+
+    notification = models.ForeignKey(
+        Notification, on_delete=models.CASCADE, related_name="lectures"
+    )
+    utilisateur = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="lectures_notifications",
+    )
+    lu_le = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["notification", "utilisateur"],
+                name="unique_lecture_notification",
+            )
+        ]
+
+    def __str__(self):
+        return f"Lecture {self.notification_id} par {self.utilisateur_id}"
+
+
+class EmailSortant(models.Model):
+    """
+    Boite d'envoi transactionnelle: l'email est ecrit dans la meme
+    transaction que le changement metier, puis envoye par le worker
+    `envoyer_emails` (retries avec backoff, ECHEC apres epuisement).
+    """
+
+    STATUTS = [
+        ("EN_ATTENTE", "En attente"),
+        ("ENVOYE", "Envoye"),
+        ("ECHEC", "Echec definitif"),
+    ]
+
+    destinataires = models.JSONField(default=list)
+    sujet = models.CharField(max_length=255)
+    corps = models.TextField()
+    corps_html = models.TextField(blank=True)
+    expediteur = models.CharField(max_length=255, blank=True)
+    statut = models.CharField(max_length=20, choices=STATUTS, default="EN_ATTENTE")
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=timezone.now)
+    derniere_erreur = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    envoye_le = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Email sortant"
+        verbose_name_plural = "Emails sortants"
+        indexes = [models.Index(fields=["statut", "prochaine_tentative"])]
+
+    def __str__(self):
+        return f"Email {self.sujet} -> {', '.join(self.destinataires)} ({self.statut})"
+
+
+class CompteurReference(models.Model):
+    """
+    Compteur des references de dossiers (DOS-<annee>-<numero>), une ligne
+    par prefixe et par annee, incrementee par ReferenceService.
+    """
+
+    prefixe = models.CharField(max_length=10)
+    annee = models.PositiveSmallIntegerField()
+    valeur = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Compteur de references"
+        verbose_name_plural = "Compteurs de references"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["prefixe", "annee"], name="unique_compteur_reference"
+            )
+        ]
+
     def __str__(self):
-        return f"Notif {self.type} -> {self.utilisateur_cible}"
+        return f"{self.prefixe}-{self.annee}: {self.valeur}"
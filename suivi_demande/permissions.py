@@ -7,6 +7,7 @@ from __future__ import annotations
 from django.contrib.auth.models import AnonymousUser
 
 from .models import DossierCredit, DossierStatutAgent, UserRoles
+from .services.transition_service import TransitionService
 
 
 def get_user_role(user) -> str:
@@ -40,48 +41,4 @@ def get_transition_flags(dossier: DossierCredit, user) -> dict:
       - can_tx_refuser
       - can_tx_liberer_fonds
     """
-    role = get_user_role(user)
-    statut = dossier.statut_agent
-
-    return {
-        "can_tx_transmettre_analyste": role == UserRoles.GESTIONNAIRE
-        and statut
-        in (
-            DossierStatutAgent.NOUVEAU,
-            DossierStatutAgent.TRANSMIS_RESP_GEST,
-        ),
-        "can_tx_retour_client": role == UserRoles.GESTIONNAIRE
-        and statut
-        in (
-            DossierStatutAgent.NOUVEAU,
-            DossierStatutAgent.TRANSMIS_RESP_GEST,
-        ),
-        "can_tx_transmettre_ggr": role == UserRoles.ANALYSTE
-        and statut
-        in (
-            DossierStatutAgent.TRANSMIS_ANALYSTE,
-            DossierStatutAgent.EN_COURS_ANALYSE,
-        ),
-        "can_tx_retour_gestionnaire": role == UserRoles.ANALYSTE
-        and statut
-        in (
-            DossierStatutAgent.TRANSMIS_ANALYSTE,
-            DossierStatutAgent.EN_COURS_ANALYSE,
-        ),
-        "can_tx_approuver": role == UserRoles.RESPONSABLE_GGR
-        and statut
-        in (
-            DossierStatutAgent.EN_COURS_VALIDATION_GGR,
-            DossierStatutAgent.EN_ATTENTE_DECISION_DG,
-        ),
-        "can_tx_refuser": role == UserRoles.RESPONSABLE_GGR
-        and statut
-        in (
-            DossierStatutAgent.EN_COURS_VALIDATION_GGR,
-            DossierStatutAgent.EN_ATTENTE_DECISION_DG,
-            DossierStatutAgent.TRANSMIS_ANALYSTE,
-            DossierStatutAgent.EN_COURS_ANALYSE,
-        ),
-        "can_tx_liberer_fonds": role == UserRoles.BOE
-        and statut == DossierStatutAgent.APPROUVE_ATTENTE_FONDS,
-    }
+    return TransitionService.get_flags(get_user_role(user), dossier.statut_agent)
@@ -6,10 +6,18 @@ Centralise la logique metier et evite la duplication dans les views.
 from typing import Optional, List, Dict, Any
 from decimal import Decimal
 from django.contrib.auth.models import User
-from django.db.models import QuerySet, Prefetch, Q, Sum
+from django.db.models import (
+    Count,
+    IntegerField,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Sum,
+)
+from django.db.models.functions import Coalesce
 from django.core.paginator import Paginator, Page
-from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 
 from ..models import (
     DossierCredit,
@@ -20,78 +28,117 @@ from ..models import (
     CanevasProposition,
     PieceJointe,
 )
+from core.cache import KPI, get_or_set_locked
+
+from ..constants import CACHE_TIMEOUT_DASHBOARD
 from ..utils import get_user_role
+from .reference_service import ReferenceService
+from .scope_service import ScopeService
 from ..models import UserRoles
 
 
 class DossierService:
     """Service pour la gestion des dossiers de credit."""
 
+    # Colonnes chargees par defaut pour un listing (cartes et tableaux)
+    LIST_FIELDS = (
+        "id",
+        "reference",
+        "produit",
+        "montant",
+        "statut_agent",
+        "statut_client",
+        "date_soumission",
+        "date_maj",
+    )
+
+    # Colonnes chargees pour chaque relation demandee via ``include``
+    RELATED_FIELDS = {
+        "client": (
+            "client__id",
+            "client__username",
+            "client__email",
+            "client__first_name",
+            "client__last_name",
+        ),
+        "acteur_courant": (
+            "acteur_courant__id",
+            "acteur_courant__username",
+            "acteur_courant__first_name",
+            "acteur_courant__last_name",
+        ),
+    }
+
+    # Donnees annexes calculees par sous-requete (une valeur par dossier)
+    ANNOTATIONS = ("last_action", "pieces_count")
+
     @staticmethod
     def get_dossiers_for_user(
         user: User,
         page: int = 1,
         per_page: int = 20,
         filters: Optional[Dict[str, Any]] = None,
+        fields: Optional[List[str]] = None,
+        include: Optional[List[str]] = None,
     ) -> Page:
         """
         Recupere les dossiers accessibles par un utilisateur avec pagination.
-        Optimise avec select_related et prefetch_related.
+
+        L'appelant declare ce qu'il affiche: seules ces colonnes sont chargees
+        (only()) et les donnees annexes sont des sous-requetes annotees. Le
+        cout d'une page ne depend donc plus de la longueur de l'historique
+        (journal, pieces) des dossiers.
 
         Args:
             user: Utilisateur connecte
             page: Numero de page
             per_page: Nombre d'elements par page
             filters: Filtres optionnels (statut, date, etc.)
+            fields: Colonnes du dossier a charger (defaut: LIST_FIELDS)
+            include: Relations ("client", "acteur_courant") et annotations
+                ("last_action" -> derniere_action/derniere_action_le,
+                "pieces_count" -> nb_pieces) a ajouter
 
         Returns:
             Page: Page Django avec les dossiers
         """
-        role = get_user_role(user)
-
-        # Base queryset optimise
-        queryset = DossierCredit.objects.select_related(
-            "client", "client__profile", "acteur_courant", "canevas"
-        ).prefetch_related(
-            Prefetch("pieces", queryset=PieceJointe.objects.order_by("-upload_at")),
-            Prefetch("journal", queryset=JournalAction.objects.order_by("-timestamp")),
+        include = set(include or ())
+        inconnus = include - set(DossierService.RELATED_FIELDS) - set(
+            DossierService.ANNOTATIONS
         )
+        if inconnus:
+            raise ValueError(f"Inclusions inconnues: {', '.join(sorted(inconnus))}")
 
-        # Filtrage par role
-        if role == UserRoles.CLIENT:
-            queryset = queryset.filter(client=user)
-        elif role == UserRoles.GESTIONNAIRE:
-            # Gestionnaire voit tous les dossiers non archives
-            queryset = queryset.filter(is_archived=False)
-        elif role == UserRoles.ANALYSTE:
-            # Analyste voit les dossiers en analyse
-            queryset = queryset.filter(
-                statut_agent__in=[
-                    DossierStatutAgent.TRANSMIS_ANALYSTE,
-                    DossierStatutAgent.EN_COURS_ANALYSE,
-                ]
+        colonnes = list(fields or DossierService.LIST_FIELDS)
+        relations = [r for r in DossierService.RELATED_FIELDS if r in include]
+        for relation in relations:
+            colonnes.append(relation)
+            colonnes.extend(DossierService.RELATED_FIELDS[relation])
+
+        queryset = DossierCredit.objects.select_related(*relations).only(*colonnes)
+
+        if "last_action" in include:
+            dernier = JournalAction.objects.filter(dossier=OuterRef("pk")).order_by(
+                "-timestamp", "-id"
             )
-        elif role == UserRoles.RESPONSABLE_GGR:
-            # Responsable GGR voit les dossiers en validation
-            queryset = queryset.filter(
-                statut_agent__in=[
-                    DossierStatutAgent.EN_COURS_VALIDATION_GGR,
-                    DossierStatutAgent.EN_ATTENTE_DECISION_DG,
-                ]
+            queryset = queryset.annotate(
+                derniere_action=Subquery(dernier.values("action")[:1]),
+                derniere_action_le=Subquery(dernier.values("timestamp")[:1]),
             )
-        elif role == UserRoles.BOE:
-            # BOE voit les dossiers approuves
-            queryset = queryset.filter(
-                statut_agent__in=[
-                    DossierStatutAgent.APPROUVE_ATTENTE_FONDS,
-                ]
+        if "pieces_count" in include:
+            pieces = (
+                PieceJointe.objects.filter(dossier=OuterRef("pk"))
+                .order_by()
+                .values("dossier")
+                .annotate(n=Count("id"))
+                .values("n")
+            )
+            queryset = queryset.annotate(
+                nb_pieces=Coalesce(Subquery(pieces, output_field=IntegerField()), 0)
             )
-        elif role == UserRoles.SUPER_ADMIN:
-            # Super admin voit tout
-            pass
-        else:
-            # Role inconnu: aucun dossier
-            queryset = queryset.none()
+
+        # Filtrage par role
+        queryset = ScopeService.get_queryset(user, "traitement", queryset)
 
         # Appliquer les filtres additionnels
         if filters:
@@ -168,15 +215,10 @@ class DossierService:
         Returns:
             DossierCredit: Nouveau dossier cree
         """
-        # Generer la reference
-        year = timezone.now().year
-        count = DossierCredit.objects.filter(date_soumission__year=year).count() + 1
-        reference = f"DOS-{year}-{count:05d}"
-
-        # Creer le dossier
+        # Creer le dossier (reference attribuee par le compteur de l'annee)
         dossier = DossierCredit.objects.create(
             client=client,
-            reference=reference,
+            reference=ReferenceService.allocate(),
             produit=produit,
             montant=montant,
             statut_agent=DossierStatutAgent.NOUVEAU,
@@ -202,7 +244,9 @@ class DossierService:
         commentaire: Optional[str] = None,
     ) -> bool:
         """
-        Effectue une transition de statut avec validation.
+        Effectue une transition de statut avec validation. Le dossier est
+        relu verrouille: si son statut a change depuis sa lecture (transition
+        concurrente), la transition n'est pas appliquee.
 
         Args:
             dossier: Dossier concerne
@@ -211,41 +255,86 @@ class DossierService:
             commentaire: Commentaire optionnel
 
         Returns:
-            bool: True si transition reussie
+            bool: True si transition reussie, False si le statut a change
         """
         ancien_statut = dossier.statut_agent
 
-        # Mettre e  jour le dossier
-        dossier.statut_agent = nouveau_statut
-        dossier.acteur_courant = acteur
-        dossier.save()
-
-        # Creer l'entree journal
-        JournalAction.objects.create(
-            dossier=dossier,
-            action="TRANSITION",
-            de_statut=ancien_statut,
-            vers_statut=nouveau_statut,
-            acteur=acteur,
-            commentaire_systeme=commentaire
-            or f"Transition {ancien_statut} â†’ {nouveau_statut}",
-        )
+        with transaction.atomic():
+            statut_courant = (
+                DossierCredit.objects.select_for_update()
+                .values_list("statut_agent", flat=True)
+                .get(pk=dossier.pk)
+            )
+            if statut_courant != ancien_statut:
+                return False
+
+            # Mettre e  jour le dossier
+            dossier.statut_agent = nouveau_statut
+            dossier.acteur_courant = acteur
+            dossier.save(update_fields=["statut_agent", "acteur_courant", "date_maj"])
+
+            # Creer l'entree journal
+            JournalAction.objects.create(
+                dossier=dossier,
+                action="TRANSITION",
+                de_statut=ancien_statut,
+                vers_statut=nouveau_statut,
+                acteur=acteur,
+                commentaire_systeme=commentaire
+                or f"Transition {ancien_statut} â†’ {nouveau_statut}",
+            )
 
-        # Creer notification pour le client
-        Notification.objects.create(
-            utilisateur_cible=dossier.client,
-            type="CHANGEMENT_STATUT",
-            titre=f"Dossier {dossier.reference} - Mise e  jour",
-            message=f"Votre dossier est passe au statut: {dossier.get_statut_agent_display()}",
-            canal="INTERNE",
-        )
+            # Creer notification pour le client
+            Notification.objects.create(
+                utilisateur_cible=dossier.client,
+                type="CHANGEMENT_STATUT",
+                titre=f"Dossier {dossier.reference} - Mise e  jour",
+                message=f"Votre dossier est passe au statut: {dossier.get_statut_agent_display()}",
+                canal="INTERNE",
+            )
 
         return True
 
+    @staticmethod
+    def get_status_histogram(
+        user: User, perimetre: str = "statistiques"
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Histogramme des dossiers par statut_agent sur le perimetre de
+        l'utilisateur, en une seule requete GROUP BY. Mis en cache par
+        perimetre (partage entre utilisateurs du meme perimetre).
+
+        Args:
+            user: Utilisateur connecte
+            perimetre: Nom du perimetre (voir ScopeService)
+
+        Returns:
+            Dict: {statut_agent: {"count": int, "montant": Decimal}}
+        """
+        cle = f"stats:histogramme:{ScopeService.get_scope_key(user, perimetre)}"
+
+        def calculer():
+            lignes = (
+                ScopeService.get_queryset(user, perimetre)
+                .order_by()
+                .values("statut_agent")
+                .annotate(count=Count("id"), montant=Sum("montant"))
+            )
+            return {
+                ligne["statut_agent"]: {
+                    "count": ligne["count"],
+                    "montant": ligne["montant"] or Decimal("0"),
+                }
+                for ligne in lignes
+            }
+
+        return get_or_set_locked(KPI, cle, calculer, CACHE_TIMEOUT_DASHBOARD)
+
     @staticmethod
     def get_statistics_for_role(user: User) -> Dict[str, Any]:
         """
         Calcule les statistiques pour un utilisateur selon son role.
+        Les KPI sont derives de l'histogramme par statut (une requete).
 
         Args:
             user: Utilisateur connecte
@@ -253,33 +342,21 @@ class DossierService:
         Returns:
             Dict: Statistiques (total, en_cours, approuves, refuses, etc.)
         """
-        role = get_user_role(user)
-
-        # Base queryset selon le role
-        if role == UserRoles.CLIENT:
-            queryset = DossierCredit.objects.filter(client=user)
-        elif role == UserRoles.GESTIONNAIRE:
-            queryset = DossierCredit.objects.filter(is_archived=False)
-        elif role == UserRoles.SUPER_ADMIN:
-            queryset = DossierCredit.objects.all()
-        else:
-            queryset = DossierCredit.objects.none()
-
-        # Calculer les stats
+        histogramme = DossierService.get_status_histogram(user)
+
+        def compte(*statuts):
+            return sum(histogramme.get(s, {}).get("count", 0) for s in statuts)
+
+        total = sum(ligne["count"] for ligne in histogramme.values())
         stats = {
-            "total": queryset.count(),
-            "en_cours": queryset.exclude(
-                statut_agent__in=[
-                    DossierStatutAgent.FONDS_LIBERE,
-                    DossierStatutAgent.REFUSE,
-                ]
-            ).count(),
-            "approuves": queryset.filter(
-                statut_agent=DossierStatutAgent.APPROUVE_ATTENTE_FONDS
-            ).count(),
-            "refuses": queryset.filter(statut_agent=DossierStatutAgent.REFUSE).count(),
-            "montant_total": queryset.aggregate(total=Sum("montant"))["total"]
-            or Decimal("0"),
+            "total": total,
+            "en_cours": total
+            - compte(DossierStatutAgent.FONDS_LIBERE, DossierStatutAgent.REFUSE),
+            "approuves": compte(DossierStatutAgent.APPROUVE_ATTENTE_FONDS),
+            "refuses": compte(DossierStatutAgent.REFUSE),
+            "montant_total": sum(
+                (ligne["montant"] for ligne in histogramme.values()), Decimal("0")
+            ),
         }
 
         return stats
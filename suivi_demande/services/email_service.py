@@ -0,0 +1,166 @@
+"""
+Service d'envoi des emails applicatifs (boite d'envoi transactionnelle).
+Les vues remettent leurs messages ici au lieu d'appeler send_mail: ils sont
+ecrits dans la table EmailSortant, dans la transaction du changement metier,
+puis envoyes par le worker `envoyer_emails` sur une connexion SMTP reutilisee.
+Sans worker deploye (EMAIL_OUTBOX_WORKER=False), le processus web les envoie
+lui-meme juste apres le commit, comme avant la boite d'envoi.
+"""
+
+import logging
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import EmailSortant
+
+logger = logging.getLogger("suivi_demande")
+
+
+class EmailService:
+    """Service de la boite d'envoi."""
+
+    @staticmethod
+    def enqueue(messages: List[EmailMessage]) -> int:
+        """
+        Ecrit un lot d'emails dans la boite d'envoi (un seul INSERT). Aucun
+        appel SMTP: si la transaction courante est annulee, rien n'est envoye.
+        Sans worker (EMAIL_OUTBOX_WORKER=False), l'envoi de ces emails est
+        declenche apres le commit dans le processus courant.
+
+        Args:
+            messages: Emails a envoyer (EmailMessage ou EmailMultiAlternatives)
+
+        Returns:
+            int: Nombre d'emails mis en file
+        """
+        lignes = []
+        for message in messages:
+            if not message.to:
+                continue
+            html = next(
+                (
+                    contenu
+                    for contenu, mimetype in getattr(message, "alternatives", [])
+                    if mimetype == "text/html"
+                ),
+                "",
+            )
+            lignes.append(
+                EmailSortant(
+                    destinataires=list(message.to),
+                    sujet=message.subject,
+                    corps=message.body,
+                    corps_html=html,
+                    expediteur=message.from_email or "",
+                )
+            )
+        EmailSortant.objects.bulk_create(lignes)
+        if lignes and not settings.EMAIL_OUTBOX_WORKER:
+            ids = [ligne.pk for ligne in lignes]
+            transaction.on_commit(lambda: EmailService.process_pending(ids=ids))
+        return len(lignes)
+
+    @staticmethod
+    def process_pending(
+        batch_size: int = None, ids: Optional[List[int]] = None
+    ) -> Tuple[int, int]:
+        """
+        Envoie un lot d'emails echus sur une seule connexion SMTP.
+        Les lignes sont verrouillees (SKIP LOCKED) pour que plusieurs workers
+        ne traitent jamais le meme email. Un echec replanifie l'email avec un
+        backoff exponentiel; apres EMAIL_OUTBOX_MAX_TENTATIVES il passe en
+        ECHEC (dead letter) et est journalise en erreur.
+
+        Args:
+            batch_size: Taille du lot (defaut: settings.EMAIL_OUTBOX_LOT)
+            ids: Envoi apres commit sans worker: ces emails, plus les nouvelles
+                tentatives echues (sinon jamais reprises)
+
+        Returns:
+            tuple: (emails envoyes, echecs)
+        """
+        batch_size = batch_size or settings.EMAIL_OUTBOX_LOT
+        filtre = Q(prochaine_tentative__lte=timezone.now())
+        if ids is not None:
+            filtre = Q(pk__in=ids) | (filtre & Q(tentatives__gt=0))
+            batch_size += len(ids)
+        with transaction.atomic():
+            lot = list(
+                EmailSortant.objects.select_for_update(skip_locked=True)
+                .filter(filtre, statut="EN_ATTENTE")
+                .order_by("prochaine_tentative", "id")[:batch_size]
+            )
+            if not lot:
+                return 0, 0
+
+            envoyes = echecs = 0
+            connexion = get_connection(fail_silently=False)
+            try:
+                connexion.open()
+            except Exception as exc:
+                for email in lot:
+                    EmailService._echec(email, exc)
+                echecs = len(lot)
+            else:
+                try:
+                    for email in lot:
+                        try:
+                            connexion.send_messages([EmailService._message(email)])
+                        except Exception as exc:
+                            EmailService._echec(email, exc)
+                            echecs += 1
+                        else:
+                            email.statut = "ENVOYE"
+                            email.envoye_le = timezone.now()
+                            email.tentatives += 1
+                            envoyes += 1
+                finally:
+                    connexion.close()
+
+            EmailSortant.objects.bulk_update(
+                lot,
+                [
+                    "statut",
+                    "tentatives",
+                    "prochaine_tentative",
+                    "derniere_erreur",
+                    "envoye_le",
+                ],
+            )
+        return envoyes, echecs
+
+    @staticmethod
+    def _message(email: EmailSortant) -> EmailMultiAlternatives:
+        message = EmailMultiAlternatives(
+            subject=email.sujet,
+            body=email.corps,
+            from_email=email.expediteur or settings.DEFAULT_FROM_EMAIL,
+            to=email.destinataires,
+        )
+        if email.corps_html:
+            message.attach_alternative(email.corps_html, "text/html")
+        return message
+
+    @staticmethod
+    def _echec(email: EmailSortant, exc: Exception) -> None:
+        email.tentatives += 1
+        email.derniere_erreur = f"{type(exc).__name__}: {exc}"
+        if email.tentatives >= settings.EMAIL_OUTBOX_MAX_TENTATIVES:
+            email.statut = "ECHEC"
+            logger.error(
+                f"Email {email.pk} abandonne apres {email.tentatives} tentatives: "
+                f"{email.derniere_erreur}"
+            )
+        else:
+            delai = settings.EMAIL_OUTBOX_BACKOFF * 2 ** (email.tentatives - 1)
+            email.prochaine_tentative = timezone.now() + timedelta(seconds=delai)
+            logger.warning(
+                f"Email {email.pk} en echec (tentative {email.tentatives}), "
+                f"nouvel essai dans {delai}s"
+            )
@@ -0,0 +1,135 @@
+"""
+Service de calcul des delais de traitement (lead time) pour les rapports.
+Tous les calculs sont faits en base (Avg sur des durees, sous-requetes sur le
+journal): le nombre de requetes ne depend pas de la taille du portefeuille.
+"""
+
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.contrib.auth.models import User
+from django.db.models import (
+    Avg,
+    Count,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+)
+
+from ..models import DossierStatutAgent, JournalAction
+
+STATUTS_FINAUX = [
+    DossierStatutAgent.APPROUVE_ATTENTE_FONDS,
+    DossierStatutAgent.FONDS_LIBERE,
+    DossierStatutAgent.REFUSE,
+]
+
+
+def _duree(fin: str, debut: str) -> ExpressionWrapper:
+    return ExpressionWrapper(F(fin) - F(debut), output_field=DurationField())
+
+
+def _en_jours(duree: Optional[timedelta], decimales: int = 2) -> float:
+    return round(duree.total_seconds() / 86400, decimales) if duree else 0.0
+
+
+class LeadTimeService:
+    """Service pour les delais de traitement des dossiers."""
+
+    @staticmethod
+    def first_final_transition() -> Subquery:
+        """
+        Sous-requete: horodatage de la premiere transition vers un statut final
+        (a utiliser dans annotate sur un queryset de DossierCredit).
+        """
+        return Subquery(
+            JournalAction.objects.filter(
+                dossier=OuterRef("pk"), vers_statut__in=STATUTS_FINAUX
+            )
+            .order_by("timestamp")
+            .values("timestamp")[:1]
+        )
+
+    @staticmethod
+    def average_days_to_final(queryset: QuerySet) -> float:
+        """
+        Delai moyen (jours) entre la soumission et le premier statut final.
+
+        Args:
+            queryset: QuerySet de DossierCredit (perimetre du rapport)
+
+        Returns:
+            float: Moyenne en jours (0.0 si aucun dossier finalise)
+        """
+        resultat = (
+            queryset.order_by()
+            .annotate(date_finale=LeadTimeService.first_final_transition())
+            .filter(date_finale__gt=F("date_soumission"))
+            .aggregate(delai=Avg(_duree("date_finale", "date_soumission")))
+        )
+        return _en_jours(resultat["delai"])
+
+    @staticmethod
+    def average_days_by_actor(queryset: QuerySet, limit: int = 10) -> List[Dict]:
+        """
+        Delai moyen (date_maj - soumission) des dossiers finalises, par acteur
+        courant. Les acteurs sont classes par nombre total de dossiers.
+
+        Args:
+            queryset: QuerySet de DossierCredit
+            limit: Nombre maximum d'acteurs retournes
+
+        Returns:
+            list: [{"manager": username, "avg_days": float}, ...]
+        """
+        lignes = (
+            queryset.exclude(acteur_courant__isnull=True)
+            .order_by()
+            .values("acteur_courant__username")
+            .annotate(
+                nb=Count("id"),
+                delai=Avg(
+                    _duree("date_maj", "date_soumission"),
+                    filter=Q(statut_agent__in=STATUTS_FINAUX),
+                ),
+            )
+            .order_by("-nb")[:limit]
+        )
+        return [
+            {
+                "manager": ligne["acteur_courant__username"],
+                "avg_days": _en_jours(ligne["delai"], 1),
+            }
+            for ligne in lignes
+            if ligne["delai"] is not None
+        ]
+
+    @staticmethod
+    def average_days_since_first_action(queryset: QuerySet, acteur: User) -> float:
+        """
+        Delai moyen (jours) entre la premiere action de `acteur` sur chaque
+        dossier et sa derniere mise a jour (delais negatifs exclus).
+
+        Args:
+            queryset: QuerySet de DossierCredit
+            acteur: Utilisateur dont on mesure le delai (ex: analyste)
+
+        Returns:
+            float: Moyenne en jours (0.0 si aucune action)
+        """
+        premiere_action = Subquery(
+            JournalAction.objects.filter(dossier=OuterRef("pk"), acteur=acteur)
+            .order_by("timestamp")
+            .values("timestamp")[:1]
+        )
+        resultat = (
+            queryset.order_by()
+            .annotate(premiere_action=premiere_action)
+            .filter(date_maj__gte=F("premiere_action"))
+            .aggregate(delai=Avg(_duree("date_maj", "premiere_action")))
+        )
+        return _en_jours(resultat["delai"])
@@ -0,0 +1,660 @@
+"""
+Service des notifications internes.
+Une notification est personnelle (utilisateur_cible) ou diffusee a un role
+(role_cible, une seule ligne; lecture suivie par LectureNotification).
+Compteur de non lues et dernieres notifications par utilisateur, maintenus
+en cache a la creation et a la lecture (lus par le context processor).
+"""
+
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    QuerySet,
+    When,
+)
+
+from core import evenements
+
+from ..constants import CACHE_TIMEOUT_NOTIFICATIONS, NOTIFICATIONS_PER_PAGE
+from ..models import LectureNotification, Notification
+from .email_service import EmailService
+from .scope_service import ScopeService
+
+User = get_user_model()
+
+# Nombre de notifications exposees par le context processor
+LATEST_LIMIT = 5
+
+# Type des notifications de resume creees par la purge
+DIGEST_TYPE = "RESUME"
+
+# Origine des curseurs de pagination
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# Bornes d'un curseur lisible (datetime.max, cle primaire BIGINT)
+CURSOR_MAX_MICROSECONDES = (
+    datetime.max.replace(tzinfo=dt_timezone.utc) - EPOCH
+) // timedelta(microseconds=1)
+CURSOR_MAX_PK = 2**63 - 1
+
+
+class NotificationService:
+    """Service pour les compteurs et listes de notifications."""
+
+    @staticmethod
+    def fan_out(
+        role: str,
+        titre: str,
+        message: str,
+        type: str = "NOUVEAU_MESSAGE",
+        dossier=None,
+        email_subject: Optional[str] = None,
+        broadcast: Optional[bool] = None,
+    ) -> int:
+        """
+        Notifie tous les utilisateurs actifs d'un role. En diffusion (defaut:
+        settings.NOTIFICATIONS_DIFFUSION_ROLE) une seule ligne adressee au role
+        est ecrite; sinon une ligne par destinataire en un bulk_create. Les
+        emails sont remis en un lot a EmailService. Le cout ne depend pas de
+        la taille de l'equipe.
+
+        Args:
+            role: Role destinataire (UserRoles)
+            titre: Titre de la notification
+            message: Corps de la notification (et de l'email)
+            type: Type de notification
+            dossier: Dossier concerne (optionnel)
+            email_subject: Sujet de l'email; None pour ne pas envoyer d'email
+            broadcast: Forcer (ou non) la diffusion au role
+
+        Returns:
+            int: Nombre de notifications creees
+        """
+        notifications, emails = NotificationService.prepare_for_role(
+            role,
+            [
+                {
+                    "titre": titre,
+                    "message": message,
+                    "dossier": dossier,
+                    "email_subject": email_subject,
+                }
+            ],
+            type=type,
+            broadcast=broadcast,
+        )
+        NotificationService.create_many(notifications)
+        EmailService.enqueue(emails)
+        return len(notifications)
+
+    @staticmethod
+    def prepare_for_role(
+        role: str,
+        contenus: List[Dict],
+        type: str = "NOUVEAU_MESSAGE",
+        broadcast: Optional[bool] = None,
+    ) -> Tuple[List[Notification], List[EmailMessage]]:
+        """
+        Prepare (sans les ecrire) les notifications et emails de plusieurs
+        contenus adresses a un role: au plus une lecture des destinataires,
+        quel que soit le nombre de contenus. A ecrire avec create_many et
+        EmailService.enqueue.
+
+        Args:
+            role: Role destinataire (UserRoles)
+            contenus: Dicts titre, message, dossier et email_subject (None
+                pour ne pas envoyer d'email)
+            type: Type de notification
+            broadcast: Forcer (ou non) la diffusion au role
+
+        Returns:
+            tuple: (notifications non enregistrees, emails)
+        """
+        if broadcast is None:
+            broadcast = settings.NOTIFICATIONS_DIFFUSION_ROLE
+        avec_email = any(contenu.get("email_subject") for contenu in contenus)
+        destinataires = User.objects.filter(profile__role=role, is_active=True)
+
+        if broadcast:
+            notifications = [
+                Notification(
+                    role_cible=role,
+                    type=type,
+                    titre=contenu["titre"],
+                    message=contenu["message"],
+                    canal="INTERNE",
+                    dossier=contenu.get("dossier"),
+                )
+                for contenu in contenus
+            ]
+            adresses = (
+                list(destinataires.exclude(email="").values_list("email", flat=True))
+                if avec_email
+                else []
+            )
+        else:
+            lignes = list(destinataires.values_list("id", "email"))
+            notifications = [
+                Notification(
+                    utilisateur_cible_id=user_id,
+                    type=type,
+                    titre=contenu["titre"],
+                    message=contenu["message"],
+                    canal="INTERNE",
+                    dossier=contenu.get("dossier"),
+                )
+                for contenu in contenus
+                for user_id, _ in lignes
+            ]
+            adresses = [email for _, email in lignes if email]
+
+        emails = [
+            EmailMessage(
+                subject=contenu["email_subject"],
+                body=contenu["message"],
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email],
+            )
+            for contenu in contenus
+            if contenu.get("email_subject")
+            for email in adresses
+        ]
+        return notifications, emails
+
+    @staticmethod
+    def create_many(notifications: List[Notification]) -> None:
+        """
+        Enregistre des notifications en un seul INSERT. bulk_create n'emet
+        pas post_save: caches et flux temps reel sont mis a jour ici, apres
+        commit, comme le ferait le signal.
+        """
+        if not notifications:
+            return
+        Notification.objects.bulk_create(notifications)
+        non_lues = [
+            notification for notification in notifications if not notification.lu
+        ]
+        user_ids = [
+            notification.utilisateur_cible_id
+            for notification in non_lues
+            if not notification.role_cible
+        ]
+        roles = {
+            notification.role_cible
+            for notification in non_lues
+            if notification.role_cible
+        }
+        if user_ids:
+            transaction.on_commit(lambda: NotificationService.on_created(user_ids))
+        for role in roles:
+            transaction.on_commit(
+                lambda role=role: NotificationService.on_broadcast(role)
+            )
+        transaction.on_commit(lambda: NotificationService.publish(non_lues))
+
+    @staticmethod
+    def visible(user: User) -> QuerySet:
+        """
+        Notifications personnelles et diffusions du role de l'utilisateur,
+        plus recentes d'abord, annotees `est_lu` (lu ou marqueur de lecture).
+
+        Args:
+            user: Utilisateur connecte
+
+        Returns:
+            QuerySet: Notifications visibles
+        """
+        marqueur = LectureNotification.objects.filter(
+            notification=OuterRef("pk"), utilisateur=user
+        )
+        return (
+            Notification.objects.filter(NotificationService._visible_q(user))
+            .annotate(
+                est_lu=Case(
+                    When(role_cible__isnull=True, then=F("lu")),
+                    default=Exists(marqueur),
+                    output_field=BooleanField(),
+                )
+            )
+            .order_by("-created_at", "-id")
+        )
+
+    @staticmethod
+    def page(
+        user: User,
+        cursor: Optional[str] = None,
+        per_page: int = NOTIFICATIONS_PER_PAGE,
+    ) -> Tuple[List[Notification], Optional[str]]:
+        """
+        Page de notifications par curseur (keyset) sur (created_at, id): le
+        cout ne depend pas de la profondeur de la page, contrairement a OFFSET.
+
+        Args:
+            user: Utilisateur connecte
+            cursor: Curseur renvoye par la page precedente (None: premiere page)
+            per_page: Nombre de notifications par page
+
+        Returns:
+            tuple: (notifications, curseur de la page suivante ou None)
+
+        Raises:
+            ValueError: Curseur invalide
+        """
+        queryset = NotificationService.visible(user)
+        if cursor:
+            created_at, pk = NotificationService._decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+        notifications = list(queryset[: per_page + 1])
+        suivant = None
+        if len(notifications) > per_page:
+            notifications = notifications[:per_page]
+            suivant = NotificationService._encode_cursor(notifications[-1])
+        return notifications, suivant
+
+    @staticmethod
+    def with_read_state(notifications: Iterable[Notification]) -> List[Notification]:
+        """Reporte `est_lu` sur `lu` pour les templates (diffusions incluses)."""
+        notifications = list(notifications)
+        for notification in notifications:
+            notification.lu = notification.est_lu
+        return notifications
+
+    @staticmethod
+    def unread_count(user: User) -> int:
+        """
+        Nombre de notifications non lues, personnelles et diffusions (cache;
+        une requete sur cache miss).
+
+        Args:
+            user: Utilisateur connecte
+
+        Returns:
+            int: Nombre de non lues
+        """
+        role, version = NotificationService._role_version(user)
+        cle_perso = NotificationService._count_key(user.pk)
+        cle_diffusion = NotificationService._broadcast_count_key(user.pk)
+        perso = cache.get(cle_perso)
+        diffusion = cache.get(cle_diffusion)
+        if perso is None or diffusion is None or diffusion[:2] != (role, version):
+            compteurs = Notification.objects.filter(
+                NotificationService._unread_q(user)
+            ).aggregate(
+                perso=Count("id", filter=Q(role_cible__isnull=True)),
+                diffusion=Count("id", filter=Q(role_cible__isnull=False)),
+            )
+            perso = compteurs["perso"]
+            diffusion = (role, version, compteurs["diffusion"])
+            cache.set(cle_perso, perso, CACHE_TIMEOUT_NOTIFICATIONS)
+            cache.set(cle_diffusion, diffusion, CACHE_TIMEOUT_NOTIFICATIONS)
+        return perso + diffusion[2]
+
+    @staticmethod
+    def latest(user: User) -> List[Notification]:
+        """
+        Dernieres notifications de l'utilisateur (cache).
+
+        Args:
+            user: Utilisateur connecte
+
+        Returns:
+            list: Au plus LATEST_LIMIT notifications, plus recentes d'abord
+        """
+        role, version = NotificationService._role_version(user)
+        cle = NotificationService._latest_key(user.pk)
+        entree = cache.get(cle)
+        if entree is None or entree[:2] != (role, version):
+            latest = NotificationService.with_read_state(
+                NotificationService.visible(user)[:LATEST_LIMIT]
+            )
+            entree = (role, version, latest)
+            cache.set(cle, entree, CACHE_TIMEOUT_NOTIFICATIONS)
+        return entree[2]
+
+    @staticmethod
+    def mark_read(user: User, notification: Notification) -> None:
+        """
+        Marque une notification visible comme lue par l'utilisateur.
+
+        Args:
+            user: Utilisateur connecte
+            notification: Notification (personnelle ou diffusion)
+        """
+        if notification.role_cible:
+            _, cree = LectureNotification.objects.get_or_create(
+                notification=notification, utilisateur=user
+            )
+            if cree:
+                NotificationService.invalidate(user.pk)
+        elif not notification.lu:
+            notification.lu = True
+            notification.save(update_fields=["lu"])
+            NotificationService.on_read(user.pk)
+
+    @staticmethod
+    def mark_all_read(user: User, dossier=None) -> None:
+        """
+        Marque comme lues toutes les notifications non lues de l'utilisateur
+        (ou seulement celles liees a `dossier`).
+
+        Args:
+            user: Utilisateur connecte
+            dossier: Dossier (optionnel) auquel limiter le marquage
+        """
+        perso = Notification.objects.filter(utilisateur_cible=user, lu=False)
+        diffusions = Notification.objects.filter(
+            NotificationService._unread_q(user), role_cible__isnull=False
+        )
+        if dossier is not None:
+            perso = perso.filter(
+                Q(dossier=dossier)
+                | Q(titre__icontains=dossier.reference)
+                | Q(message__icontains=dossier.reference)
+            )
+            diffusions = diffusions.filter(dossier=dossier)
+
+        marques = perso.update(lu=True)
+        nouvelles = LectureNotification.objects.bulk_create(
+            [
+                LectureNotification(notification_id=pk, utilisateur=user)
+                for pk in diffusions.values_list("pk", flat=True)
+            ],
+            ignore_conflicts=True,
+        )
+        if marques or nouvelles:
+            NotificationService.invalidate(user.pk)
+
+    @staticmethod
+    def on_created(user_ids: Iterable[int]) -> None:
+        """
+        Met a jour les caches apres creation de notifications personnelles non
+        lues (une par destinataire). Un compteur absent sera recalcule.
+        """
+        user_ids = list(user_ids)
+        for user_id in user_ids:
+            try:
+                cache.incr(NotificationService._count_key(user_id))
+            except ValueError:
+                pass
+        cache.delete_many(
+            [NotificationService._latest_key(user_id) for user_id in user_ids]
+        )
+
+    @staticmethod
+    def on_broadcast(role: str) -> None:
+        """
+        Nouvelle diffusion: change la version du role, ce qui perime les
+        caches de tous ses membres sans les enumerer.
+        """
+        cache.set(NotificationService._role_version_key(role), time.time_ns(), None)
+
+    @staticmethod
+    def publish(notifications: Iterable[Notification]) -> None:
+        """
+        Pousse les notifications creees aux flux temps reel de leurs
+        destinataires (utilisateur ou role). A appeler apres commit.
+        """
+        for notification in notifications:
+            if notification.role_cible:
+                canal = evenements.canal_role(notification.role_cible)
+            else:
+                canal = evenements.canal_utilisateur(notification.utilisateur_cible_id)
+            evenements.publish(
+                canal,
+                "notification",
+                {
+                    "id": notification.pk,
+                    "type": notification.type,
+                    "titre": notification.titre,
+                    "message": notification.message,
+                    "dossier": notification.dossier_id,
+                },
+            )
+
+    @staticmethod
+    def on_read(user_id: int, count: int = 1) -> None:
+        """
+        Met a jour les caches apres lecture de `count` notifications
+        personnelles.
+        """
+        cle = NotificationService._count_key(user_id)
+        try:
+            if cache.decr(cle, count) < 0:
+                cache.delete(cle)
+        except ValueError:
+            pass
+        cache.delete(NotificationService._latest_key(user_id))
+
+    @staticmethod
+    def invalidate(user_id: int) -> None:
+        """Invalide les caches de notifications d'un utilisateur."""
+        cache.delete_many(
+            [
+                NotificationService._count_key(user_id),
+                NotificationService._broadcast_count_key(user_id),
+                NotificationService._latest_key(user_id),
+            ]
+        )
+
+    @staticmethod
+    def purge(
+        retention_days: Optional[int] = None,
+        digest_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """
+        Retention des notifications, par lots bornes (une transaction courte
+        par lot) pour garder les index de la liste et du compteur petits:
+        - notifications lues (et resumes) plus vieilles que `retention_days`
+          supprimees;
+        - diffusions de role plus vieilles que `retention_days` supprimees
+          avec leurs marqueurs de lecture;
+        - notifications personnelles non lues plus vieilles que `digest_days`
+          regroupees en un resume par utilisateur. Le resume est cree et mis a
+          jour dans la transaction de chaque lot: une interruption ne perd
+          jamais de notification sans resume.
+        Les caches des utilisateurs et roles touches sont invalides.
+
+        Args:
+            retention_days: Age des notifications lues a supprimer
+                (defaut: settings.NOTIFICATIONS_RETENTION_JOURS)
+            digest_days: Age des non lues a regrouper
+                (defaut: settings.NOTIFICATIONS_RESUME_JOURS)
+            batch_size: Lignes supprimees par lot
+                (defaut: settings.NOTIFICATIONS_PURGE_LOT)
+
+        Returns:
+            dict: Bilan (lues, diffusions, lectures, regroupees, resumes)
+        """
+        retention_days = retention_days or settings.NOTIFICATIONS_RETENTION_JOURS
+        digest_days = digest_days or settings.NOTIFICATIONS_RESUME_JOURS
+        batch_size = batch_size or settings.NOTIFICATIONS_PURGE_LOT
+        maintenant = timezone.now()
+        limite_retention = maintenant - timedelta(days=retention_days)
+        limite_resume = maintenant - timedelta(days=digest_days)
+
+        bilan = {
+            "lues": 0,
+            "diffusions": 0,
+            "lectures": 0,
+            "regroupees": 0,
+            "resumes": 0,
+        }
+        personnelles = Notification.objects.filter(utilisateur_cible__isnull=False)
+        user_ids_touches = set()
+        roles_touches = set()
+
+        bilan["lues"] = NotificationService._delete_in_batches(
+            personnelles.filter(
+                Q(lu=True) | Q(type=DIGEST_TYPE),
+                created_at__lt=limite_retention,
+            ),
+            batch_size,
+            "utilisateur_cible_id",
+            user_ids_touches,
+        )[0]
+        # Les marqueurs de lecture partent en cascade avec leur diffusion
+        diffusions = Notification.objects.filter(
+            role_cible__isnull=False, created_at__lt=limite_retention
+        )
+        bilan["diffusions"], bilan["lectures"] = NotificationService._delete_in_batches(
+            diffusions, batch_size, "role_cible", roles_touches
+        )
+
+        anciennes = personnelles.filter(lu=False, created_at__lt=limite_resume).exclude(
+            type=DIGEST_TYPE
+        )
+        user_ids = (
+            anciennes.values_list("utilisateur_cible", flat=True).order_by().distinct()
+        )
+        for user_id in list(user_ids):
+            resume = None
+            regroupees = 0
+            while True:
+                ids = list(
+                    anciennes.filter(utilisateur_cible_id=user_id).values_list(
+                        "pk", flat=True
+                    )[:batch_size]
+                )
+                if not ids:
+                    break
+                with transaction.atomic():
+                    regroupees += Notification.objects.filter(pk__in=ids).delete()[0]
+                    message = NotificationService._digest_message(
+                        regroupees, digest_days
+                    )
+                    if resume is None:
+                        resume = Notification.objects.create(
+                            utilisateur_cible_id=user_id,
+                            type=DIGEST_TYPE,
+                            titre="Notifications archivees",
+                            message=message,
+                            canal="INTERNE",
+                        )
+                    else:
+                        Notification.objects.filter(pk=resume.pk).update(
+                            message=message
+                        )
+            if resume is None:
+                continue
+            user_ids_touches.add(user_id)
+            bilan["regroupees"] += regroupees
+            bilan["resumes"] += 1
+
+        for user_id in user_ids_touches:
+            NotificationService.invalidate(user_id)
+        for role in roles_touches:
+            NotificationService.on_broadcast(role)
+        return bilan
+
+    @staticmethod
+    def _digest_message(regroupees: int, digest_days: int) -> str:
+        return (
+            f"{regroupees} notification(s) non lue(s) de plus de "
+            f"{digest_days} jours ont ete archivees. Consultez vos "
+            "dossiers pour leur etat actuel."
+        )
+
+    @staticmethod
+    def _delete_in_batches(
+        queryset: QuerySet, batch_size: int, champ: str, cibles: set
+    ) -> Tuple[int, int]:
+        """
+        Supprime par lots de cles primaires; retourne (notifications, lectures).
+        Les valeurs de `champ` (destinataire ou role) des lignes supprimees
+        sont ajoutees a `cibles`, pour l'invalidation des caches.
+        """
+        notifications = lectures = 0
+        while True:
+            lignes = list(queryset.values_list("pk", champ)[:batch_size])
+            if not lignes:
+                return notifications, lectures
+            ids = [pk for pk, _ in lignes]
+            cibles.update(cible for _, cible in lignes)
+            with transaction.atomic():
+                _, detail = Notification.objects.filter(pk__in=ids).delete()
+            notifications += detail.get(Notification._meta.label, 0)
+            lectures += detail.get(LectureNotification._meta.label, 0)
+
+    @staticmethod
+    def _encode_cursor(notification: Notification) -> str:
+        # Microsecondes depuis l'epoque: exact, sans caractere a echapper
+        microsecondes = (notification.created_at - EPOCH) // timedelta(microseconds=1)
+        return f"{microsecondes}-{notification.pk}"
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        # ValueError pour tout curseur illisible ou hors bornes (datetime, BIGINT)
+        microsecondes, pk = (int(partie) for partie in cursor.split("-"))
+        if not (
+            0 <= microsecondes <= CURSOR_MAX_MICROSECONDES and 0 < pk <= CURSOR_MAX_PK
+        ):
+            raise ValueError(f"Curseur hors bornes: {cursor}")
+        try:
+            return EPOCH + timedelta(microseconds=microsecondes), pk
+        except OverflowError as exc:
+            raise ValueError(f"Curseur hors bornes: {cursor}") from exc
+
+    @staticmethod
+    def _visible_q(user: User) -> Q:
+        q = Q(utilisateur_cible=user)
+        role = ScopeService.get_descriptor(user)["role"]
+        if role:
+            # Les diffusions anterieures a l'arrivee de l'utilisateur sont ignorees
+            q |= Q(role_cible=role, created_at__gte=user.date_joined)
+        return q
+
+    @staticmethod
+    def _unread_q(user: User) -> Q:
+        q = Q(utilisateur_cible=user, lu=False)
+        role = ScopeService.get_descriptor(user)["role"]
+        if role:
+            lue = LectureNotification.objects.filter(
+                notification=OuterRef("pk"), utilisateur=user
+            )
+            q |= Q(role_cible=role, created_at__gte=user.date_joined) & ~Exists(lue)
+        return q
+
+    @staticmethod
+    def _role_version(user: User):
+        role = ScopeService.get_descriptor(user)["role"]
+        if not role:
+            return None, 0
+        cle = NotificationService._role_version_key(role)
+        version = cache.get(cle)
+        if version is None:
+            cache.add(cle, time.time_ns(), None)
+            version = cache.get(cle)
+        return role, version
+
+    @staticmethod
+    def _count_key(user_id: int) -> str:
+        return f"notifications:non_lues:{user_id}"
+
+    @staticmethod
+    def _broadcast_count_key(user_id: int) -> str:
+        return f"notifications:diffusions_non_lues:{user_id}"
+
+    @staticmethod
+    def _latest_key(user_id: int) -> str:
+        return f"notifications:dernieres:{user_id}"
+
+    @staticmethod
+    def _role_version_key(role: str) -> str:
+        return f"notifications:version_role:{role}"
@@ -0,0 +1,97 @@
+"""
+Service d'attribution des references de dossiers (DOS-<annee>-<numero>).
+Une ligne CompteurReference par prefixe et par annee, incrementee par un
+UPDATE atomique: le verrou de ligne est tenu jusqu'au commit, donc deux
+creations concurrentes n'obtiennent jamais le meme numero, et aucune
+requete ne depend du nombre de dossiers deja crees.
+"""
+
+import re
+from typing import List, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import CompteurReference, DossierCredit
+
+# Prefixe des references de dossiers de credit
+PREFIXE_DOSSIER = "DOS"
+
+
+class ReferenceService:
+    """Service d'attribution des references."""
+
+    @staticmethod
+    def allocate(prefix: str = PREFIXE_DOSSIER, year: Optional[int] = None) -> str:
+        """
+        Attribue la prochaine reference de l'annee.
+
+        Args:
+            prefix: Prefixe de la reference
+            year: Annee (defaut: annee courante)
+
+        Returns:
+            str: Reference (ex: DOS-2025-00042)
+        """
+        return ReferenceService.allocate_many(1, prefix, year)[0]
+
+    @staticmethod
+    def allocate_many(
+        count: int, prefix: str = PREFIXE_DOSSIER, year: Optional[int] = None
+    ) -> List[str]:
+        """
+        Reserve `count` references consecutives en un seul increment du
+        compteur (imports de dossiers en masse).
+
+        Args:
+            count: Nombre de references a reserver
+            prefix: Prefixe des references
+            year: Annee (defaut: annee courante)
+
+        Returns:
+            list: References dans l'ordre croissant
+
+        Raises:
+            ValueError: count inferieur a 1
+        """
+        if count < 1:
+            raise ValueError(f"Nombre de references invalide: {count}")
+        year = year or timezone.now().year
+        compteur = CompteurReference.objects.filter(prefixe=prefix, annee=year)
+        with transaction.atomic():
+            if not compteur.update(valeur=F("valeur") + count):
+                ReferenceService._create_counter(prefix, year)
+                compteur.update(valeur=F("valeur") + count)
+            fin = compteur.values_list("valeur", flat=True).get()
+        return [
+            ReferenceService.format(prefix, year, numero)
+            for numero in range(fin - count + 1, fin + 1)
+        ]
+
+    @staticmethod
+    def format(prefix: str, year: int, number: int) -> str:
+        """Formate une reference a partir de son numero dans l'annee."""
+        return f"{prefix}-{year}-{number:05d}"
+
+    @staticmethod
+    def _create_counter(prefix: str, year: int) -> None:
+        # Premier numero de l'annee: reprendre apres les references existantes
+        # (attribuees avant le compteur). Lecture unique par annee.
+        motif = re.compile(rf"^{re.escape(prefix)}-{year}-(\d+)$")
+        references = DossierCredit.objects.filter(
+            reference__startswith=f"{prefix}-{year}-"
+        ).values_list("reference", flat=True)
+        numeros = [
+            int(trouve.group(1))
+            for reference in references.iterator()
+            if (trouve := motif.match(reference))
+        ]
+        try:
+            # Savepoint: une creation concurrente du compteur peut l'emporter
+            with transaction.atomic():
+                CompteurReference.objects.create(
+                    prefixe=prefix, annee=year, valeur=max(numeros, default=0)
+                )
+        except IntegrityError:
+            pass
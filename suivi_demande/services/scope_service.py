@@ -0,0 +1,196 @@
+"""
+Service de perimetre (scope) des dossiers par role.
+Point unique de definition des regles de visibilite: dashboards, listes,
+rapports et exports construisent tous leurs querysets ici.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q, QuerySet
+
+from ..constants import CACHE_TIMEOUT_SCOPE
+from ..models import DossierCredit, DossierStatutAgent, JournalAction, UserRoles
+from ..utils import get_user_role
+
+S = DossierStatutAgent
+
+# Regles par perimetre puis par role. Une regle peut contenir:
+#   "aucun": aucun dossier
+#   "client": dossiers dont l'utilisateur est le client
+#   "historique": dossiers que l'utilisateur a traites (journal) ou detient
+#   "statuts": liste de statut_agent autorises
+#   "archives": False pour exclure les dossiers archives
+# La cle None est la regle par defaut du perimetre.
+PERIMETRES: Dict[str, Dict[Optional[str], Dict[str, Any]]] = {
+    # Files de travail: dashboards, DossierService, rapport imprimable
+    "traitement": {
+        UserRoles.CLIENT: {"client": True},
+        UserRoles.GESTIONNAIRE: {"archives": False},
+        UserRoles.ANALYSTE: {"statuts": [S.TRANSMIS_ANALYSTE, S.EN_COURS_ANALYSE]},
+        UserRoles.RESPONSABLE_GGR: {
+            "statuts": [S.EN_COURS_VALIDATION_GGR, S.EN_ATTENTE_DECISION_DG]
+        },
+        UserRoles.BOE: {"statuts": [S.APPROUVE_ATTENTE_FONDS]},
+        UserRoles.SUPER_ADMIN: {},
+        None: {"aucun": True},
+    },
+    # Compteurs des dashboards (DossierService.get_statistics_for_role)
+    "statistiques": {
+        UserRoles.CLIENT: {"client": True},
+        UserRoles.GESTIONNAIRE: {"archives": False},
+        UserRoles.SUPER_ADMIN: {},
+        None: {"aucun": True},
+    },
+    # Dossiers a prendre en charge (liste "Tous les dossiers" du portail pro)
+    "file": {
+        UserRoles.CLIENT: {"client": True},
+        UserRoles.GESTIONNAIRE: {"statuts": [S.NOUVEAU]},
+        UserRoles.ANALYSTE: {"statuts": [S.TRANSMIS_ANALYSTE, S.EN_COURS_ANALYSE]},
+        UserRoles.RESPONSABLE_GGR: {
+            "statuts": [S.EN_COURS_VALIDATION_GGR, S.EN_ATTENTE_DECISION_DG]
+        },
+        UserRoles.BOE: {"statuts": [S.APPROUVE_ATTENTE_FONDS]},
+        None: {},
+    },
+    # Rapports et export CSV du portail pro
+    "rapport": {
+        UserRoles.CLIENT: {"aucun": True},
+        UserRoles.ANALYSTE: {"historique": True},
+        None: {},
+    },
+    # Export Excel des statistiques (analytics)
+    "export": {
+        UserRoles.GESTIONNAIRE: {"archives": False},
+        UserRoles.ANALYSTE: {
+            "statuts": [
+                S.TRANSMIS_ANALYSTE,
+                S.EN_COURS_ANALYSE,
+                S.APPROUVE_ATTENTE_FONDS,
+                S.FONDS_LIBERE,
+                S.REFUSE,
+            ]
+        },
+        UserRoles.RESPONSABLE_GGR: {
+            "statuts": [
+                S.EN_COURS_VALIDATION_GGR,
+                S.EN_ATTENTE_DECISION_DG,
+                S.APPROUVE_ATTENTE_FONDS,
+                S.FONDS_LIBERE,
+                S.REFUSE,
+            ]
+        },
+        UserRoles.BOE: {"statuts": [S.APPROUVE_ATTENTE_FONDS, S.FONDS_LIBERE]},
+        None: {},
+    },
+}
+
+
+class ScopeService:
+    """Service de perimetre des dossiers selon le role."""
+
+    @staticmethod
+    def get_descriptor(user: User, perimetre: str = "traitement") -> Dict[str, Any]:
+        """
+        Descripteur (serialisable, mis en cache) du perimetre d'un utilisateur.
+
+        Args:
+            user: Utilisateur connecte
+            perimetre: Nom du perimetre (cle de PERIMETRES)
+
+        Returns:
+            dict: role, aucun, client_id, acteur_id, statuts, archives
+        """
+        cle = ScopeService._cache_key(user.pk, perimetre)
+        descripteur = cache.get(cle)
+        if descripteur is not None:
+            return descripteur
+
+        role = get_user_role(user)
+        regles = PERIMETRES[perimetre]
+        regle = regles.get(role, regles[None])
+        descripteur = {
+            "role": role,
+            "aucun": bool(regle.get("aucun")),
+            "client_id": user.pk if regle.get("client") else None,
+            "acteur_id": user.pk if regle.get("historique") else None,
+            "statuts": [str(statut) for statut in regle.get("statuts", [])] or None,
+            "archives": regle.get("archives"),
+        }
+        cache.set(cle, descripteur, CACHE_TIMEOUT_SCOPE)
+        return descripteur
+
+    @staticmethod
+    def get_queryset(
+        user: User,
+        perimetre: str = "traitement",
+        queryset: Optional[QuerySet] = None,
+    ) -> QuerySet:
+        """
+        Applique le perimetre d'un utilisateur a un queryset de DossierCredit.
+        Les filtres produits s'appuient sur les index (client, statut_agent),
+        (statut_agent, is_archived) et (acteur, dossier) du journal.
+
+        Args:
+            user: Utilisateur connecte
+            perimetre: Nom du perimetre (cle de PERIMETRES)
+            queryset: Queryset de depart (DossierCredit.objects.all() par defaut)
+
+        Returns:
+            QuerySet: Dossiers visibles
+        """
+        if queryset is None:
+            queryset = DossierCredit.objects.all()
+        descripteur = ScopeService.get_descriptor(user, perimetre)
+
+        if descripteur["aucun"]:
+            return queryset.none()
+        if descripteur["client_id"] is not None:
+            queryset = queryset.filter(client_id=descripteur["client_id"])
+        if descripteur["acteur_id"] is not None:
+            a_traite = JournalAction.objects.filter(
+                dossier=OuterRef("pk"), acteur_id=descripteur["acteur_id"]
+            )
+            queryset = queryset.filter(
+                Exists(a_traite) | Q(acteur_courant_id=descripteur["acteur_id"])
+            )
+        if descripteur["statuts"]:
+            queryset = queryset.filter(statut_agent__in=descripteur["statuts"])
+        if descripteur["archives"] is False:
+            queryset = queryset.filter(is_archived=False)
+        return queryset
+
+    @staticmethod
+    def get_scope_key(user: User, perimetre: str = "traitement") -> str:
+        """
+        Cle stable d'un perimetre, partagee par les utilisateurs qui voient
+        les memes dossiers (ex: tous les gestionnaires). Sert a mettre en
+        cache des resultats calcules sur le perimetre.
+
+        Args:
+            user: Utilisateur connecte
+            perimetre: Nom du perimetre (cle de PERIMETRES)
+
+        Returns:
+            str: Cle du perimetre
+        """
+        descripteur = dict(ScopeService.get_descriptor(user, perimetre))
+        descripteur.pop("role")
+        empreinte = hashlib.md5(
+            json.dumps(descripteur, sort_keys=True).encode()
+        ).hexdigest()
+        return f"{perimetre}:{empreinte}"
+
+    @staticmethod
+    def invalidate(user_id: int) -> None:
+        """Invalide les descripteurs en cache d'un utilisateur."""
+        cache.delete_many(
+            [ScopeService._cache_key(user_id, perimetre) for perimetre in PERIMETRES]
+        )
+
+    @staticmethod
+    def _cache_key(user_id: int, perimetre: str) -> str:
+        return f"scope:{perimetre}:{user_id}"
@@ -0,0 +1,488 @@
+"""
+Machine a etats du workflow des dossiers.
+Point unique de definition des transitions (role, statuts de depart, statut
+d'arrivee): la vue de transition, le decorateur transition_allowed et les
+boutons du detail de dossier lisent tous la table TRANSITIONS.
+Une transition s'execute dans une transaction, dossier verrouille
+(select_for_update): deux clics simultanes ne peuvent pas l'appliquer deux
+fois. Journal et notifications sont ecrits en un INSERT chacun.
+apply_many applique une transition a un lot de dossiers (traitements de fin
+de journee du back-office) avec le meme nombre de requetes qu'un seul.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+from django.utils import timezone
+
+from core import evenements
+
+from ..models import (
+    DossierCredit,
+    DossierStatutAgent,
+    DossierStatutClient,
+    JournalAction,
+    Notification,
+    UserRoles,
+)
+from ..utils import get_user_role
+from .email_service import EmailService
+from .notification_service import NotificationService
+
+logger = logging.getLogger("suivi_demande")
+
+S = DossierStatutAgent
+C = DossierStatutClient
+
+# Transitions par action. Une transition contient:
+#   "role": role autorise a la declencher
+#   "depuis": statuts agent de depart autorises
+#   "vers": statut agent d'arrivee
+#   "statut_client": statut client d'arrivee
+#   "journal": action journalisee (JournalAction.action)
+#   "notifier": role notifie (optionnel)
+#   "commentaire_requis": motif obligatoire (optionnel)
+TRANSITIONS: Dict[str, Dict[str, Any]] = {
+    "transmettre_analyste": {
+        "role": UserRoles.GESTIONNAIRE,
+        "depuis": [S.NOUVEAU, S.TRANSMIS_RESP_GEST],
+        "vers": S.TRANSMIS_ANALYSTE,
+        "statut_client": C.EN_COURS_TRAITEMENT,
+        "journal": "TRANSITION",
+        "notifier": UserRoles.ANALYSTE,
+    },
+    "retour_client": {
+        "role": UserRoles.GESTIONNAIRE,
+        "depuis": [S.NOUVEAU, S.TRANSMIS_RESP_GEST],
+        "vers": S.NOUVEAU,
+        "statut_client": C.SE_RAPPROCHER_GEST,
+        "journal": "RETOUR_CLIENT",
+        "commentaire_requis": True,
+    },
+    "transmettre_ggr": {
+        "role": UserRoles.ANALYSTE,
+        "depuis": [S.TRANSMIS_ANALYSTE, S.EN_COURS_ANALYSE],
+        "vers": S.EN_COURS_VALIDATION_GGR,
+        "statut_client": C.EN_COURS_TRAITEMENT,
+        "journal": "TRANSITION",
+        "notifier": UserRoles.RESPONSABLE_GGR,
+    },
+    "retour_gestionnaire": {
+        "role": UserRoles.ANALYSTE,
+        "depuis": [S.TRANSMIS_ANALYSTE, S.EN_COURS_ANALYSE],
+        "vers": S.TRANSMIS_RESP_GEST,
+        "statut_client": C.EN_COURS_TRAITEMENT,
+        "journal": "RETOUR_GESTIONNAIRE",
+        "notifier": UserRoles.GESTIONNAIRE,
+    },
+    "approuver": {
+        "role": UserRoles.RESPONSABLE_GGR,
+        "depuis": [S.EN_COURS_VALIDATION_GGR, S.EN_ATTENTE_DECISION_DG],
+        "vers": S.APPROUVE_ATTENTE_FONDS,
+        "statut_client": C.EN_COURS_TRAITEMENT,
+        "journal": "APPROBATION",
+        "notifier": UserRoles.BOE,
+    },
+    "refuser": {
+        "role": UserRoles.RESPONSABLE_GGR,
+        "depuis": [
+            S.EN_COURS_VALIDATION_GGR,
+            S.EN_ATTENTE_DECISION_DG,
+            S.TRANSMIS_ANALYSTE,
+            S.EN_COURS_ANALYSE,
+        ],
+        "vers": S.REFUSE,
+        "statut_client": C.REFUSE,
+        "journal": "REFUS",
+    },
+    "liberer_fonds": {
+        "role": UserRoles.BOE,
+        "depuis": [S.APPROUVE_ATTENTE_FONDS],
+        "vers": S.FONDS_LIBERE,
+        "statut_client": C.TERMINE,
+        "journal": "LIBERATION_FONDS",
+    },
+}
+
+
+MESSAGE_NON_AUTORISEE = (
+    "Action non autorisee pour votre role ou l'etat actuel du dossier."
+)
+MESSAGE_COMMENTAIRE_REQUIS = (
+    "Un commentaire expliquant pourquoi le dossier est incomplet est requis."
+)
+
+
+class TransitionError(Exception):
+    """Transition refusee (role, etat du dossier ou donnees manquantes)."""
+
+
+class CommentaireRequis(TransitionError):
+    """La transition exige un motif."""
+
+
+class TransitionService:
+    """Service d'execution des transitions du workflow."""
+
+    @staticmethod
+    def get_transition(role: Optional[str], action: str) -> Optional[Dict[str, Any]]:
+        """Transition de l'action si le role peut la declencher, sinon None."""
+        regle = TRANSITIONS.get(action)
+        if regle is None or regle["role"] != role:
+            return None
+        return regle
+
+    @staticmethod
+    def is_allowed(role: Optional[str], action: str, statut: str) -> bool:
+        """Le role peut-il declencher l'action depuis ce statut agent ?"""
+        regle = TransitionService.get_transition(role, action)
+        return regle is not None and statut in regle["depuis"]
+
+    @staticmethod
+    def get_flags(role: Optional[str], statut: str) -> Dict[str, bool]:
+        """Flags can_tx_<action> de toutes les transitions (templates)."""
+        return {
+            f"can_tx_{action}": TransitionService.is_allowed(role, action, statut)
+            for action in TRANSITIONS
+        }
+
+    @staticmethod
+    def apply(
+        dossier_id: int,
+        action: str,
+        user: User,
+        commentaire: str = "",
+        site_url: str = "",
+    ) -> DossierCredit:
+        """
+        Applique une transition. Le dossier est relu verrouille puis l'etat
+        de depart est verifie: une transition concurrente deja appliquee
+        fait echouer la seconde au lieu de la rejouer. Cout fixe: lecture
+        verrouillee, UPDATE des colonnes de statut, un INSERT de journal, un
+        INSERT de notifications et un INSERT d'emails.
+
+        Args:
+            dossier_id: Identifiant du dossier
+            action: Action (cle de TRANSITIONS)
+            user: Utilisateur declenchant la transition
+            commentaire: Motif (obligatoire pour certaines actions)
+            site_url: URL absolue du site (liens et logo des emails)
+
+        Returns:
+            DossierCredit: Dossier mis a jour
+
+        Raises:
+            DossierCredit.DoesNotExist: Dossier inexistant
+            CommentaireRequis: Motif manquant
+            TransitionError: Action non autorisee pour le role ou l'etat
+        """
+        role = get_user_role(user)
+        regle = TransitionService.get_transition(role, action)
+        if regle is None:
+            raise TransitionError(MESSAGE_NON_AUTORISEE)
+        if regle.get("commentaire_requis") and not commentaire:
+            raise CommentaireRequis(MESSAGE_COMMENTAIRE_REQUIS)
+
+        with transaction.atomic():
+            dossier = (
+                DossierCredit.objects.select_for_update(of=("self",))
+                .select_related("client")
+                .get(pk=dossier_id)
+            )
+            if dossier.statut_agent not in regle["depuis"]:
+                raise TransitionError(MESSAGE_NON_AUTORISEE)
+            de_statut = dossier.statut_agent
+            ancien_statut_client = dossier.statut_client
+            dossier.statut_agent = regle["vers"]
+            dossier.statut_client = regle["statut_client"]
+            dossier.acteur_courant = user
+            dossier.save(
+                update_fields=[
+                    "statut_agent",
+                    "statut_client",
+                    "acteur_courant",
+                    "date_maj",
+                ]
+            )
+            TransitionService._journal(
+                action,
+                regle,
+                dossier,
+                de_statut,
+                ancien_statut_client,
+                user,
+                commentaire,
+            ).save()
+            TransitionService._notify(
+                action, regle, [dossier], user, commentaire, site_url
+            )
+        return dossier
+
+    @staticmethod
+    def apply_many(
+        dossier_ids: Iterable[int],
+        action: str,
+        user: User,
+        commentaire: str = "",
+        site_url: str = "",
+    ) -> Dict[str, List]:
+        """
+        Applique une transition a un lot de dossiers. Les dossiers sont lus
+        verrouilles en une requete filtree sur les statuts de depart; ceux
+        qui ne sont pas (ou plus) dans un statut de depart sont ignores.
+        Cout fixe quel que soit le lot: lecture verrouillee, un UPDATE des
+        statuts, un INSERT de journal, un INSERT de notifications et un
+        INSERT d'emails.
+
+        Args:
+            dossier_ids: Identifiants des dossiers
+            action: Action (cle de TRANSITIONS)
+            user: Utilisateur declenchant la transition
+            commentaire: Motif (obligatoire pour certaines actions)
+            site_url: URL absolue du site (liens et logo des emails)
+
+        Returns:
+            dict: "appliques" (dossiers mis a jour) et "ignores" (identifiants
+            inexistants ou dans un statut ne permettant pas l'action)
+
+        Raises:
+            CommentaireRequis: Motif manquant
+            TransitionError: Action non autorisee pour le role
+        """
+        role = get_user_role(user)
+        regle = TransitionService.get_transition(role, action)
+        if regle is None:
+            raise TransitionError(MESSAGE_NON_AUTORISEE)
+        if regle.get("commentaire_requis") and not commentaire:
+            raise CommentaireRequis(MESSAGE_COMMENTAIRE_REQUIS)
+        dossier_ids = set(dossier_ids)
+        if not dossier_ids:
+            return {"appliques": [], "ignores": []}
+
+        with transaction.atomic():
+            dossiers = list(
+                DossierCredit.objects.select_for_update(of=("self",))
+                .select_related("client")
+                .filter(pk__in=dossier_ids, statut_agent__in=regle["depuis"])
+                .order_by("pk")
+            )
+            if dossiers:
+                DossierCredit.objects.filter(
+                    pk__in=[dossier.pk for dossier in dossiers]
+                ).update(
+                    statut_agent=regle["vers"],
+                    statut_client=regle["statut_client"],
+                    acteur_courant=user,
+                    date_maj=timezone.now(),
+                )
+                journaux = []
+                for dossier in dossiers:
+                    de_statut = dossier.statut_agent
+                    ancien_statut_client = dossier.statut_client
+                    dossier.statut_agent = regle["vers"]
+                    dossier.statut_client = regle["statut_client"]
+                    dossier.acteur_courant = user
+                    journaux.append(
+                        TransitionService._journal(
+                            action,
+                            regle,
+                            dossier,
+                            de_statut,
+                            ancien_statut_client,
+                            user,
+                            commentaire,
+                        )
+                    )
+                JournalAction.objects.bulk_create(journaux)
+                TransitionService._notify(
+                    action, regle, dossiers, user, commentaire, site_url
+                )
+                # UPDATE et bulk_create n'emettent pas post_save: graphiques
+                # et flux temps reel des clients sont mis a jour ici
+                transaction.on_commit(TransitionService._invalidate_charts)
+                transaction.on_commit(
+                    lambda: TransitionService.publish_status(dossiers)
+                )
+
+        appliques = {dossier.pk for dossier in dossiers}
+        return {
+            "appliques": dossiers,
+            "ignores": sorted(dossier_ids - appliques),
+        }
+
+    @staticmethod
+    def publish_status(dossiers: Iterable[DossierCredit]) -> None:
+        """
+        Pousse le nouveau statut client des dossiers au flux temps reel de
+        leur client. A appeler apres commit.
+        """
+        for dossier in dossiers:
+            evenements.publish(
+                evenements.canal_utilisateur(dossier.client_id),
+                "dossier",
+                {
+                    "dossier": dossier.pk,
+                    "reference": dossier.reference,
+                    "statut": dossier.statut_client,
+                    "libelle": dossier.get_statut_client_display(),
+                },
+            )
+
+    @staticmethod
+    def _invalidate_charts() -> None:
+        from analytics.services import AnalyticsService
+
+        AnalyticsService.invalider_cache_graphiques()
+
+    @staticmethod
+    def _journal(
+        action, regle, dossier, de_statut, ancien_statut_client, user, commentaire
+    ) -> JournalAction:
+        commentaire_systeme = f"Action: {action}"
+        if action == "retour_client" and commentaire:
+            commentaire_systeme += f" - Motif: {commentaire}"
+        return JournalAction(
+            dossier=dossier,
+            action=regle["journal"],
+            de_statut=de_statut,
+            vers_statut=regle["vers"],
+            acteur=user,
+            commentaire_systeme=commentaire_systeme,
+            meta={
+                "ancien_statut_client": ancien_statut_client,
+                "nouveau_statut_client": dossier.statut_client,
+                "role": regle["role"],
+                "commentaire_retour": (
+                    commentaire if action == "retour_client" else None
+                ),
+            },
+        )
+
+    @staticmethod
+    def _notify(
+        action: str,
+        regle: Dict[str, Any],
+        dossiers: List[DossierCredit],
+        user: User,
+        commentaire: str,
+        site_url: str,
+    ) -> None:
+        """
+        Notifications et emails d'une transition appliquee a des dossiers:
+        un INSERT de notifications (clients et role notifie) et un INSERT
+        d'emails, quel que soit le nombre de dossiers.
+        """
+        notifications = []
+        emails = []
+        for dossier in dossiers:
+            if action == "retour_client":
+                titre = f"Dossier {dossier.reference} - Complements requis"
+                message = (
+                    f"Votre dossier necessite des complements. Motif: {commentaire}"
+                )
+            else:
+                titre = f"Dossier {dossier.reference} - Mise a jour"
+                message = f"Statut cote client: {dossier.get_statut_client_display()}"
+            notifications.append(
+                Notification(
+                    utilisateur_cible=dossier.client,
+                    type="NOUVEAU_MESSAGE",
+                    titre=titre,
+                    message=message,
+                    canal="INTERNE",
+                )
+            )
+            if dossier.client.email:
+                emails.append(
+                    TransitionService._client_email(
+                        action, dossier, commentaire, site_url
+                    )
+                )
+
+        if regle.get("notifier"):
+            expediteur = user.get_full_name() or user.username
+            libelle = action.replace("_", " ")
+            contenus = []
+            for dossier in dossiers:
+                client = dossier.client.get_full_name() or dossier.client.username
+                contenus.append(
+                    {
+                        "titre": f"Dossier {libelle} - {dossier.reference}",
+                        "message": (
+                            f"Reference: {dossier.reference}\n"
+                            f"Client: {client}\n"
+                            f"Montant: {dossier.montant} FCFA\n"
+                            f"Par: {expediteur}"
+                        ),
+                        "dossier": dossier,
+                        "email_subject": (
+                            f"[Credit du Congo] Dossier {dossier.reference}"
+                        ),
+                    }
+                )
+            notifications_role, emails_role = NotificationService.prepare_for_role(
+                regle["notifier"], contenus
+            )
+            notifications += notifications_role
+            emails += emails_role
+
+        NotificationService.create_many(notifications)
+        EmailService.enqueue(emails)
+
+    @staticmethod
+    def _client_email(
+        action: str, dossier: DossierCredit, commentaire: str, site_url: str
+    ) -> EmailMessage:
+        """Email au client apres une transition."""
+        html_message = None
+        if action == "retour_client":
+            subject = (
+                f"[Credit du Congo] Dossier {dossier.reference} - Complements requis"
+            )
+            text_message = (
+                f"Bonjour,\n\n"
+                f"Votre dossier de credit {dossier.reference} necessite "
+                f"des complements.\n\n"
+                f"Motif du retour:\n{commentaire}\n\n"
+                f"Veuillez vous rapprocher de votre gestionnaire pour "
+                f"completer votre dossier.\n\n"
+                f"Cordialement,\nL'equipe Credit du Congo"
+            )
+            try:
+                html_message = render_to_string(
+                    "emails/retour_client.html",
+                    {
+                        "dossier": dossier,
+                        "commentaire_retour": commentaire,
+                        "logo_url": urljoin(
+                            site_url, static("suivi_demande/img/Credit_Du_Congo.png")
+                        ),
+                        "site_url": site_url,
+                    },
+                )
+            except Exception:
+                logger.warning("Template email retour_client.html non disponible")
+        else:
+            subject = f"[Credit du Congo] Dossier {dossier.reference} mis a jour"
+            text_message = (
+                f"Bonjour,\n\nVotre dossier {dossier.reference} a ete mis a jour. "
+                f"Nouveau statut: {dossier.get_statut_client_display()}.\n\n"
+                f"Ceci est un message automatique."
+            )
+
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=text_message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[dossier.client.email],
+        )
+        if html_message:
+            email.attach_alternative(html_message, "text/html")
+        return email
@@ -0,0 +1,61 @@
+"""
+Signaux de suivi_demande: invalidation des caches et publication temps reel
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import JournalAction, Notification, UserProfile
+from .services.notification_service import NotificationService
+from .services.scope_service import ScopeService
+from .services.transition_service import TransitionService
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalider_perimetre_utilisateur(sender, instance, **kwargs):
+    """
+    Le perimetre depend du role: invalider le descripteur en cache
+    """
+    ScopeService.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+def maj_compteur_notifications(sender, instance, created, **kwargs):
+    """
+    Nouvelle notification non lue: incrementer le compteur (ou perimer les
+    caches du role pour une diffusion) et la pousser aux flux temps reel
+    apres commit
+    """
+    if not created or instance.lu:
+        return
+    transaction.on_commit(lambda: NotificationService.publish([instance]))
+    if instance.role_cible:
+        role = instance.role_cible
+        transaction.on_commit(lambda: NotificationService.on_broadcast(role))
+    else:
+        user_id = instance.utilisateur_cible_id
+        transaction.on_commit(lambda: NotificationService.on_created([user_id]))
+
+
+@receiver(post_delete, sender=Notification)
+def invalider_notifications(sender, instance, **kwargs):
+    if instance.role_cible:
+        role = instance.role_cible
+        transaction.on_commit(lambda: NotificationService.on_broadcast(role))
+    else:
+        user_id = instance.utilisateur_cible_id
+        transaction.on_commit(lambda: NotificationService.invalidate(user_id))
+
+
+@receiver(post_save, sender=JournalAction)
+def publier_changement_statut(sender, instance, created, **kwargs):
+    """
+    Changement de statut journalise: pousser le nouveau statut au flux temps
+    reel du client apres commit
+    """
+    if not created or not instance.vers_statut:
+        return
+    dossier = instance.dossier
+    transaction.on_commit(lambda: TransitionService.publish_status([dossier]))
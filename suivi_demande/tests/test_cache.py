@@ -0,0 +1,57 @@
+"""
+Tests du cache partage par sous-systeme (core.cache).
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase
+
+from core.cache import KPI, RATELIMIT, get_cache, get_or_set_locked
+
+
+class CacheEspacesTestCase(TestCase):
+    """Tests des alias de cache et de la garde anti-stampede."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+    def test_espaces_de_cles_distincts(self):
+        """Une meme cle ne se melange pas entre sous-systemes."""
+        get_cache(KPI).set("compteur", 1)
+        self.assertIsNone(get_cache(RATELIMIT).get("compteur"))
+        self.assertIn(":kpi", get_cache(KPI).make_key("compteur"))
+
+    def test_calcul_unique_puis_cache(self):
+        """La valeur est calculee une fois puis servie par le cache."""
+        appels = []
+
+        def calculer():
+            appels.append(1)
+            return {"total": 3}
+
+        for _ in range(3):
+            valeur = get_or_set_locked(KPI, "stats", calculer, 60)
+        self.assertEqual(valeur, {"total": 3})
+        self.assertEqual(len(appels), 1)
+
+    def test_attente_du_detenteur_du_verrou(self):
+        """Verrou pris ailleurs: on relit la valeur publiee sans calculer."""
+        backend = get_cache(KPI)
+        backend.add("stats:verrou", 1, 10)
+        backend.set("stats", "publie", 60)
+        valeur = get_or_set_locked(
+            KPI, "stats", lambda: self.fail("calcul en double"), 60
+        )
+        self.assertEqual(valeur, "publie")
+
+    def test_verrou_expire_calcul_local(self):
+        """Detenteur trop lent: calcul local sans ecrire la valeur."""
+        backend = get_cache(KPI)
+        backend.add("stats:verrou", 1, 10)
+        valeur = get_or_set_locked(
+            KPI, "stats", lambda: "local", 60, wait=0, retries=2
+        )
+        self.assertEqual(valeur, "local")
+        self.assertIsNone(backend.get("stats"))
@@ -0,0 +1,236 @@
+"""
+Tests de DossierService: listing projete (dashboards), statistiques et
+attribution des references.
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.cache import KPI
+
+from ..models import (
+    CompteurReference,
+    DossierCredit,
+    DossierStatutAgent,
+    JournalAction,
+    PieceJointe,
+    UserProfile,
+    UserRoles,
+)
+from ..services.dossier_service import DossierService
+from ..services.reference_service import ReferenceService
+from ..services.scope_service import ScopeService
+
+User = get_user_model()
+
+
+class DossiersForUserTestCase(TestCase):
+    """Tests de get_dossiers_for_user avec projection."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        cache.clear()
+        caches[KPI].clear()
+        self.gestionnaire = User.objects.create_user("gest_liste", password="pass")
+        UserProfile.objects.create(
+            user=self.gestionnaire,
+            full_name="Gestionnaire",
+            role=UserRoles.GESTIONNAIRE,
+        )
+        self.client_user = User.objects.create_user(
+            "client_liste", password="pass", first_name="Awa", last_name="Diop"
+        )
+        self.dossiers = [
+            DossierCredit.objects.create(
+                client=self.client_user,
+                reference=f"DOS-LI-{i}",
+                produit="Credit",
+                montant=Decimal("500000.00"),
+                statut_agent=DossierStatutAgent.NOUVEAU,
+            )
+            for i in range(3)
+        ]
+        premier = self.dossiers[0]
+        JournalAction.objects.create(
+            dossier=premier, action="CREATION", acteur=self.gestionnaire
+        )
+        JournalAction.objects.create(
+            dossier=premier, action="TRANSITION", acteur=self.gestionnaire
+        )
+        PieceJointe.objects.create(dossier=premier, fichier="pieces/a.pdf")
+        PieceJointe.objects.create(dossier=premier, fichier="pieces/b.pdf")
+
+    def _page(self, **kwargs):
+        return DossierService.get_dossiers_for_user(
+            user=self.gestionnaire, per_page=10, **kwargs
+        )
+
+    def test_colonnes_differees(self):
+        """Seules les colonnes du listing sont chargees."""
+        dossier = self._page().object_list[0]
+        differes = dossier.get_deferred_fields()
+        self.assertIn("wizard_current_step", differes)
+        self.assertNotIn("statut_agent", differes)
+
+    def test_annotations_derniere_action_et_pieces(self):
+        """Derniere action et nombre de pieces annotes par sous-requete."""
+        page = self._page(include=["client", "last_action", "pieces_count"])
+        par_ref = {d.reference: d for d in page.object_list}
+
+        premier = par_ref["DOS-LI-0"]
+        self.assertEqual(premier.derniere_action, "TRANSITION")
+        self.assertEqual(premier.nb_pieces, 2)
+        self.assertEqual(premier.client.get_full_name(), "Awa Diop")
+        self.assertIsNone(par_ref["DOS-LI-1"].derniere_action)
+        self.assertEqual(par_ref["DOS-LI-1"].nb_pieces, 0)
+
+    def test_requetes_independantes_de_l_historique(self):
+        """Le nombre de requetes ne croit pas avec le journal."""
+
+        def compter():
+            with CaptureQueriesContext(connection) as ctx:
+                page = self._page(include=["client", "last_action"])
+                for d in page.object_list:
+                    d.client.username, d.derniere_action
+            return len(ctx.captured_queries)
+
+        avant = compter()
+        for dossier in self.dossiers:
+            JournalAction.objects.bulk_create(
+                JournalAction(dossier=dossier, action="MISE_A_JOUR")
+                for _ in range(20)
+            )
+        self.assertEqual(compter(), avant)
+
+    def test_inclusion_inconnue(self):
+        """Une inclusion inconnue est refusee."""
+        with self.assertRaises(ValueError):
+            self._page(include=["journal"])
+
+
+class StatistiquesRoleTestCase(TestCase):
+    """Tests de l'histogramme par statut et des KPI derives."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        cache.clear()
+        caches[KPI].clear()
+        self.gestionnaire = User.objects.create_user("gest_stats", password="pass")
+        UserProfile.objects.create(
+            user=self.gestionnaire,
+            full_name="Gestionnaire",
+            role=UserRoles.GESTIONNAIRE,
+        )
+        client_user = User.objects.create_user("client_stats", password="pass")
+        statuts = [
+            (DossierStatutAgent.NOUVEAU, "100.00"),
+            (DossierStatutAgent.NOUVEAU, "200.00"),
+            (DossierStatutAgent.APPROUVE_ATTENTE_FONDS, "300.00"),
+            (DossierStatutAgent.REFUSE, "400.00"),
+            (DossierStatutAgent.FONDS_LIBERE, "500.00"),
+        ]
+        for i, (statut, montant) in enumerate(statuts):
+            DossierCredit.objects.create(
+                client=client_user,
+                reference=f"DOS-ST-{i}",
+                produit="Credit",
+                montant=Decimal(montant),
+                statut_agent=statut,
+            )
+
+    def test_histogramme_une_requete(self):
+        """Comptes et montants par statut en une seule requete."""
+        with CaptureQueriesContext(connection) as ctx:
+            histogramme = DossierService.get_status_histogram(self.gestionnaire)
+        # profil (role) + GROUP BY
+        self.assertLessEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(histogramme[DossierStatutAgent.NOUVEAU]["count"], 2)
+        self.assertEqual(
+            histogramme[DossierStatutAgent.NOUVEAU]["montant"], Decimal("300.00")
+        )
+
+    def test_kpi_derives(self):
+        """Les KPI sont derives de l'histogramme."""
+        stats = DossierService.get_statistics_for_role(self.gestionnaire)
+        self.assertEqual(stats["total"], 5)
+        self.assertEqual(stats["en_cours"], 3)
+        self.assertEqual(stats["approuves"], 1)
+        self.assertEqual(stats["refuses"], 1)
+        self.assertEqual(stats["montant_total"], Decimal("1500.00"))
+
+    def test_cache_partage_par_perimetre(self):
+        """Deux gestionnaires partagent le meme histogramme en cache."""
+        DossierService.get_statistics_for_role(self.gestionnaire)
+        autre = User.objects.create_user("gest_stats_2", password="pass")
+        UserProfile.objects.create(
+            user=autre, full_name="Autre", role=UserRoles.GESTIONNAIRE
+        )
+        # Descripteur de perimetre deja resolu (lecture du role)
+        ScopeService.get_descriptor(autre, "statistiques")
+        with CaptureQueriesContext(connection) as ctx:
+            stats = DossierService.get_statistics_for_role(autre)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(stats["total"], 5)
+
+
+class ReferenceServiceTestCase(TestCase):
+    """Tests de l'attribution des references par compteur annuel."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        self.gestionnaire = User.objects.create_user("gest_ref", password="pass")
+        self.client_user = User.objects.create_user("client_ref", password="pass")
+
+    def test_references_consecutives_par_annee(self):
+        """Numeros consecutifs, compteur distinct par annee."""
+        self.assertEqual(ReferenceService.allocate(year=2030), "DOS-2030-00001")
+        self.assertEqual(ReferenceService.allocate(year=2030), "DOS-2030-00002")
+        self.assertEqual(ReferenceService.allocate(year=2031), "DOS-2031-00001")
+
+    def test_reprise_apres_references_existantes(self):
+        """Le compteur d'une annee reprend apres les references deja creees."""
+        for reference in ("DOS-2030-00007", "DOS-2030-00003", "DOS-20301018-4"):
+            DossierCredit.objects.create(
+                client=self.client_user,
+                reference=reference,
+                produit="Credit",
+                montant=Decimal("1000.00"),
+            )
+        self.assertEqual(ReferenceService.allocate(year=2030), "DOS-2030-00008")
+
+    def test_attribution_en_masse(self):
+        """Un lot de references est reserve en un seul increment."""
+        ReferenceService.allocate(year=2030)
+        with CaptureQueriesContext(connection) as ctx:
+            references = ReferenceService.allocate_many(3, year=2030)
+        # UPDATE du compteur puis lecture de la valeur (hors savepoints)
+        requetes = [q for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(len(requetes), 2)
+        self.assertEqual(
+            references, ["DOS-2030-00002", "DOS-2030-00003", "DOS-2030-00004"]
+        )
+        self.assertEqual(CompteurReference.objects.get(annee=2030).valeur, 4)
+        with self.assertRaises(ValueError):
+            ReferenceService.allocate_many(0)
+
+    def test_create_dossier_sans_comptage(self):
+        """La creation ne compte plus les dossiers de l'annee."""
+        premier = DossierService.create_dossier(
+            self.client_user, "Credit", Decimal("1000.00"), self.gestionnaire
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            second = DossierService.create_dossier(
+                self.client_user, "Credit", Decimal("1000.00"), self.gestionnaire
+            )
+        self.assertFalse(
+            any("COUNT" in q["sql"].upper() for q in ctx.captured_queries)
+        )
+        self.assertEqual(
+            int(second.reference.rsplit("-", 1)[1]),
+            int(premier.reference.rsplit("-", 1)[1]) + 1,
+        )
@@ -0,0 +1,123 @@
+"""
+Tests du service de calcul des delais de traitement (rapports).
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..models import (
+    DossierCredit,
+    DossierStatutAgent,
+    JournalAction,
+    UserProfile,
+    UserRoles,
+)
+from ..services.lead_time_service import LeadTimeService
+
+User = get_user_model()
+
+
+class LeadTimeServiceTestCase(TestCase):
+    """Tests des moyennes de delais calculees en base."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        self.client_user = User.objects.create_user("client_lt", password="pass")
+        self.analyste = User.objects.create_user("analyste_lt", password="pass")
+        UserProfile.objects.create(
+            user=self.analyste, full_name="Analyste", role=UserRoles.ANALYSTE
+        )
+        self.maintenant = timezone.now()
+
+    def _dossier(self, reference, statut, jours_depuis_soumission, jours_final=None):
+        dossier = DossierCredit.objects.create(
+            client=self.client_user,
+            reference=reference,
+            produit="Credit",
+            montant=Decimal("1000000.00"),
+            statut_agent=statut,
+            acteur_courant=self.analyste,
+        )
+        soumission = self.maintenant - timedelta(days=jours_depuis_soumission)
+        DossierCredit.objects.filter(pk=dossier.pk).update(
+            date_soumission=soumission, date_maj=self.maintenant
+        )
+        if jours_final is not None:
+            action = JournalAction.objects.create(
+                dossier=dossier,
+                action="VALIDATION",
+                vers_statut=statut,
+                acteur=self.analyste,
+            )
+            JournalAction.objects.filter(pk=action.pk).update(
+                timestamp=soumission + timedelta(days=jours_final)
+            )
+        return dossier
+
+    def test_delai_moyen_jusqu_au_statut_final(self):
+        """Moyenne soumission -> premier statut final."""
+        self._dossier("DOS-LT-1", DossierStatutAgent.FONDS_LIBERE, 10, jours_final=2)
+        self._dossier("DOS-LT-2", DossierStatutAgent.REFUSE, 10, jours_final=4)
+        self._dossier("DOS-LT-3", DossierStatutAgent.NOUVEAU, 10)
+
+        with self.assertNumQueries(1):
+            delai = LeadTimeService.average_days_to_final(DossierCredit.objects.all())
+
+        self.assertEqual(delai, 3.0)
+
+    def test_delai_par_acteur(self):
+        """Moyenne date_maj - soumission des dossiers finalises par acteur."""
+        self._dossier("DOS-LT-1", DossierStatutAgent.FONDS_LIBERE, 4)
+        self._dossier("DOS-LT-2", DossierStatutAgent.REFUSE, 2)
+        self._dossier("DOS-LT-3", DossierStatutAgent.NOUVEAU, 30)
+
+        with self.assertNumQueries(1):
+            lignes = LeadTimeService.average_days_by_actor(DossierCredit.objects.all())
+
+        self.assertEqual(lignes, [{"manager": "analyste_lt", "avg_days": 3.0}])
+
+    def test_delai_depuis_premiere_action(self):
+        """Moyenne premiere action de l'acteur -> derniere mise a jour."""
+        self._dossier("DOS-LT-1", DossierStatutAgent.REFUSE, 10, jours_final=4)
+        self._dossier("DOS-LT-2", DossierStatutAgent.REFUSE, 10, jours_final=8)
+
+        delai = LeadTimeService.average_days_since_first_action(
+            DossierCredit.objects.all(), self.analyste
+        )
+
+        self.assertEqual(delai, 4.0)
+
+    def test_portefeuille_vide(self):
+        """Sans dossier, les moyennes valent 0."""
+        dossiers = DossierCredit.objects.all()
+
+        self.assertEqual(LeadTimeService.average_days_to_final(dossiers), 0.0)
+        self.assertEqual(LeadTimeService.average_days_by_actor(dossiers), [])
+        self.assertEqual(
+            LeadTimeService.average_days_since_first_action(dossiers, self.analyste),
+            0.0,
+        )
+
+    def test_rapport_analyste_nombre_requetes_fixe(self):
+        """Le rapport analyste ne fait pas une requete par dossier."""
+        client = Client()
+        client.force_login(self.analyste)
+
+        def compter_requetes():
+            with CaptureQueriesContext(connection) as requetes:
+                response = client.get("/pro/rapports/")
+            self.assertEqual(response.status_code, 200)
+            return len(requetes)
+
+        self._dossier("DOS-LT-0", DossierStatutAgent.REFUSE, 5, jours_final=1)
+        reference = compter_requetes()
+        for i in range(1, 6):
+            self._dossier(f"DOS-LT-{i}", DossierStatutAgent.REFUSE, 5, jours_final=1)
+
+        self.assertEqual(compter_requetes(), reference)
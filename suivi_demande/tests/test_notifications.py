@@ -0,0 +1,583 @@
+"""
+Tests des notifications: compteurs en cache, diffusion, flux temps reel et
+boite d'envoi.
+"""
+
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import evenements
+
+from ..context_processors import notifications
+from ..models import (
+    DossierCredit,
+    DossierStatutAgent,
+    DossierStatutClient,
+    EmailSortant,
+    JournalAction,
+    Notification,
+    UserProfile,
+    UserRoles,
+)
+from ..services.email_service import EmailService
+from ..services.notification_service import NotificationService
+
+User = get_user_model()
+
+
+class NotificationCacheTestCase(TestCase):
+    """Tests du compteur de non lues et des dernieres notifications."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        cache.clear()
+        self.user = User.objects.create_user("client_notif", password="pass")
+        UserProfile.objects.create(
+            user=self.user, full_name="Client", role=UserRoles.CLIENT
+        )
+
+    def _notifier(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(
+                utilisateur_cible=self.user,
+                type="INFO",
+                titre="Titre",
+                message="Message",
+                **kwargs,
+            )
+
+    def test_compteur_en_cache_maintenu_a_la_creation(self):
+        """Le compteur est incremente sans nouvelle requete COUNT."""
+        self._notifier()
+        self.assertEqual(NotificationService.unread_count(self.user), 1)
+        self._notifier()
+        with self.assertNumQueries(0):
+            self.assertEqual(NotificationService.unread_count(self.user), 2)
+
+    def test_context_processor_paresseux(self):
+        """Aucune requete tant que le template ne lit pas les variables."""
+        self._notifier()
+        request = RequestFactory().get("/")
+        request.user = self.user
+        with self.assertNumQueries(0):
+            contexte = notifications(request)
+        with self.assertNumQueries(2):
+            self.assertTrue(contexte["unread_notifications_count"] > 0)
+            self.assertEqual(len(contexte["latest_notifications"]), 1)
+
+        request.user = AnonymousUser()
+        self.assertEqual(notifications(request)["unread_notifications_count"], 0)
+
+    def test_marquer_lu_et_tout_lu(self):
+        """Les vues de lecture mettent a jour le compteur en cache."""
+        premiere = self._notifier()
+        self._notifier()
+        self.assertEqual(NotificationService.unread_count(self.user), 2)
+        self.client.force_login(self.user)
+
+        self.client.post(
+            reverse("client:notifications_mark_read", args=[premiere.pk])
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(NotificationService.unread_count(self.user), 1)
+
+        self.client.post(reverse("client:notifications_mark_all"))
+        self.assertEqual(NotificationService.unread_count(self.user), 0)
+        self.assertTrue(NotificationService.latest(self.user)[0].lu)
+
+
+class FanOutTestCase(TestCase):
+    """Tests de la diffusion des notifications a un role."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        cache.clear()
+        self.analystes = []
+        for i in range(6):
+            user = User.objects.create_user(
+                f"analyste_fan_{i}",
+                email=f"analyste{i}@test.com" if i else "",
+                password="pass",
+            )
+            UserProfile.objects.create(
+                user=user, full_name=f"Analyste {i}", role=UserRoles.ANALYSTE
+            )
+            self.analystes.append(user)
+        self.analystes[-1].is_active = False
+        self.analystes[-1].save()
+
+    @override_settings(EMAIL_OUTBOX_WORKER=True)
+    def test_une_requete_et_un_insert(self):
+        """Destinataires, notifications et emails: une requete chacun."""
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(3):
+                nombre = NotificationService.fan_out(
+                    UserRoles.ANALYSTE,
+                    titre="Dossier transmis",
+                    message="Reference: DOS-1",
+                    email_subject="[Credit du Congo] Dossier DOS-1",
+                    broadcast=False,
+                )
+
+        self.assertEqual(nombre, 5)
+        self.assertEqual(
+            Notification.objects.filter(titre="Dossier transmis").count(), 5
+        )
+        # Un email par destinataire actif ayant une adresse, mis en file
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailSortant.objects.count(), 4)
+        self.assertEqual(EmailService.process_pending(), (4, 0))
+        self.assertEqual(mail.outbox[0].subject, "[Credit du Congo] Dossier DOS-1")
+
+    def test_compteurs_maintenus(self):
+        """Les compteurs en cache suivent le bulk_create."""
+        analyste = self.analystes[1]
+        self.assertEqual(NotificationService.unread_count(analyste), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.fan_out(
+                UserRoles.ANALYSTE, "Titre", "Message", broadcast=False
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(NotificationService.unread_count(analyste), 1)
+
+
+class DiffusionRoleTestCase(TestCase):
+    """Tests des notifications diffusees a un role."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        cache.clear()
+        self.analystes = []
+        for i in range(3):
+            user = User.objects.create_user(
+                f"analyste_diff_{i}", email=f"diff{i}@test.com", password="pass"
+            )
+            UserProfile.objects.create(
+                user=user, full_name=f"Analyste {i}", role=UserRoles.ANALYSTE
+            )
+            self.analystes.append(user)
+        self.gestionnaire = User.objects.create_user("gest_diff", password="pass")
+        UserProfile.objects.create(
+            user=self.gestionnaire, full_name="Gest", role=UserRoles.GESTIONNAIRE
+        )
+
+    def _diffuser(self, titre="Dossier transmis"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return NotificationService.fan_out(
+                UserRoles.ANALYSTE,
+                titre=titre,
+                message="Reference: DOS-1",
+                email_subject="[Credit du Congo] Dossier DOS-1",
+            )
+
+    def test_une_seule_ligne_pour_le_role(self):
+        """Une ligne de notification, un email par membre du role."""
+        self.assertEqual(self._diffuser(), 1)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(EmailSortant.objects.count(), 3)
+        self.assertEqual(NotificationService.unread_count(self.analystes[0]), 1)
+        self.assertEqual(NotificationService.unread_count(self.gestionnaire), 0)
+
+    def test_fusion_personnelles_et_diffusions(self):
+        """Liste fusionnee en une requete, lecture suivie par utilisateur."""
+        analyste = self.analystes[0]
+        Notification.objects.create(
+            utilisateur_cible=analyste, type="INFO", titre="Perso", message="M"
+        )
+        self._diffuser()
+        NotificationService.unread_count(analyste)  # descripteur de role en cache
+        with self.assertNumQueries(1):
+            titres = [n.titre for n in NotificationService.visible(analyste)]
+        self.assertEqual(titres, ["Dossier transmis", "Perso"])
+
+        diffusion = Notification.objects.get(role_cible=UserRoles.ANALYSTE)
+        NotificationService.mark_read(analyste, diffusion)
+        self.assertEqual(NotificationService.unread_count(analyste), 1)
+        self.assertEqual(NotificationService.unread_count(self.analystes[1]), 1)
+        self.assertTrue(NotificationService.latest(analyste)[0].lu)
+
+        NotificationService.mark_all_read(self.analystes[1])
+        self.assertEqual(NotificationService.unread_count(self.analystes[1]), 0)
+
+    def test_nouvelle_diffusion_perime_les_caches_du_role(self):
+        """Le compteur en cache des membres suit les nouvelles diffusions."""
+        analyste = self.analystes[2]
+        self.assertEqual(NotificationService.unread_count(analyste), 0)
+        self._diffuser("Premiere")
+        self._diffuser("Seconde")
+        self.assertEqual(NotificationService.unread_count(analyste), 2)
+        self.assertEqual(NotificationService.latest(analyste)[0].titre, "Seconde")
+
+    def test_vue_liste_et_marquage(self):
+        """La vue liste les diffusions et les marque lues par utilisateur."""
+        self._diffuser()
+        diffusion = Notification.objects.get()
+        analyste = self.analystes[0]
+        self.client.force_login(analyste)
+        self.client.post(
+            reverse("pro:notifications_mark_read", args=[diffusion.pk])
+        )
+        diffusion.refresh_from_db()
+        self.assertFalse(diffusion.lu)
+        self.assertEqual(NotificationService.unread_count(analyste), 0)
+        reponse = self.client.get(reverse("pro:notifications"))
+        self.assertContains(reponse, "Dossier transmis")
+        self.assertNotContains(reponse, "Non lu")
+
+        self.client.force_login(self.gestionnaire)
+        reponse = self.client.post(
+            reverse("pro:notifications_mark_read", args=[diffusion.pk])
+        )
+        self.assertEqual(reponse.status_code, 404)
+
+
+class PaginationCurseurTestCase(TestCase):
+    """Tests de la pagination par curseur de la liste des notifications."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        cache.clear()
+        self.user = User.objects.create_user("client_pages", password="pass")
+        UserProfile.objects.create(
+            user=self.user, full_name="Client", role=UserRoles.CLIENT
+        )
+        notifications = Notification.objects.bulk_create(
+            Notification(
+                utilisateur_cible=self.user,
+                type="INFO",
+                titre=f"Notif {i}",
+                message="Message",
+            )
+            for i in range(7)
+        )
+        # Horodatages en double: le departage se fait sur l'id
+        instant = timezone.now()
+        for i, notification in enumerate(notifications):
+            Notification.objects.filter(pk=notification.pk).update(
+                created_at=instant - timedelta(minutes=i // 2)
+            )
+
+    def test_pages_disjointes_et_completes(self):
+        """Les pages s'enchainent sans doublon ni trou."""
+        vus, curseur = [], None
+        while True:
+            page, curseur = NotificationService.page(self.user, curseur, per_page=3)
+            vus.extend(n.pk for n in page)
+            if curseur is None:
+                break
+        attendus = list(
+            Notification.objects.order_by("-created_at", "-id").values_list(
+                "pk", flat=True
+            )
+        )
+        self.assertEqual(vus, attendus)
+
+    def test_cout_constant(self):
+        """Une page profonde coute une seule requete, comme la premiere."""
+        _, curseur = NotificationService.page(self.user, per_page=3)
+        _, curseur = NotificationService.page(self.user, curseur, per_page=3)
+        with self.assertNumQueries(1):
+            page, suivant = NotificationService.page(self.user, curseur, per_page=3)
+        self.assertEqual(len(page), 1)
+        self.assertIsNone(suivant)
+
+    def test_vue_curseur_invalide(self):
+        """Un curseur illisible renvoie la premiere page."""
+        self.client.login(username="client_pages", password="pass")
+        reponse = self.client.get(
+            reverse("client:notifications"), {"avant": "nimporte-quoi"}
+        )
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(reponse.context["premiere_page"])
+        self.assertEqual(len(reponse.context["notifications"]), 7)
+
+    def test_vue_curseur_hors_bornes(self):
+        """Un curseur hors bornes (OverflowError) renvoie aussi la premiere page."""
+        self.client.login(username="client_pages", password="pass")
+        for curseur in ("99999999999999999999-1", "1-99999999999999999999"):
+            reponse = self.client.get(
+                reverse("client:notifications"), {"avant": curseur}
+            )
+            self.assertEqual(reponse.status_code, 200)
+            self.assertTrue(reponse.context["premiere_page"])
+            self.assertEqual(len(reponse.context["notifications"]), 7)
+
+
+class PurgeNotificationsTestCase(TestCase):
+    """Tests de la retention des notifications (purge_notifications)."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        cache.clear()
+        self.user = User.objects.create_user("client_purge", password="pass")
+        UserProfile.objects.create(
+            user=self.user, full_name="Client", role=UserRoles.CLIENT
+        )
+        self.gestionnaire = User.objects.create_user("gest_purge", password="pass")
+        UserProfile.objects.create(
+            user=self.gestionnaire,
+            full_name="Gestionnaire",
+            role=UserRoles.GESTIONNAIRE,
+        )
+
+    def _notification(self, age_jours, **kwargs):
+        kwargs.setdefault("utilisateur_cible", self.user)
+        notification = Notification.objects.create(
+            type="INFO", titre="Titre", message="Message", **kwargs
+        )
+        Notification.objects.filter(pk=notification.pk).update(
+            created_at=timezone.now() - timedelta(days=age_jours)
+        )
+        return notification
+
+    def test_purge_lues_diffusions_et_resume(self):
+        """Lues et diffusions anciennes supprimees, non lues resumees."""
+        lue_ancienne = self._notification(120, lu=True)
+        lue_recente = self._notification(5, lu=True)
+        non_lue_recente = self._notification(5)
+        for _ in range(3):
+            self._notification(45)
+        diffusion = self._notification(
+            120, utilisateur_cible=None, role_cible=UserRoles.GESTIONNAIRE
+        )
+        NotificationService.mark_read(self.gestionnaire, diffusion)
+
+        bilan = NotificationService.purge(
+            retention_days=90, digest_days=30, batch_size=2
+        )
+
+        self.assertEqual(
+            bilan,
+            {
+                "lues": 1,
+                "diffusions": 1,
+                "lectures": 1,
+                "regroupees": 3,
+                "resumes": 1,
+            },
+        )
+        restantes = set(Notification.objects.values_list("pk", flat=True))
+        self.assertNotIn(lue_ancienne.pk, restantes)
+        self.assertIn(lue_recente.pk, restantes)
+        self.assertIn(non_lue_recente.pk, restantes)
+        resume = Notification.objects.get(type="RESUME")
+        self.assertIn("3 notification(s)", resume.message)
+        self.assertEqual(NotificationService.unread_count(self.user), 2)
+
+        # Une seconde passe ne regroupe pas le resume
+        bilan = NotificationService.purge(retention_days=90, digest_days=30)
+        self.assertEqual(bilan["resumes"], 0)
+
+    def test_compteur_en_cache_invalide(self):
+        """Le compteur de non lues en cache suit le regroupement."""
+        self._notification(5)
+        for _ in range(3):
+            self._notification(45)
+        self.assertEqual(NotificationService.unread_count(self.user), 4)
+
+        NotificationService.purge(retention_days=90, digest_days=30)
+
+        # La recente et le resume
+        self.assertEqual(NotificationService.unread_count(self.user), 2)
+
+    def test_interruption_sans_perte_de_resume(self):
+        """Un arret entre deux lots laisse un resume des lots deja supprimes."""
+        for _ in range(3):
+            self._notification(45)
+        supprimer = QuerySet.delete
+        appels = []
+
+        def delete_puis_arret(queryset):
+            appels.append(queryset)
+            if len(appels) > 1:
+                raise RuntimeError("Processus arrete")
+            return supprimer(queryset)
+
+        with mock.patch.object(QuerySet, "delete", delete_puis_arret):
+            with self.assertRaises(RuntimeError):
+                NotificationService.purge(
+                    retention_days=90, digest_days=30, batch_size=2
+                )
+
+        resume = Notification.objects.get(type="RESUME")
+        self.assertIn("2 notification(s)", resume.message)
+        self.assertEqual(
+            Notification.objects.filter(utilisateur_cible=self.user).count(), 2
+        )
+
+    def test_commande(self):
+        """La commande affiche son bilan."""
+        self._notification(120, lu=True)
+        sortie = StringIO()
+        call_command("purge_notifications", "--une-fois", stdout=sortie)
+        self.assertIn("1 notifications lues supprimees", sortie.getvalue())
+
+
+@override_settings(EVENEMENTS_HEARTBEAT=0.05, EVENEMENTS_DUREE_MAX=5)
+class FluxTempsReelTestCase(TestCase):
+    """Tests de la publication des evenements et du flux SSE."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        cache.clear()
+        self.backplane = evenements.BackplaneMemoire()
+        patcher = mock.patch.object(evenements, "_backplane", self.backplane)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user("client_flux", password="pass")
+        UserProfile.objects.create(
+            user=self.user, full_name="Client", role=UserRoles.CLIENT
+        )
+        self.canal = evenements.canal_utilisateur(self.user.pk)
+
+    def _notifier(self, titre="Titre"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(
+                utilisateur_cible=self.user, type="INFO", titre=titre, message="M"
+            )
+
+    def test_notification_publiee_apres_commit(self):
+        """Une notification creee est poussee sur le canal du destinataire."""
+        notification = self._notifier()
+        (evenement,) = self.backplane.since([self.canal], 0)
+        self.assertEqual(evenement.type, "notification")
+        self.assertEqual(evenement.data["id"], notification.pk)
+
+    def test_changement_statut_publie(self):
+        """Une transition journalisee pousse le statut client du dossier."""
+        dossier = DossierCredit.objects.create(
+            client=self.user,
+            reference="DOS-FLUX-1",
+            produit="Credit",
+            montant=Decimal("100000.00"),
+            statut_agent=DossierStatutAgent.EN_COURS_ANALYSE,
+            statut_client=DossierStatutClient.EN_COURS_TRAITEMENT,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            JournalAction.objects.create(
+                dossier=dossier,
+                action="TRANSITION",
+                de_statut=DossierStatutAgent.NOUVEAU,
+                vers_statut=DossierStatutAgent.EN_COURS_ANALYSE,
+            )
+        (evenement,) = self.backplane.since([self.canal], 0)
+        self.assertEqual(evenement.type, "dossier")
+        self.assertEqual(evenement.data["reference"], "DOS-FLUX-1")
+
+    def test_reprise_last_event_id(self):
+        """Sans connexion longue (WSGI), seuls les evenements manques sont rendus."""
+        self._notifier("Premiere")
+        self._notifier("Seconde")
+        premier = self.backplane.since([self.canal], 0)[0]
+        self.client.force_login(self.user)
+
+        reponse = self.client.get(
+            reverse("client:evenements"), HTTP_LAST_EVENT_ID=str(premier.id)
+        )
+        contenu = reponse.content.decode()
+        self.assertEqual(reponse["Content-Type"], "text/event-stream")
+        self.assertNotIn("Premiere", contenu)
+        self.assertIn("Seconde", contenu)
+
+        # Premiere connexion: point de reprise sur le dernier evenement
+        reponse = self.client.get(reverse("client:evenements"))
+        self.assertIn(f"id: {premier.id + 1}", reponse.content.decode())
+
+    async def test_flux_asgi(self):
+        """Sous ASGI le flux reste ouvert: heartbeat puis evenement pousse."""
+        await self.async_client.aforce_login(self.user)
+        reponse = await self.async_client.get(reverse("client:evenements"))
+        flux = reponse.streaming_content
+        try:
+            self.assertTrue((await anext(flux)).startswith(b"retry:"))
+            self.assertTrue((await anext(flux)).startswith(b"id: "))
+            self.assertEqual(await anext(flux), b": ping\n\n")
+            evenements.publish(self.canal, "notification", {"titre": "Direct"})
+            morceau = await anext(flux)
+            while morceau == b": ping\n\n":
+                morceau = await anext(flux)
+            donnees = morceau.decode().split("data: ")[1]
+            self.assertEqual(json.loads(donnees)["titre"], "Direct")
+        finally:
+            await flux.aclose()
+
+
+@override_settings(EMAIL_OUTBOX_MAX_TENTATIVES=2, EMAIL_OUTBOX_BACKOFF=60)
+class EmailOutboxTestCase(TestCase):
+    """Tests de la boite d'envoi et du worker de livraison."""
+
+    def _mettre_en_file(self, nombre=3):
+        EmailService.enqueue(
+            [
+                EmailMessage("Sujet", "Corps", "no-reply@test.com", [f"u{i}@test.com"])
+                for i in range(nombre)
+            ]
+        )
+
+    def test_lot_sur_une_connexion(self):
+        """Le lot est envoye sur une seule connexion SMTP."""
+        self._mettre_en_file()
+        with mock.patch(
+            "suivi_demande.services.email_service.get_connection",
+            wraps=get_connection,
+        ) as connexion:
+            self.assertEqual(EmailService.process_pending(), (3, 0))
+        connexion.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(EmailSortant.objects.exclude(statut="ENVOYE").exists())
+        self.assertEqual(EmailService.process_pending(), (0, 0))
+
+    def test_retry_backoff_puis_echec_definitif(self):
+        """Echec: nouvel essai differe, puis ECHEC apres le maximum."""
+        self._mettre_en_file(1)
+        panne = mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=OSError("SMTP indisponible"),
+        )
+        with panne:
+            self.assertEqual(EmailService.process_pending(), (0, 1))
+            email = EmailSortant.objects.get()
+            self.assertEqual(email.statut, "EN_ATTENTE")
+            self.assertIn("SMTP indisponible", email.derniere_erreur)
+            self.assertGreater(email.prochaine_tentative, timezone.now())
+            # Pas encore echu
+            self.assertEqual(EmailService.process_pending(), (0, 0))
+
+            EmailSortant.objects.update(prochaine_tentative=timezone.now())
+            self.assertEqual(EmailService.process_pending(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.statut, "ECHEC")
+        self.assertEqual(email.tentatives, 2)
+
+    def test_envoi_apres_commit_sans_worker(self):
+        """Sans worker, les emails mis en file partent apres le commit."""
+        with override_settings(EMAIL_OUTBOX_WORKER=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                self._mettre_en_file(1)
+        self.assertEqual(len(mail.outbox), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._mettre_en_file(2)
+        # Seuls les emails de ce commit: la file du worker n'est pas videe
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(EmailSortant.objects.filter(statut="EN_ATTENTE").count(), 1)
+
+    def test_commande_envoyer_emails(self):
+        """La commande vide la file puis s'arrete avec --une-fois."""
+        self._mettre_en_file(2)
+        call_command("envoyer_emails", "--une-fois", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
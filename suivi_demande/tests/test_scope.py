@@ -0,0 +1,99 @@
+"""
+Tests du service de perimetre des dossiers par role.
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..models import (
+    DossierCredit,
+    DossierStatutAgent,
+    JournalAction,
+    UserProfile,
+    UserRoles,
+)
+from ..services.scope_service import ScopeService
+
+User = get_user_model()
+
+
+class ScopeServiceTestCase(TestCase):
+    """Tests des perimetres par role."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        cache.clear()
+        self.client_user = self._user("client_scope", UserRoles.CLIENT)
+        self.analyste = self._user("analyste_scope", UserRoles.ANALYSTE)
+        autre_client = User.objects.create_user("autre_scope", password="pass")
+
+        self.nouveau = self._dossier("DOS-SC-1", self.client_user, "NOUVEAU")
+        self.en_analyse = self._dossier(
+            "DOS-SC-2", autre_client, DossierStatutAgent.EN_COURS_ANALYSE
+        )
+        self.traite = self._dossier(
+            "DOS-SC-3", autre_client, DossierStatutAgent.REFUSE
+        )
+        JournalAction.objects.create(
+            dossier=self.traite, action="REFUS", acteur=self.analyste
+        )
+
+    def _user(self, username, role):
+        user = User.objects.create_user(username, password="pass")
+        UserProfile.objects.create(user=user, full_name=username, role=role)
+        return user
+
+    def _dossier(self, reference, client, statut):
+        return DossierCredit.objects.create(
+            client=client,
+            reference=reference,
+            produit="Credit",
+            montant=Decimal("1000000.00"),
+            statut_agent=statut,
+        )
+
+    def test_perimetre_traitement(self):
+        """Client: ses dossiers; analyste: dossiers en analyse."""
+        self.assertEqual(
+            list(ScopeService.get_queryset(self.client_user)), [self.nouveau]
+        )
+        self.assertEqual(
+            list(ScopeService.get_queryset(self.analyste)), [self.en_analyse]
+        )
+
+    def test_perimetre_rapport_analyste_historique(self):
+        """Analyste: dossiers traites (journal) ou detenus, via EXISTS."""
+        DossierCredit.objects.filter(pk=self.en_analyse.pk).update(
+            acteur_courant=self.analyste
+        )
+
+        qs = ScopeService.get_queryset(self.analyste, "rapport")
+
+        self.assertIn("EXISTS", str(qs.query).upper())
+        self.assertEqual(
+            set(qs.values_list("reference", flat=True)), {"DOS-SC-2", "DOS-SC-3"}
+        )
+        self.assertFalse(ScopeService.get_queryset(self.client_user, "rapport"))
+
+    def test_descripteur_en_cache(self):
+        """Le descripteur n'est calcule qu'une fois par utilisateur."""
+        ScopeService.get_descriptor(User.objects.get(pk=self.analyste.pk))
+
+        user = User.objects.get(pk=self.analyste.pk)
+        with self.assertNumQueries(0):
+            descripteur = ScopeService.get_descriptor(user)
+
+        self.assertEqual(descripteur["role"], UserRoles.ANALYSTE)
+
+    def test_changement_de_role_invalide_le_cache(self):
+        """Modifier le profil invalide le descripteur en cache."""
+        ScopeService.get_descriptor(self.analyste)
+
+        profile = self.analyste.profile
+        profile.role = UserRoles.SUPER_ADMIN
+        profile.save()
+
+        self.assertEqual(ScopeService.get_queryset(self.analyste).count(), 3)
@@ -3,11 +3,23 @@ Tests de securite de l'application.
 """
 
 import pytest
-from django.test import TestCase, Client
+from unittest import mock
+from django.test import TestCase, Client, RequestFactory
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.http import HttpResponse
 from django.urls import reverse
 from decimal import Decimal
 
+from core.cache import RATELIMIT
+from core.security import (
+    WINDOW_FIXED,
+    WINDOW_SLIDING,
+    get_rate_limit_stats,
+    rate_limit,
+)
+
 from ..models import DossierCredit, UserProfile, UserRoles
 
 User = get_user_model()
@@ -241,3 +253,71 @@ class FileUploadSecurityTestCase(TestCase):
 
         # Doit etre refuse
         # Verifier selon votre implementation
+
+
+@pytest.mark.security
+class RateLimitTestCase(TestCase):
+    """Tests du rate limiter atomique (core.security)."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        caches[RATELIMIT].clear()
+        self.factory = RequestFactory()
+
+    def _vue(self, prefix, limit, window=WINDOW_FIXED):
+        @rate_limit(prefix, limit=limit, period=60, window=window)
+        def vue(request):
+            return HttpResponse("ok")
+
+        return vue
+
+    def _requete(self):
+        request = self.factory.post("/login/", REMOTE_ADDR="10.0.0.1")
+        request.user = AnonymousUser()
+        return request
+
+    def test_fenetre_fixe_retry_after(self):
+        """Au-dela de la limite: 429 avec Retry-After dans la fenetre."""
+        vue = self._vue("test_fixe", limit=2)
+        with mock.patch("core.security.time.time", return_value=6000 + 15):
+            codes = [vue(self._requete()).status_code for _ in range(3)]
+            refus = vue(self._requete())
+        self.assertEqual(codes, [200, 200, 429])
+        self.assertEqual(refus["Retry-After"], "45")
+        # Nouvelle fenetre: compteur neuf, TTL non prolonge par les refus
+        with mock.patch("core.security.time.time", return_value=6060 + 1):
+            self.assertEqual(vue(self._requete()).status_code, 200)
+
+    def test_fenetre_glissante(self):
+        """Le compteur precedent pese selon la part de fenetre couverte."""
+        vue = self._vue("test_glissant", limit=4, window=WINDOW_SLIDING)
+        with mock.patch("core.security.time.time", return_value=6000 + 50):
+            for _ in range(4):
+                self.assertEqual(vue(self._requete()).status_code, 200)
+        # 15s dans la fenetre suivante: 4 * 0.75 = 3 requetes encore comptees
+        with mock.patch("core.security.time.time", return_value=6060 + 15):
+            self.assertEqual(vue(self._requete()).status_code, 200)
+            refus = vue(self._requete())
+        self.assertEqual(refus.status_code, 429)
+        self.assertEqual(refus["Retry-After"], "15")
+
+    def test_compteurs_monitoring_et_surcharge(self):
+        """Refus comptes par prefixe; politique surchargeable par settings."""
+        vue = self._vue("test_stats", limit=1)
+        politiques = {"test_stats": {"limit": 2, "period": 60}}
+        with self.settings(RATE_LIMIT_POLICIES=politiques):
+            codes = [vue(self._requete()).status_code for _ in range(4)]
+            stats = get_rate_limit_stats()["test_stats"]
+        self.assertEqual(codes, [200, 200, 429, 429])
+        self.assertEqual(stats["blocked"], 2)
+        self.assertEqual(stats["limit"], 2)
+
+    def test_cache_indisponible(self):
+        """Redis hors ligne (incr renvoie None): requete autorisee, avertissement."""
+        for window in (WINDOW_FIXED, WINDOW_SLIDING):
+            vue = self._vue(f"test_panne_{window}", limit=1, window=window)
+            with mock.patch.object(caches[RATELIMIT], "incr", return_value=None):
+                with mock.patch.object(caches[RATELIMIT], "add", return_value=None):
+                    with self.assertLogs("core.security", "WARNING"):
+                        codes = [vue(self._requete()).status_code for _ in range(3)]
+            self.assertEqual(codes, [200, 200, 200])
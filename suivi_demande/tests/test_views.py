@@ -2,6 +2,7 @@
 Tests des vues de l'application suivi_demande.
 """
 
+import gzip
 from decimal import Decimal
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
@@ -248,7 +249,7 @@ class NotificationsViewTestCase(TestCase):
 
         # Verifier qu'il y a 3 notifications
         notifications = response.context["notifications"]
-        self.assertEqual(notifications.count(), 3)
+        self.assertEqual(len(notifications), 3)
 
     def test_mark_all_read_fonctionne(self):
         """Test que marquer toutes les notifications comme lues fonctionne."""
@@ -363,3 +364,58 @@ class SignupViewTestCase(TestCase):
 
         # Verifier que l'utilisateur existe
         self.assertTrue(User.objects.filter(username="newuser").exists())
+
+
+class RapportsExportCsvTestCase(TestCase):
+    """Tests de l'export CSV streame des rapports."""
+
+    def setUp(self):
+        """Preparation des donnees de test."""
+        self.client = Client()
+        self.gest_user = User.objects.create_user(
+            username="gest_csv", password="testpass123"
+        )
+        UserProfile.objects.create(
+            user=self.gest_user, full_name="Gest CSV", role=UserRoles.GESTIONNAIRE
+        )
+        client_user = User.objects.create_user(
+            username="client_csv", password="testpass123"
+        )
+        for i in range(3):
+            DossierCredit.objects.create(
+                client=client_user,
+                reference=f"DOS-CSV-{i:03d}",
+                produit="Credit",
+                montant=Decimal("1000000.00"),
+            )
+        self.client.force_login(self.gest_user)
+
+    def test_export_csv_streame(self):
+        """Le CSV est streame avec en-tete et une ligne par dossier."""
+        response = self.client.get(reverse("pro:rapports_export_csv"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lignes = b"".join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lignes[0].startswith("reference,client,produit"))
+        self.assertEqual(len(lignes), 4)
+
+    def test_export_csv_gzip(self):
+        """Le CSV est compresse quand le client accepte gzip."""
+        response = self.client.get(
+            reverse("pro:rapports_export_csv"), HTTP_ACCEPT_ENCODING="gzip, deflate"
+        )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        contenu = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertEqual(contenu.count("DOS-CSV-"), 3)
+
+    def test_export_csv_gzip_refuse(self):
+        """gzip;q=0 est un refus: le CSV part en clair."""
+        for entete in ("gzip;q=0, deflate", "*;q=0", "br, GZIP ; q=0.0"):
+            response = self.client.get(
+                reverse("pro:rapports_export_csv"), HTTP_ACCEPT_ENCODING=entete
+            )
+            self.assertFalse(response.has_header("Content-Encoding"))
+            contenu = b"".join(response.streaming_content).decode()
+            self.assertEqual(contenu.count("DOS-CSV-"), 3)
@@ -3,18 +3,32 @@ Tests pour le workflow des dossiers de credit.
 """
 
 from decimal import Decimal
-from django.test import TestCase, Client
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from core import evenements
+from core.cache import KPI, get_cache
+
 from ..models import (
     DossierCredit,
     DossierStatutAgent,
     DossierStatutClient,
+    Notification,
     UserProfile,
     UserRoles,
     JournalAction,
 )
+from ..services.dossier_service import DossierService
+from ..services.transition_service import (
+    CommentaireRequis,
+    TransitionError,
+    TransitionService,
+)
 
 User = get_user_model()
 
@@ -174,3 +188,245 @@ class WorkflowTestCase(TestCase):
         self.assertEqual(
             actions[2].vers_statut, DossierStatutAgent.EN_COURS_VALIDATION_GGR
         )
+
+
+class TransitionServiceTestCase(TestCase):
+    """Tests de la machine a etats des transitions."""
+
+    def setUp(self):
+        self.client_user = User.objects.create_user(
+            username="client_tx", password="pass123", email="client@example.com"
+        )
+        UserProfile.objects.create(user=self.client_user, role=UserRoles.CLIENT)
+        self.gest_user = User.objects.create_user(
+            username="gest_tx", password="pass123"
+        )
+        UserProfile.objects.create(user=self.gest_user, role=UserRoles.GESTIONNAIRE)
+        self.analystes = []
+        for i in range(3):
+            analyste = User.objects.create_user(
+                username=f"analyste_tx{i}", email=f"analyste{i}@example.com"
+            )
+            UserProfile.objects.create(user=analyste, role=UserRoles.ANALYSTE)
+            self.analystes.append(analyste)
+        self.dossier = DossierCredit.objects.create(
+            client=self.client_user,
+            reference="DOS-TX-001",
+            produit="Credit",
+            montant=Decimal("1000000.00"),
+            statut_agent=DossierStatutAgent.NOUVEAU,
+        )
+
+    def test_flags_depuis_table(self):
+        """Les flags des templates sont derives de la table des transitions."""
+        flags = TransitionService.get_flags(
+            UserRoles.GESTIONNAIRE, DossierStatutAgent.NOUVEAU
+        )
+        self.assertTrue(flags["can_tx_transmettre_analyste"])
+        self.assertTrue(flags["can_tx_retour_client"])
+        self.assertFalse(flags["can_tx_approuver"])
+        self.assertFalse(
+            TransitionService.is_allowed(
+                UserRoles.ANALYSTE, "transmettre_analyste", DossierStatutAgent.NOUVEAU
+            )
+        )
+
+    def test_vue_transition(self):
+        """La vue applique la transition, journalise et notifie."""
+        self.client.force_login(self.gest_user)
+        url = reverse(
+            "pro:transition_dossier",
+            kwargs={"pk": self.dossier.pk, "action": "transmettre_analyste"},
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url)
+        self.assertRedirects(
+            response,
+            reverse("pro:dossier_detail", kwargs={"pk": self.dossier.pk}),
+            fetch_redirect_response=False,
+        )
+        self.dossier.refresh_from_db()
+        self.assertEqual(
+            self.dossier.statut_agent, DossierStatutAgent.TRANSMIS_ANALYSTE
+        )
+        self.assertEqual(
+            self.dossier.statut_client, DossierStatutClient.EN_COURS_TRAITEMENT
+        )
+        self.assertEqual(self.dossier.acteur_courant, self.gest_user)
+        journal = self.dossier.journal.get(action="TRANSITION")
+        self.assertEqual(journal.de_statut, DossierStatutAgent.NOUVEAU)
+        self.assertTrue(
+            Notification.objects.filter(utilisateur_cible=self.client_user).exists()
+        )
+
+    def test_transition_deja_appliquee(self):
+        """Une seconde application de la meme transition est refusee."""
+        TransitionService.apply(self.dossier.pk, "transmettre_analyste", self.gest_user)
+        with self.assertRaises(TransitionError):
+            TransitionService.apply(
+                self.dossier.pk, "transmettre_analyste", self.gest_user
+            )
+        self.assertEqual(self.dossier.journal.filter(action="TRANSITION").count(), 1)
+
+    def test_commentaire_requis(self):
+        """Le retour client exige un motif."""
+        with self.assertRaises(CommentaireRequis):
+            TransitionService.apply(self.dossier.pk, "retour_client", self.gest_user)
+        self.dossier.refresh_from_db()
+        self.assertEqual(self.dossier.statut_agent, DossierStatutAgent.NOUVEAU)
+
+    def _compter_requetes(self):
+        dossier = DossierCredit.objects.create(
+            client=self.client_user,
+            reference=f"DOS-TX-{DossierCredit.objects.count() + 1:03d}",
+            produit="Credit",
+            montant=Decimal("1000.00"),
+            statut_agent=DossierStatutAgent.NOUVEAU,
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            TransitionService.apply(dossier.pk, "transmettre_analyste", self.gest_user)
+        return len([q for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]])
+
+    @override_settings(NOTIFICATIONS_DIFFUSION_ROLE=False)
+    def test_cout_independant_de_l_equipe(self):
+        """Le nombre de requetes ne depend pas du nombre de destinataires."""
+        avant = self._compter_requetes()
+        for i in range(3, 8):
+            analyste = User.objects.create_user(
+                username=f"analyste_tx{i}", email=f"analyste{i}@example.com"
+            )
+            UserProfile.objects.create(user=analyste, role=UserRoles.ANALYSTE)
+        self.assertEqual(self._compter_requetes(), avant)
+        self.assertLessEqual(avant, 8)
+
+    def test_transition_statut_concurrente(self):
+        """transition_statut echoue si le statut a change depuis la lecture."""
+        copie = DossierCredit.objects.get(pk=self.dossier.pk)
+        self.assertTrue(
+            DossierService.transition_statut(
+                self.dossier, DossierStatutAgent.TRANSMIS_ANALYSTE, self.gest_user
+            )
+        )
+        self.assertFalse(
+            DossierService.transition_statut(
+                copie, DossierStatutAgent.REFUSE, self.gest_user
+            )
+        )
+        self.dossier.refresh_from_db()
+        self.assertEqual(
+            self.dossier.statut_agent, DossierStatutAgent.TRANSMIS_ANALYSTE
+        )
+
+
+class TransitionLotTestCase(TestCase):
+    """Tests des transitions en lot (back-office)."""
+
+    def setUp(self):
+        self.client_user = User.objects.create_user(
+            username="client_lot", email="client_lot@example.com"
+        )
+        UserProfile.objects.create(user=self.client_user, role=UserRoles.CLIENT)
+        self.boe_user = User.objects.create_user(username="boe_lot")
+        UserProfile.objects.create(user=self.boe_user, role=UserRoles.BOE)
+        self.dossiers = [self._dossier() for _ in range(3)]
+        self.refuse = self._dossier(DossierStatutAgent.REFUSE)
+
+    def _dossier(self, statut=DossierStatutAgent.APPROUVE_ATTENTE_FONDS):
+        return DossierCredit.objects.create(
+            client=self.client_user,
+            reference=f"DOS-LOT-{DossierCredit.objects.count() + 1:03d}",
+            produit="Credit",
+            montant=Decimal("1000.00"),
+            statut_agent=statut,
+        )
+
+    def test_lot_applique_et_ignore(self):
+        """Les dossiers eligibles passent, les autres sont ignores."""
+        ids = [dossier.pk for dossier in self.dossiers] + [self.refuse.pk, 999999]
+        resultat = TransitionService.apply_many(ids, "liberer_fonds", self.boe_user)
+        self.assertEqual(len(resultat["appliques"]), 3)
+        self.assertEqual(resultat["ignores"], sorted([self.refuse.pk, 999999]))
+        self.assertEqual(
+            DossierCredit.objects.filter(
+                statut_agent=DossierStatutAgent.FONDS_LIBERE,
+                statut_client=DossierStatutClient.TERMINE,
+                acteur_courant=self.boe_user,
+            ).count(),
+            3,
+        )
+        self.assertEqual(
+            JournalAction.objects.filter(action="LIBERATION_FONDS").count(), 3
+        )
+        self.assertEqual(
+            Notification.objects.filter(utilisateur_cible=self.client_user).count(), 3
+        )
+        self.refuse.refresh_from_db()
+        self.assertEqual(self.refuse.statut_agent, DossierStatutAgent.REFUSE)
+
+    def test_cout_independant_du_lot(self):
+        """Le nombre de requetes ne depend pas de la taille du lot."""
+
+        def compter(dossiers):
+            with CaptureQueriesContext(connection) as ctx:
+                TransitionService.apply_many(
+                    [dossier.pk for dossier in dossiers], "liberer_fonds", self.boe_user
+                )
+            return len(
+                [q for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+            )
+
+        petit = compter(self.dossiers[:1])
+        grand = compter(self.dossiers[1:] + [self._dossier() for _ in range(10)])
+        self.assertEqual(petit, grand)
+
+    def test_caches_et_flux_apres_commit(self):
+        """UPDATE sans post_save: graphiques invalides et statuts publies."""
+        get_cache(KPI).set("analytics:graphiques", {"donnees": 1})
+        with mock.patch.object(evenements, "publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                TransitionService.apply_many(
+                    [dossier.pk for dossier in self.dossiers],
+                    "liberer_fonds",
+                    self.boe_user,
+                )
+        self.assertIsNone(get_cache(KPI).get("analytics:graphiques"))
+        statuts = [
+            appel.args[2]["statut"]
+            for appel in publish.call_args_list
+            if appel.args[1] == "dossier"
+        ]
+        self.assertEqual(statuts, [DossierStatutClient.TERMINE] * 3)
+
+    def test_role_non_autorise(self):
+        """Un role qui ne peut pas declencher l'action est refuse."""
+        with self.assertRaises(TransitionError):
+            TransitionService.apply_many(
+                [self.dossiers[0].pk], "approuver", self.boe_user
+            )
+
+    def test_vue_lot(self):
+        """La vue renvoie les references traitees et les dossiers ignores."""
+        self.client.force_login(self.boe_user)
+        url = reverse("pro:transition_lot", kwargs={"action": "liberer_fonds"})
+        response = self.client.post(
+            url, {"dossiers": [self.dossiers[0].pk, self.refuse.pk]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "success": True,
+                "appliques": [self.dossiers[0].reference],
+                "ignores": [self.refuse.pk],
+            },
+        )
+        response = self.client.post(url, {"dossiers": ["abc"]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bouton_lot_limite_a_la_page(self):
+        """Le bouton du dashboard BOE annonce les seuls dossiers de la page."""
+        self.client.force_login(self.boe_user)
+        response = self.client.get(reverse("pro:dashboard"))
+        nombre = len(response.context["dossiers"])
+        self.assertContains(response, f"Libérer les fonds de cette page ({nombre})")
+        self.assertNotContains(response, "Libérer tous les fonds")
@@ -29,6 +29,11 @@ urlpatterns = [
         views.transition_dossier,
         name="transition_dossier",
     ),
+    path(
+        "dossiers/<str:action>/transition/",
+        views.transition_lot,
+        name="transition_lot",
+    ),
     path(
         "dossier/<int:pk>/transmettre-analyste/",
         views.transmettre_analyste_page,
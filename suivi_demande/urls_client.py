@@ -47,4 +47,5 @@ urlpatterns = [
         views.notifications_mark_read,
         name="notifications_mark_read",
     ),
+    path("evenements/", views.notifications_stream, name="evenements"),
 ]
@@ -44,6 +44,11 @@ urlpatterns = [
         views.transition_dossier,
         name="transition_dossier",
     ),
+    path(
+        "dossiers/<str:action>/transition/",
+        views.transition_lot,
+        name="transition_lot",
+    ),
     # Gestion des utilisateurs (admin/gestionnaire)
     path(
         "utilisateur/<int:user_id>/toggle-status/",
@@ -78,8 +83,14 @@ urlpatterns = [
     ),
     # Rapports et analytics
     path("rapports/", views_portals.reports_redirect, name="reports"),
+    path(
+        "rapports/export-csv/",
+        views_portals.rapports_export_csv,
+        name="rapports_export_csv",
+    ),
     # Notifications
     path("notifications/", views.notifications_list, name="notifications"),
     path("notifications/marquer-tout-lu/", views.notifications_mark_all_read, name="notifications_mark_all"),
     path("notifications/<int:pk>/marquer-lu/", views.notifications_mark_read, name="notifications_mark_read"),
+    path("evenements/", views.notifications_stream, name="evenements"),
 ]
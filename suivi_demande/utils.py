@@ -7,9 +7,10 @@ from typing import Iterable, Optional
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage
 
 from .models import Notification, DossierCredit, UserRoles
+from .services.email_service import EmailService
 
 User = get_user_model()
 
@@ -27,6 +28,7 @@ def notify(
     Returns number of notifications created.
     """
     count = 0
+    emails = []
     for u in users:
         Notification.objects.create(
             utilisateur_cible=u,
@@ -37,17 +39,16 @@ def notify(
         )
         count += 1
         if email and getattr(u, "email", None):
-            try:
-                send_mail(
+            emails.append(
+                EmailMessage(
                     subject=titre,
-                    message=message,
+                    body=message,
                     from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
-                    recipient_list=[u.email],
-                    fail_silently=True,
+                    to=[u.email],
                 )
-            except Exception:
-                # Ignore email failures in MVP
-                pass
+            )
+    if emails:
+        EmailService.enqueue(emails)
     return count
 
 
@@ -60,6 +61,32 @@ def get_current_namespace(request):
     return "client" if portal_type == "CLIENT" else "pro"
 
 
+def accepts_gzip(request) -> bool:
+    """
+    Verifie si l'en-tete Accept-Encoding autorise gzip. Contrairement a une
+    simple recherche de sous-chaine, `gzip;q=0` est un refus explicite et
+    `*` couvre gzip lorsqu'il n'est pas cite.
+    """
+    qualites = {}
+    for element in request.headers.get("Accept-Encoding", "").split(","):
+        codage, _, parametres = element.partition(";")
+        codage = codage.strip().lower()
+        if not codage:
+            continue
+        qualite = 1.0
+        for parametre in parametres.split(";"):
+            cle, _, valeur = parametre.partition("=")
+            if cle.strip().lower() == "q":
+                try:
+                    qualite = float(valeur)
+                except ValueError:
+                    qualite = 0.0
+        qualites[codage] = qualite
+    if "gzip" in qualites:
+        return qualites["gzip"] > 0
+    return qualites.get("*", 0) > 0
+
+
 # --- Utilitaires de gestion des roles ---
 
 
@@ -7,7 +7,7 @@ Organisation modulaire :
 - dossier.py       : Detail, liste, creation de dossiers
 - workflow.py      : Transitions d'etat du workflow
 - wizard.py        : Wizard de demande de credit (4 etapes)
-- notifications.py : Gestion des notifications
+- notifications.py : Gestion des notifications (liste, flux temps reel)
 - admin.py         : Administration des utilisateurs
 - helpers.py       : Fonctions utilitaires partagees
 """
@@ -27,7 +27,7 @@ from .dossier import (
 )
 
 # Workflow
-from .workflow import transition_dossier, transmettre_analyste_page
+from .workflow import transition_dossier, transition_lot, transmettre_analyste_page
 
 # Wizard (demande de credit)
 from .wizard import (
@@ -44,6 +44,7 @@ from .notifications import (
     notifications_list,
     notifications_mark_all_read,
     notifications_mark_read,
+    notifications_stream,
 )
 
 # Administration
@@ -62,6 +63,7 @@ __all__ = [
     "test_dossiers_list",
     # Workflow
     "transition_dossier",
+    "transition_lot",
     "transmettre_analyste_page",
     # Wizard
     "demande_start",
@@ -74,6 +76,7 @@ __all__ = [
     "notifications_list",
     "notifications_mark_all_read",
     "notifications_mark_read",
+    "notifications_stream",
     # Admin
     "admin_users",
     "admin_change_role",
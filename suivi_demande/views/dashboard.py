@@ -111,7 +111,10 @@ def _dashboard_client(request):
 def _dashboard_gestionnaire(request):
     """Dashboard pour le role GESTIONNAIRE."""
     page = DossierService.get_dossiers_for_user(
-        user=request.user, page=request.GET.get("page", 1), per_page=50
+        user=request.user,
+        page=request.GET.get("page", 1),
+        per_page=50,
+        include=["client"],
     )
     stats = DossierService.get_statistics_for_role(request.user)
 
@@ -188,7 +191,10 @@ def _dashboard_gestionnaire(request):
 def _dashboard_analyste(request):
     """Dashboard pour le role ANALYSTE."""
     page = DossierService.get_dossiers_for_user(
-        user=request.user, page=request.GET.get("page", 1), per_page=30
+        user=request.user,
+        page=request.GET.get("page", 1),
+        per_page=30,
+        include=["client", "last_action"],
     )
 
     dossiers = list(page.object_list)
@@ -233,7 +239,10 @@ def _dashboard_analyste(request):
 def _dashboard_responsable_ggr(request):
     """Dashboard pour le role RESPONSABLE_GGR."""
     page = DossierService.get_dossiers_for_user(
-        user=request.user, page=request.GET.get("page", 1), per_page=30
+        user=request.user,
+        page=request.GET.get("page", 1),
+        per_page=30,
+        include=["client"],
     )
     dossiers = list(page.object_list)
 
@@ -266,7 +275,10 @@ def _dashboard_responsable_ggr(request):
 def _dashboard_boe(request):
     """Dashboard pour le role BOE."""
     page = DossierService.get_dossiers_for_user(
-        user=request.user, page=request.GET.get("page", 1), per_page=30
+        user=request.user,
+        page=request.GET.get("page", 1),
+        per_page=30,
+        include=["client"],
     )
     dossiers = list(page.object_list)
     stats = DossierService.get_statistics_for_role(request.user)
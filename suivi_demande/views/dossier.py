@@ -8,19 +8,18 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.db.models import Q
 from django.shortcuts import render, redirect, get_object_or_404
 
 from ..constants import ITEMS_PER_PAGE
 from ..models import (
     DossierCredit,
     UserRoles,
-    Notification,
     PieceJointe,
     Commentaire,
     JournalAction,
 )
 from ..permissions import can_upload_piece, get_transition_flags
+from ..services.notification_service import NotificationService
 from ..utils import get_current_namespace
 
 logger = logging.getLogger("suivi_demande")
@@ -63,14 +62,7 @@ def dossier_detail(request, pk):
 
     # Marquer les notifications liees au dossier comme lues
     try:
-        Notification.objects.filter(
-            utilisateur_cible=request.user,
-            lu=False,
-        ).filter(
-            Q(dossier=dossier)
-            | Q(titre__icontains=dossier.reference)
-            | Q(message__icontains=dossier.reference)
-        ).update(lu=True)
+        NotificationService.mark_all_read(request.user, dossier=dossier)
     except Exception:
         pass
 
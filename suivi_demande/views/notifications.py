@@ -2,13 +2,21 @@
 Vues de gestion des notifications utilisateur.
 """
 
+import asyncio
 import logging
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 
-from ..models import Notification
+from core import evenements
+
+from ..services.notification_service import NotificationService
+from ..services.scope_service import ScopeService
 from ..utils import get_current_namespace
 
 logger = logging.getLogger("suivi_demande")
@@ -16,20 +24,32 @@ logger = logging.getLogger("suivi_demande")
 
 @login_required
 def notifications_list(request):
-    """Liste des notifications de l'utilisateur connecte."""
-    qs = Notification.objects.filter(utilisateur_cible=request.user).order_by(
-        "-created_at"
+    """
+    Liste des notifications de l'utilisateur connecte, paginee par curseur
+    (?avant=<curseur>): chaque page est une lecture d'index bornee.
+    """
+    curseur = request.GET.get("avant")
+    try:
+        notifications, suivant = NotificationService.page(request.user, curseur)
+    except ValueError:
+        curseur = None
+        notifications, suivant = NotificationService.page(request.user)
+    return render(
+        request,
+        "suivi_demande/notifications.html",
+        {
+            "notifications": notifications,
+            "curseur_suivant": suivant,
+            "premiere_page": not curseur,
+        },
     )
-    return render(request, "suivi_demande/notifications.html", {"notifications": qs})
 
 
 @login_required
 def notifications_mark_all_read(request):
     """Marquer toutes les notifications comme lues."""
     if request.method == "POST":
-        Notification.objects.filter(utilisateur_cible=request.user, lu=False).update(
-            lu=True
-        )
+        NotificationService.mark_all_read(request.user)
         messages.success(request, "Toutes vos notifications ont ete marquees comme lues.")
     namespace = get_current_namespace(request)
     return redirect(f"{namespace}:notifications")
@@ -39,10 +59,8 @@ def notifications_mark_all_read(request):
 def notifications_mark_read(request, pk: int):
     """Marquer une notification specifique comme lue."""
     if request.method == "POST":
-        notif = get_object_or_404(Notification, pk=pk, utilisateur_cible=request.user)
-        if not notif.lu:
-            notif.lu = True
-            notif.save(update_fields=["lu"])
+        notif = get_object_or_404(NotificationService.visible(request.user), pk=pk)
+        NotificationService.mark_read(request.user, notif)
         namespace = get_current_namespace(request)
         next_url = request.POST.get("next")
         if next_url:
@@ -50,3 +68,72 @@ def notifications_mark_read(request, pk: int):
         return redirect(f"{namespace}:notifications")
     namespace = get_current_namespace(request)
     return redirect(f"{namespace}:notifications")
+
+
+@login_required
+async def notifications_stream(request):
+    """
+    Flux temps reel (Server-Sent Events) des notifications et changements de
+    statut de l'utilisateur connecte.
+    Sous ASGI la connexion reste ouverte (heartbeat) pendant
+    EVENEMENTS_DUREE_MAX, puis le navigateur se reconnecte avec Last-Event-ID
+    et recoit les evenements manques. Sous WSGI la reponse ne contient que
+    ces evenements manques (reconnexion apres EVENEMENTS_RETRY).
+    """
+    user = await request.auser()
+    descripteur = await sync_to_async(ScopeService.get_descriptor)(user)
+    canaux = [evenements.canal_utilisateur(user.pk)]
+    if descripteur["role"]:
+        canaux.append(evenements.canal_role(descripteur["role"]))
+    try:
+        dernier_id = int(request.headers["Last-Event-ID"])
+    except (KeyError, ValueError):
+        dernier_id = None
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(
+            _flux_evenements(canaux, dernier_id), content_type="text/event-stream"
+        )
+    else:
+        lignes, _ = await _reprise(canaux, dernier_id)
+        response = HttpResponse(
+            _entete_flux() + "".join(lignes), content_type="text/event-stream"
+        )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # pas de tampon cote proxy (nginx)
+    return response
+
+
+async def _flux_evenements(canaux, dernier_id):
+    yield _entete_flux()
+    # Abonnement avant la reprise: aucun evenement perdu entre les deux
+    async with evenements.get_backplane().subscribe(canaux) as abonnement:
+        lignes, rejoues = await _reprise(canaux, dernier_id)
+        for ligne in lignes:
+            yield ligne
+        loop = asyncio.get_running_loop()
+        fin = loop.time() + settings.EVENEMENTS_DUREE_MAX
+        while (reste := fin - loop.time()) > 0:
+            evenement = await abonnement.get(min(settings.EVENEMENTS_HEARTBEAT, reste))
+            if evenement is None:
+                yield ": ping\n\n"
+            elif evenement.id not in rejoues:
+                yield evenement.to_sse()
+
+
+async def _reprise(canaux, dernier_id):
+    """
+    Evenements publies depuis `dernier_id`; sans Last-Event-ID, fixe le point
+    de reprise de la prochaine reconnexion a l'evenement courant.
+    Retourne (lignes SSE, ids rejoues).
+    """
+    backplane = evenements.get_backplane()
+    if dernier_id is None:
+        courant = await sync_to_async(backplane.last_id)()
+        return [f"id: {courant}\n\n"], set()
+    manques = await sync_to_async(backplane.since)(canaux, dernier_id)
+    return [evenement.to_sse() for evenement in manques], {e.id for e in manques}
+
+
+def _entete_flux():
+    return f"retry: {settings.EVENEMENTS_RETRY}\n\n"
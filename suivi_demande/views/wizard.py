@@ -15,7 +15,7 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives
 from django.shortcuts import render, redirect, get_object_or_404
 from django.template.loader import render_to_string
 from django.templatetags.static import static
@@ -32,6 +32,8 @@ from ..models import (
     PieceJointe,
     CanevasProposition,
 )
+from ..services.email_service import EmailService
+from ..services.reference_service import ReferenceService
 from ..utils import get_current_namespace
 from .helpers import serialize_form_data
 
@@ -496,8 +498,6 @@ def _create_dossier_from_wizard(request, data, cleaned_data):
     except Exception:
         montant = Decimal("0")
 
-    ref = f"DOS-{timezone.now().strftime('%Y%m%d%H%M%S')}-{request.user.id}"
-
     # Determiner le client
     client_user = request.user
     try:
@@ -511,7 +511,7 @@ def _create_dossier_from_wizard(request, data, cleaned_data):
 
     dossier = DossierCredit.objects.create(
         client=client_user,
-        reference=ref,
+        reference=ReferenceService.allocate(),
         produit="credit",
         montant=montant,
         statut_agent=DossierStatutAgent.NOUVEAU,
@@ -674,13 +674,14 @@ def _notify_wizard_completion(request, dossier):
             except Exception:
                 html_message = None
 
-            send_mail(
+            email = EmailMultiAlternatives(
                 subject=subject,
-                message=text_message,
+                body=text_message,
                 from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[request.user.email],
-                fail_silently=True,
-                html_message=html_message,
+                to=[request.user.email],
             )
+            if html_message:
+                email.attach_alternative(html_message, "text/html")
+            EmailService.enqueue([email])
     except Exception:
         logger.exception("Erreur notification apres creation wizard")
@@ -10,11 +10,10 @@ from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 from .models import (
-    DossierCredit,
-    DossierStatutAgent,
     UserRoles,
     UserProfile,
 )
+from .services.scope_service import ScopeService
 
 User = get_user_model()
 
@@ -271,6 +270,14 @@ def admin_create_user(request):
 # ==========================================
 
 
+TITRES_RAPPORT = {
+    UserRoles.CLIENT: "Mes Dossiers",
+    UserRoles.ANALYSTE: "Dossiers e  Analyser",
+    UserRoles.RESPONSABLE_GGR: "Dossiers e  Valider",
+    UserRoles.BOE: "Dossiers e  Liberer",
+}
+
+
 @login_required
 def generate_report(request):
     """Generer un rapport selon le role"""
@@ -282,37 +289,9 @@ def generate_report(request):
     statut = request.GET.get("statut")
     periode = request.GET.get("periode")
 
-    # Filtrer selon le role
-    if role == UserRoles.CLIENT:
-        dossiers = DossierCredit.objects.filter(client=request.user)
-        titre = "Mes Dossiers"
-    elif role == UserRoles.GESTIONNAIRE:
-        dossiers = DossierCredit.objects.all()
-        titre = "Tous les Dossiers"
-    elif role == UserRoles.ANALYSTE:
-        dossiers = DossierCredit.objects.filter(
-            statut_agent__in=[
-                DossierStatutAgent.TRANSMIS_ANALYSTE,
-                DossierStatutAgent.EN_COURS_ANALYSE,
-            ]
-        )
-        titre = "Dossiers e  Analyser"
-    elif role == UserRoles.RESPONSABLE_GGR:
-        dossiers = DossierCredit.objects.filter(
-            statut_agent__in=[
-                DossierStatutAgent.EN_COURS_VALIDATION_GGR,
-                DossierStatutAgent.EN_ATTENTE_DECISION_DG,
-            ]
-        )
-        titre = "Dossiers e  Valider"
-    elif role == UserRoles.BOE:
-        dossiers = DossierCredit.objects.filter(
-            statut_agent=DossierStatutAgent.APPROUVE_ATTENTE_FONDS
-        )
-        titre = "Dossiers e  Liberer"
-    else:  # SUPER_ADMIN
-        dossiers = DossierCredit.objects.all()
-        titre = "Tous les Dossiers"
+    # Filtrer selon le role (meme perimetre que les files de travail)
+    dossiers = ScopeService.get_queryset(request.user, "traitement")
+    titre = TITRES_RAPPORT.get(role, "Tous les Dossiers")
 
     # Filtres de date
     if date_debut:
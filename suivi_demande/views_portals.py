@@ -8,11 +8,12 @@ from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, render
 from django.conf import settings
-from django.db import models
 from django.views.decorators.http import require_GET
 from datetime import datetime
 
 from .models import UserRoles
+from .services.lead_time_service import LeadTimeService
+from .services.scope_service import ScopeService
 from core.security import rate_limit
 
 
@@ -148,7 +149,6 @@ def view_documents(request, dossier_id):
 @login_required
 def all_dossiers_view(request):
     """Vue de tous les dossiers pour les professionnels avec pagination"""
-    from .models import DossierCredit, UserRoles
     from django.core.paginator import Paginator
     from .constants import ITEMS_PER_PAGE
 
@@ -156,23 +156,8 @@ def all_dossiers_view(request):
     profile = getattr(request.user, "profile", None)
     role = getattr(profile, "role", None)
 
-    # Filtrer selon le role
-    if role == UserRoles.GESTIONNAIRE:
-        dossiers_list = DossierCredit.objects.filter(
-            statut_agent__in=["NOUVEAU", "INCOMPLET"]
-        )
-    elif role == UserRoles.ANALYSTE:
-        dossiers_list = DossierCredit.objects.filter(
-            statut_agent__in=["TRANSMIS_ANALYSTE", "EN_COURS_ANALYSE"]
-        )
-    elif role == UserRoles.RESPONSABLE_GGR:
-        dossiers_list = DossierCredit.objects.filter(
-            statut_agent__in=["EN_COURS_VALIDATION_GGR", "EN_ATTENTE_DECISION_DG"]
-        )
-    elif role == UserRoles.BOE:
-        dossiers_list = DossierCredit.objects.filter(statut_agent="APPROUVE_ATTENTE_FONDS")
-    else:  # SUPER_ADMIN
-        dossiers_list = DossierCredit.objects.all()
+    # Filtrer selon le role (dossiers a prendre en charge)
+    dossiers_list = ScopeService.get_queryset(request.user, "file")
 
     dossiers_list = dossiers_list.select_related('client', 'acteur_courant').order_by("-date_soumission")
 
@@ -195,35 +180,9 @@ def all_dossiers_view(request):
 @require_GET
 def reports_view(request):
     """Vue des rapports pour les professionnels (filtres par utilisateur connecte)"""
-    from .models import DossierCredit, UserRoles, JournalAction
+    from .models import UserRoles, JournalAction
     from django.db.models import Count, Sum
 
-    # Determiner le perimetre de l'utilisateur selon son role
-    def _scope_queryset_par_role(user):
-        profile = getattr(user, "profile", None)
-        role = getattr(profile, "role", None)
-
-        if role == UserRoles.CLIENT:
-            # Interdit cote portail pro
-            return DossierCredit.objects.none()
-
-        if role == UserRoles.GESTIONNAIRE:
-            # Gestionnaire: vue globale (pilotage)
-            return DossierCredit.objects.all()
-
-        if role == UserRoles.ANALYSTE:
-            dossier_ids = (
-                JournalAction.objects.filter(acteur=user)
-                .values_list("dossier_id", flat=True)
-                .distinct()
-            )
-            return DossierCredit.objects.filter(
-                (models.Q(id__in=dossier_ids)) | (models.Q(acteur_courant=user))
-            )
-
-        # RESPONSABLE_GGR / BOE / SUPER_ADMIN -> tout le perimetre
-        return DossierCredit.objects.all()
-
     # Controle d'acces: roles autorises (detection robuste du role)
     def get_user_role(user):
         role = getattr(getattr(user, "profile", None), "role", None)
@@ -248,7 +207,7 @@ def reports_view(request):
         messages.error(request, "Acces non autorise e  la page Rapports.")
         return redirect("pro:dashboard")
 
-    qs = _scope_queryset_par_role(request.user)
+    qs = ScopeService.get_queryset(request.user, "rapport")
 
     # Ajustement de perimetre specifique au role BOE: dossiers pertinents pour la liberation des fonds
     if user_role == UserRoles.BOE:
@@ -322,35 +281,7 @@ def reports_view(request):
         rework_count = 0
 
     # Lead time moyen (jours): soumission -> 1er statut final
-    lead_time_sum = 0.0
-    lead_time_n = 0
-    try:
-        dossier_ids = list(qs.values_list("id", "date_soumission"))
-        if dossier_ids:
-            # map id -> date_soumission
-            submit_map = {did: ds for did, ds in dossier_ids}
-            finals_qs = (
-                JournalAction.objects.filter(
-                    dossier_id__in=submit_map.keys(), vers_statut__in=finals
-                )
-                .order_by("dossier_id", "timestamp")
-                .values("dossier_id", "timestamp")
-            )
-            seen = set()
-            for row in finals_qs:
-                did = row["dossier_id"]
-                if did in seen:
-                    continue
-                seen.add(did)
-                ts_final = row["timestamp"]
-                dt_submit = submit_map.get(did)
-                if dt_submit and ts_final and ts_final > dt_submit:
-                    delta = ts_final - dt_submit
-                    lead_time_sum += delta.total_seconds() / 86400.0
-                    lead_time_n += 1
-    except Exception:
-        pass
-    lead_time_avg_days = round(lead_time_sum / lead_time_n, 2) if lead_time_n else 0.0
+    lead_time_avg_days = LeadTimeService.average_days_to_final(qs)
 
     kpis = {
         "processed_count": processed_count,
@@ -387,45 +318,11 @@ def reports_view(request):
     }
 
     # 3. Lead time par gestionnaire (histogramme) - top 10
-    try:
-        from django.db.models import Avg
-
-        lead_by_manager = []
-        # Recuperer les gestionnaires avec dossiers
-        managers_qs = (
-            qs.exclude(acteur_courant__isnull=True)
-            .values("acteur_courant__username")
-            .annotate(nb=Count("id"))
-            .filter(nb__gt=0)
-            .order_by("-nb")[:10]
-        )
-        manager_names = [m["acteur_courant__username"] for m in managers_qs]
-
-        # Calculer lead time moyen par gestionnaire (approximation simple)
-        for mgr in manager_names:
-            mgr_dossiers = qs.filter(
-                acteur_courant__username=mgr, statut_agent__in=finals
-            )
-            if mgr_dossiers.exists():
-                # Approximation: utiliser date_maj - date_soumission
-                avg_days = 0
-                count = 0
-                for d in mgr_dossiers:
-                    if d.date_maj and d.date_soumission:
-                        delta = (d.date_maj - d.date_soumission).total_seconds() / 86400
-                        avg_days += delta
-                        count += 1
-                if count > 0:
-                    lead_by_manager.append(
-                        {"manager": mgr, "avg_days": round(avg_days / count, 1)}
-                    )
-
-        chart_lead_time = {
-            "labels": [m["manager"] for m in lead_by_manager],
-            "data": [m["avg_days"] for m in lead_by_manager],
-        }
-    except Exception:
-        chart_lead_time = {"labels": [], "data": []}
+    lead_by_manager = LeadTimeService.average_days_by_actor(qs, limit=10)
+    chart_lead_time = {
+        "labels": [m["manager"] for m in lead_by_manager],
+        "data": [m["avg_days"] for m in lead_by_manager],
+    }
 
     charts_data = {
         "monthly": chart_monthly,
@@ -447,73 +344,37 @@ def reports_view(request):
 
 @login_required
 def rapports_export_csv(request):
-    """Export CSV des dossiers selon le perimetre et les filtres de periode."""
-    from .models import DossierCredit, UserRoles, JournalAction
-    import csv
-    from django.http import HttpResponse
+    """
+    Export CSV des dossiers selon le perimetre et les filtres de periode.
+    Le fichier est streame par blocs (curseur serveur), compresse en gzip si
+    le client l'accepte. Acces direct ou scripts: le bouton de la page des
+    rapports passe par l'export en arriere-plan (analytics:api_creer_export,
+    type CSV_DOSSIERS).
+    """
+    from analytics.services import ExportService
+    from django.http import StreamingHttpResponse
+    from django.utils.cache import patch_vary_headers
+    from django.utils.text import compress_sequence
 
-    # meme perimetre que reports_view
-    def _scope_queryset_par_role(user):
-        profile = getattr(user, "profile", None)
-        role = getattr(profile, "role", None)
-        if role == UserRoles.CLIENT:
-            return DossierCredit.objects.none()
-        if role == UserRoles.GESTIONNAIRE:
-            return DossierCredit.objects.all()
-        if role == UserRoles.ANALYSTE:
-            dossier_ids = (
-                JournalAction.objects.filter(acteur=user)
-                .values_list("dossier_id", flat=True)
-                .distinct()
-            )
-            return DossierCredit.objects.filter(
-                (models.Q(id__in=dossier_ids)) | (models.Q(acteur_courant=user))
-            )
-        return DossierCredit.objects.all()
+    from .utils import accepts_gzip
 
-    qs = _scope_queryset_par_role(request.user).select_related("client")
+    # meme perimetre que reports_view
+    qs = ExportService.dossiers_rapport(
+        request.user,
+        date_debut=request.GET.get("date_debut"),
+        date_fin=request.GET.get("date_fin"),
+    )
 
-    # filtres periode
-    date_debut = request.GET.get("date_debut")
-    date_fin = request.GET.get("date_fin")
-    try:
-        if date_debut:
-            dt_start = datetime.fromisoformat(date_debut)
-            qs = qs.filter(date_soumission__gte=dt_start)
-        if date_fin:
-            dt_end = datetime.fromisoformat(date_fin)
-            qs = qs.filter(date_soumission__lte=dt_end)
-    except Exception:
-        pass
+    contenu = ExportService.flux_csv(qs)
+    gzip_accepte = accepts_gzip(request)
+    if gzip_accepte:
+        contenu = compress_sequence(contenu)
 
-    response = HttpResponse(content_type="text/csv")
+    response = StreamingHttpResponse(contenu, content_type="text/csv; charset=utf-8")
     response["Content-Disposition"] = 'attachment; filename="dossiers_rapports.csv"'
-    writer = csv.writer(response)
-    writer.writerow(
-        [
-            "reference",
-            "client",
-            "produit",
-            "montant",
-            "statut_agent",
-            "statut_client",
-            "date_soumission",
-            "date_maj",
-        ]
-    )
-    for d in qs.order_by("-date_soumission"):
-        writer.writerow(
-            [
-                d.reference,
-                getattr(d.client, "username", ""),
-                d.produit,
-                d.montant,
-                d.statut_agent,
-                d.statut_client,
-                d.date_soumission,
-                d.date_maj,
-            ]
-        )
+    if gzip_accepte:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
     return response
 
 
@@ -776,20 +637,13 @@ def reports_gestionnaire_view(request):
 @require_GET
 def reports_analyste_view(request):
     """Vue des rapports pour l'Analyste - Analyses et scoring de crédit"""
-    from .models import DossierCredit, JournalAction, DossierStatutAgent
-    from django.db.models import Count, Sum, Avg, Q
+    from .models import DossierStatutAgent
+    from django.db.models import Count, Sum, Avg
     from django.db.models.functions import TruncMonth
     import json
     
     # Dossiers assignés à l'analyste ou qu'il a traités
-    dossier_ids = (
-        JournalAction.objects.filter(acteur=request.user)
-        .values_list("dossier_id", flat=True)
-        .distinct()
-    )
-    qs = DossierCredit.objects.filter(
-        Q(id__in=dossier_ids) | Q(acteur_courant=request.user)
-    )
+    qs = ScopeService.get_queryset(request.user, "rapport")
     
     # Filtrage par période
     date_debut = request.GET.get("date_debut")
@@ -842,31 +696,18 @@ def reports_analyste_view(request):
     taux_approbation = round((approuves / denom) * 100, 2)
     taux_refus = round((refuses / denom) * 100, 2)
     
-    # Délai moyen d'analyse
-    delai_moyen = 0.0
-    try:
-        analyses_avec_delai = []
-        for dossier in qs.filter(statut_agent__in=[
-            DossierStatutAgent.EN_COURS_VALIDATION_GGR,
-            DossierStatutAgent.APPROUVE_ATTENTE_FONDS,
-            DossierStatutAgent.FONDS_LIBERE,
-            DossierStatutAgent.REFUSE
-        ]):
-            # Chercher la première action de l'analyste
-            premiere_action = JournalAction.objects.filter(
-                dossier=dossier,
-                acteur=request.user
-            ).order_by("timestamp").first()
-            
-            if premiere_action and dossier.date_maj:
-                delta = (dossier.date_maj - premiere_action.timestamp).total_seconds() / 86400
-                if delta >= 0:
-                    analyses_avec_delai.append(delta)
-        
-        if analyses_avec_delai:
-            delai_moyen = round(sum(analyses_avec_delai) / len(analyses_avec_delai), 2)
-    except Exception:
-        pass
+    # Délai moyen d'analyse (premiere action de l'analyste -> derniere MAJ)
+    delai_moyen = LeadTimeService.average_days_since_first_action(
+        qs.filter(
+            statut_agent__in=[
+                DossierStatutAgent.EN_COURS_VALIDATION_GGR,
+                DossierStatutAgent.APPROUVE_ATTENTE_FONDS,
+                DossierStatutAgent.FONDS_LIBERE,
+                DossierStatutAgent.REFUSE,
+            ]
+        ),
+        request.user,
+    )
     
     kpis = {
         "analyses_terminees": analyses_terminees,